@@ -7,10 +7,6 @@ import argparse
 import sys
 import traceback
 
-try:
-    from .boautomatelib import Boautomate
-except ImportError:
-    from boautomatelib import Boautomate
 
 def main():
     parser = argparse.ArgumentParser()
@@ -27,7 +23,7 @@ def main():
                         help='HTTP path prefix',
                         default='')
     parser.add_argument('--admin-token',
-                        help='Management token',
+                        help='Management token, required to access the administrative endpoints eg. /stats',
                         default='')
     parser.add_argument('--log-path',
                         help='Path to log file',
@@ -35,6 +31,9 @@ def main():
     parser.add_argument('--log-level',
                         help='Logging level (debug, info, warning, error)',
                         default='info')
+    parser.add_argument('--profile-startup',
+                        help='Log how long the imports of each package took, when the application is ready',
+                        action='store_true')
     parser.add_argument('--local-path',
                         help='Local Boautomate directory to ex. store cache, git repositories',
                         default='/var/lib/boautomate')
@@ -44,12 +43,108 @@ def main():
     parser.add_argument('--db-string',
                         help='Database string (SQLAlchemy compatible)',
                         default='sqlite:///var/lib/boautomate.sqlite3')
+    parser.add_argument('--db-pool-size',
+                        help='Number of database connections kept open in the pool (not used with SQLite)',
+                        type=int,
+                        default=5)
+    parser.add_argument('--db-max-overflow',
+                        help='Number of additional connections opened when the pool is exhausted (not used with SQLite)',
+                        type=int,
+                        default=10)
+    parser.add_argument('--db-pool-pre-ping',
+                        help='Test connections taken from the pool, before using them (survives database restarts)',
+                        action='store_true')
+    parser.add_argument('--db-slow-query-ms',
+                        help='Log SQL queries taking longer than given number of milliseconds, 0 disables',
+                        type=float,
+                        default=500)
+    parser.add_argument('--fs-cache-size',
+                        help='Maximum size (in bytes) of file contents cached in memory (pipelines, scripts, ' +
+                             'configs, includes), 0 disables the cache',
+                        type=int,
+                        default=16 * 1024 * 1024)
+    parser.add_argument('--fs-watch',
+                        help='Watch storages for changes, so the caches can be trusted until a file changes. ' +
+                             '"auto" uses inotify when available, in other case periodically checks the files',
+                        choices=['off', 'auto', 'inotify', 'poll'],
+                        default='off')
+    parser.add_argument('--fs-watch-poll-interval',
+                        help='How often (in seconds) the files are checked, when watching by polling',
+                        type=float,
+                        default=1.0)
+    parser.add_argument('--startup-workers',
+                        help='Number of storages and supervisors initialized at once on startup',
+                        type=int,
+                        default=8)
+    parser.add_argument('--lazy-storages',
+                        help='Initialize storages that are not default ones in background, ' +
+                             'do not wait for them (eg. for cloning) before starting the HTTP server',
+                        action='store_true')
+    parser.add_argument('--storage-refresh-workers',
+                        help='Number of threads refreshing remote storages (GIT), shared by all storages',
+                        type=int,
+                        default=2)
+    parser.add_argument('--execution-mode',
+                        help='"sync" keeps the HTTP connection open until the pipeline finishes, ' +
+                             '"async" queues the execution and responds immediately with HTTP 202',
+                        choices=['sync', 'async'],
+                        default='sync')
+    parser.add_argument('--execution-workers',
+                        help='Number of workers running queued executions (in "async" execution mode)',
+                        type=int,
+                        default=4)
+    parser.add_argument('--execution-queue-size',
+                        help='Maximum number of executions waiting in queue (in "async" execution mode)',
+                        type=int,
+                        default=100)
+    parser.add_argument('--execution-log-flush-interval',
+                        help='How often (in seconds) the output of running executions is stored, ' +
+                             'so it can be watched live',
+                        type=float,
+                        default=2.0)
+    parser.add_argument('--execution-log-memory-limit',
+                        help='Maximum size (in bytes) of an execution output kept in memory, ' +
+                             'larger output is spilled to a temporary file. A synchronous execution responds with at most ' +
+                             'this many last bytes of the output, the complete log is stored in the database',
+                        type=int,
+                        default=1024 * 1024)
+    parser.add_argument('--maintenance-interval',
+                        help='How often (in seconds) expired locks and tokens are deleted from the database, ' +
+                             '0 disables the maintenance',
+                        type=int,
+                        default=300)
+    parser.add_argument('--maintenance-batch-size',
+                        help='Maximum number of rows deleted at once by the maintenance',
+                        type=int,
+                        default=500)
 
     parser.description = 'RiotKit\'s BoAutomate - A boa snake eating webhooks and processing python scripts'
     parsed = parser.parse_args()
+    profiler = None
+
+    # the application is imported after parsing the arguments, so "--help" is quick, and imports can be profiled
+    if parsed.profile_startup:
+        try:
+            from .boautomatelib.importprofiler import ImportProfiler
+        except ImportError:
+            from boautomatelib.importprofiler import ImportProfiler
+
+        profiler = ImportProfiler()
+        profiler.install()
+
+    try:
+        from .boautomatelib import Boautomate, Logger
+    except ImportError:
+        from boautomatelib import Boautomate, Logger
 
     try:
-        Boautomate(params=vars(parsed)).main()
+        app = Boautomate(params=vars(parsed))
+
+        if profiler:
+            profiler.uninstall()
+            Logger.info(profiler.get_report())
+
+        app.main()
 
     except Exception as e:
         traceback.print_exc(file=sys.stdout)
@@ -1,17 +1,52 @@
 # -*- coding: utf-8 -*-
 
-from .ioc import Container
-from .persistence import ORM
-from .http import HttpServer
-from .repository import PipelineRepository
+"""
+    Server side modules (database, HTTP, storages) are imported on first use,
+    so the scripts running on nodes (nodeexecutor) do not pay for importing them
+"""
+
+import importlib
+import sys
+import types
+import typing
+
 from .logger import setup_logger, Logger
 
+if typing.TYPE_CHECKING:
+    from .ioc import Container
+    from .http import HttpServer
+    from .worker import Worker
+
+LAZY_EXPORTS = {
+    'Container': '.ioc',
+    'ORM': '.persistence',
+    'HttpServer': '.http',
+    'PipelineRepository': '.repository',
+    'Worker': '.worker'
+}
+
+
+class _LazyModule(types.ModuleType):
+    """ Module level __getattr__ (PEP 562) is available since Python 3.7, a module subclass works also on 3.6 """
+
+    def __getattr__(self, name: str):
+        if name in LAZY_EXPORTS:
+            return getattr(importlib.import_module(LAZY_EXPORTS[name], __name__), name)
+
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+sys.modules[__name__].__class__ = _LazyModule
+
 
 class Boautomate:
-    container: Container
-    http: HttpServer
+    container: 'Container'
+    http: 'HttpServer'
 
     def __init__(self, params: dict):
+        from .ioc import Container
+        from .http import HttpServer
+
         setup_logger(params['log_path'], params['log_level'])
         self.container = Container(params)
         self.http = HttpServer(params['http_address'], params['http_port'], params['http_prefix'])
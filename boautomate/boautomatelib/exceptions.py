@@ -20,6 +20,14 @@ class ScriptExpectationsNotMetException(ExecutorException):
     pass
 
 
+class ExecutionQueueFullException(ExecutorException):
+    pass
+
+
+class SupervisorsSaturatedException(ExecutorException):
+    pass
+
+
 class NoContextException(Exception):
     pass
 
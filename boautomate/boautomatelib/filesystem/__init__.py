@@ -1,10 +1,11 @@
 
 import abc
 from collections import namedtuple
+from typing import Optional
 
 
 StorageSpec = namedtuple('StorageSpec', 'name type params default')
-Syntax = namedtuple('Syntax', "regexp name callback")
+Dependency = namedtuple('Dependency', 'filesystem name revision')
 
 
 class Filesystem(abc.ABC):
@@ -33,3 +34,49 @@ class Filesystem(abc.ABC):
     def add_file(self, name: str, content: str) -> bool:
         pass
 
+    def get_local_path(self) -> Optional[str]:
+        """ Local directory with files of the storage, that can be watched for changes """
+
+        return None
+
+    def get_version(self) -> Optional[str]:
+        """ Version of the whole storage (eg. a commit), None when the storage is not versioned """
+
+        return None
+
+    def pin(self) -> 'Filesystem':
+        """
+        View of the storage at its current version, that does not change when the storage is refreshed.
+        An Execution reads its files, and records the version, from one pinned view. Unversioned storages return self
+        """
+
+        return self
+
+    def subscribe(self, callback):
+        """ Storages that are not local directories can publish ChangeEvents to the callback themselves """
+
+        pass
+
+    def get_refresh_interval(self) -> Optional[float]:
+        """ How often the storage needs to be refreshed from its remote (seconds), None when it does not """
+
+        return None
+
+    def refresh(self) -> bool:
+        """ Updates the storage from its remote. Tells if anything has changed """
+
+        return False
+
+    def use_cache(self, cache):
+        """ Allows the adapter to keep file contents in given FileCache. Adapters may ignore it """
+
+        pass
+
+    def get_revision(self, name: str) -> Optional[str]:
+        """
+        Returns a string that changes each time the file is changed, without reading the file.
+        None means that the revision cannot be determined (or file does not exist), so the file should not be cached.
+        """
+
+        return None
+
@@ -0,0 +1,233 @@
+"""
+    File Cache
+    ==========
+
+    Bounded LRU cache of file contents, shared by local filesystem adapters (including GIT, that is a local checkout).
+
+    Entries are validated with a single stat() call - a cached content is returned as long as the mtime and size
+    of the file did not change.
+
+    Missing files are remembered too (negative lookups), as the storages are searched one by one and most lookups
+    on the first storages are misses. A negative entry is trusted for a short period without touching the disk,
+    later it is validated by the mtime of the parent directory (creating a file changes it).
+
+    When the files are watched for changes (see watcher.py), entries are trusted until invalidated by an event.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Optional
+
+CacheEntry = namedtuple('CacheEntry', 'mtime size content')
+NegativeEntry = namedtuple('NegativeEntry', 'parent_mtime checked_at')
+
+
+class FileCache:
+    _max_size: int
+    _max_file_size: int
+    _negative_ttl: float
+    _max_negative_entries: int
+    _entries: OrderedDict
+    _negative: OrderedDict
+    _size: int
+    _lock: threading.Lock
+    _trusted: bool
+    _generation: int
+
+    hits: int
+    misses: int
+    negative_hits: int
+
+    def __init__(self, max_size: int, negative_ttl: float = 2.0, max_negative_entries: int = 10000,
+                 trusted: bool = False):
+        self._max_size = max_size
+        self._trusted = trusted
+        self._max_file_size = max_size // 4
+        self._negative_ttl = negative_ttl
+        self._max_negative_entries = max_negative_entries
+        self._entries = OrderedDict()
+        self._negative = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+
+    def read(self, path: str) -> str:
+        """ Reads a file (UTF-8). Raises OSError when the file cannot be read """
+
+        path = self._normalize(path)
+
+        if self._trusted:
+            with self._lock:
+                entry = self._entries.get(path)
+
+                if entry:
+                    self._entries.move_to_end(path)
+                    self.hits += 1
+
+                    return entry.content
+
+        # a file changed while it is being read, must not be stored
+        generation = self._generation
+        stat = os.stat(path)
+
+        with self._lock:
+            entry = self._entries.get(path)
+
+            if entry and entry.mtime == stat.st_mtime_ns and entry.size == stat.st_size:
+                self._entries.move_to_end(path)
+                self.hits += 1
+
+                return entry.content
+
+            self.misses += 1
+
+        with open(path, 'rb') as f:
+            content = f.read().decode('utf-8')
+
+        self._store(path, CacheEntry(mtime=stat.st_mtime_ns, size=stat.st_size, content=content), generation)
+
+        return content
+
+    def is_file(self, path: str) -> bool:
+        path = self._normalize(path)
+
+        if self._is_known_as_missing(path):
+            return False
+
+        if self._trusted and path in self._entries:
+            return True
+
+        # taken before checking the file, so a file created in the meantime will invalidate the entry
+        generation = self._generation
+        parent_mtime = self._get_parent_mtime(path)
+
+        if os.path.isfile(path):
+            return True
+
+        self._remember_missing(path, parent_mtime, generation)
+        return False
+
+    def invalidate(self, path: Optional[str] = None):
+        """ Forgets a single file, or everything when no path is given """
+
+        with self._lock:
+            self._generation += 1
+
+            if path is None:
+                self._entries.clear()
+                self._negative.clear()
+                self._size = 0
+                return
+
+            # the path could be a directory as well
+            path = self._normalize(path)
+            prefix = path.rstrip('/') + '/'
+
+            for cached_path in list(self._entries.keys()):
+                if cached_path == path or cached_path.startswith(prefix):
+                    self._size -= self._entries.pop(cached_path).size
+
+            for missing_path in list(self._negative.keys()):
+                if missing_path == path or missing_path.startswith(prefix):
+                    del self._negative[missing_path]
+
+    def on_file_change(self, event):
+        """ Subscriber of a file watcher """
+
+        # events of storages that are not local directories do not concern this cache
+        if event.absolute_path:
+            self.invalidate(event.absolute_path)
+
+    def get_stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'negative_hits': self.negative_hits,
+            'entries': len(self._entries),
+            'negative_entries': len(self._negative),
+            'size': self._size,
+            'max_size': self._max_size
+        }
+
+    def _store(self, path: str, entry: CacheEntry, generation: int):
+        if entry.size > self._max_file_size:
+            return
+
+        with self._lock:
+            if generation != self._generation:
+                return
+
+            previous = self._entries.pop(path, None)
+
+            if previous:
+                self._size -= previous.size
+
+            self._entries[path] = entry
+            self._size += entry.size
+            self._negative.pop(path, None)
+
+            while self._size > self._max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+
+    def _is_known_as_missing(self, path: str) -> bool:
+        with self._lock:
+            entry = self._negative.get(path)
+
+        if not entry:
+            return False
+
+        now = time.time()
+
+        if self._trusted or now - entry.checked_at < self._negative_ttl:
+            with self._lock:
+                self.negative_hits += 1
+
+            return True
+
+        if self._get_parent_mtime(path) == entry.parent_mtime:
+            with self._lock:
+                if path in self._negative:
+                    self._negative[path] = NegativeEntry(parent_mtime=entry.parent_mtime, checked_at=now)
+                    self._negative.move_to_end(path)
+
+                self.negative_hits += 1
+
+            return True
+
+        with self._lock:
+            self._negative.pop(path, None)
+
+        return False
+
+    def _remember_missing(self, path: str, parent_mtime: Optional[int], generation: int):
+        entry = NegativeEntry(parent_mtime=parent_mtime, checked_at=time.time())
+
+        with self._lock:
+            if generation != self._generation:
+                return
+
+            self._negative[path] = entry
+            self._negative.move_to_end(path)
+
+            while len(self._negative) > self._max_negative_entries:
+                self._negative.popitem(last=False)
+
+    @staticmethod
+    def _normalize(path: str) -> str:
+        """ Absolute paths, as the watcher events carry them - a storage may be configured with a relative path """
+
+        return os.path.abspath(path)
+
+    @staticmethod
+    def _get_parent_mtime(path: str) -> Optional[int]:
+        try:
+            return os.stat(os.path.dirname(path)).st_mtime_ns
+        except OSError:
+            return None
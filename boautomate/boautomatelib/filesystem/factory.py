@@ -4,25 +4,37 @@
     ==================
 
     Creates adapters, wraps them into MultipleFilesystemAdapter
+
+    Adapters are constructed in parallel. Storages that are not default ones can be constructed lazily
+    - in background, while the application is already running.
 """
 
 import os
 import typing
+from concurrent.futures import ThreadPoolExecutor
 
 from .localfs import LocalFilesystem
 from .gitfs import GitFilesystem
 from .multiplefs import MultipleFilesystemAdapter
+from .cache import FileCache
+from .refresh import RefreshScheduler
+from .lazy import LazyFilesystem
 from . import StorageSpec, Filesystem
 from ..logger import Logger
 from ..schema import Schema
 from ..exceptions import StorageException, SchemaNotFoundError
 from ..resolver import Resolver
+from ..startup import StartupReport, run_in_parallel
 
 
 class FSFactory:
     _annotation_regexp: typing.Pattern
     _storage_config_path: str
     _resolver: Resolver
+    _file_cache: typing.Optional[FileCache]
+    _refresh_scheduler: typing.Optional[RefreshScheduler]
+    _startup_report: typing.Optional[StartupReport]
+    _lazy_pool: typing.Optional[ThreadPoolExecutor]
 
     mapping = {
         '': LocalFilesystem,
@@ -32,27 +44,33 @@ class FSFactory:
 
     constructed: dict
 
-    def __init__(self, resolver: Resolver):
+    def __init__(self, resolver: Resolver, file_cache: FileCache = None, refresh_scheduler: RefreshScheduler = None,
+                 startup_report: StartupReport = None):
         self.constructed = {}
         self._storage_config_path = resolver.get('storage')
         self._resolver = resolver
+        self._file_cache = file_cache
+        self._refresh_scheduler = refresh_scheduler
+        self._startup_report = startup_report
+        self._lazy_pool = None
 
-    def create(self) -> MultipleFilesystemAdapter:
-        storage_specs = self._parse(self._storage_config_path)
+    def create(self, workers: int = 1, lazy: bool = False) -> MultipleFilesystemAdapter:
+        """
+        :param workers: Number of storages constructed at once
+        :param lazy: Do not wait for storages that are not default ones, construct them in background
+        """
 
-        adapters = [
-            self._create_adapter(
-                StorageSpec(name='boautomate-local', type='local', default=True, params={
-                    'path': self._get_local_boautomate_location(),
-                })
-            )
+        specs = [
+            StorageSpec(name='boautomate-local', type='local', default=True, params={
+                'path': self._get_local_boautomate_location(),
+            })
         ]
 
-        for name, spec in storage_specs.items():
+        for name, spec in self._parse(self._storage_config_path).items():
             spec['name'] = name
 
             try:
-                adapters.append(self._create_adapter(StorageSpec(**spec)))
+                specs.append(StorageSpec(**spec))
             except TypeError as err:
                 hint = ''
 
@@ -63,6 +81,20 @@ class FSFactory:
                     name, str(err), hint
                 ))
 
+        lazy_specs = [spec for spec in specs if lazy and not spec.default]
+        eager = run_in_parallel(
+            {'storage:' + spec.name: (lambda spec=spec: self._create_adapter(spec))
+             for spec in specs if spec not in lazy_specs},
+            workers=workers,
+            report=self._startup_report
+        )
+
+        if lazy_specs:
+            self._lazy_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='lazy-storage')
+
+        adapters = [eager['storage:' + spec.name] if spec not in lazy_specs else self._create_lazy_adapter(spec)
+                    for spec in specs]
+
         return MultipleFilesystemAdapter(adapters, adapters[1])
 
     def get(self, adapter_name: str) -> Filesystem:
@@ -74,7 +106,27 @@ class FSFactory:
 
         raise StorageException('Filesystem needs to be defined, "%s" is undefined' % adapter_name)
 
-    def _create_adapter(self, spec: StorageSpec) -> Filesystem:
+    def _create_lazy_adapter(self, spec: StorageSpec) -> LazyFilesystem:
+        def construct():
+            try:
+                if self._startup_report:
+                    with self._startup_report.measure('storage:' + spec.name + ' (lazy)'):
+                        return self._create_adapter(spec, register=False)
+
+                return self._create_adapter(spec, register=False)
+
+            except Exception as e:
+                Logger.error('Cannot initialize storage "%s": %s' % (spec.name, str(e)))
+                raise
+
+        Logger.info('Storage "%s" will be initialized in background' % spec.name)
+
+        instance = LazyFilesystem(spec, self._lazy_pool.submit(construct))
+        self.constructed[spec.name] = instance
+
+        return instance
+
+    def _create_adapter(self, spec: StorageSpec, register: bool = True) -> Filesystem:
         Logger.info('FSFactory is creating adapter from spec=%s' % str(spec))
 
         if spec.type not in self.mapping:
@@ -83,7 +135,15 @@ class FSFactory:
         # @todo: Add support for pluggable filesystem adapters
 
         instance = self.mapping[spec.type](spec, self._resolver)
-        self.constructed[spec.name] = instance
+
+        if register:
+            self.constructed[spec.name] = instance
+
+        if self._file_cache:
+            instance.use_cache(self._file_cache)
+
+        if self._refresh_scheduler and instance.get_refresh_interval():
+            self._refresh_scheduler.register(spec.name, instance, instance.get_refresh_interval())
 
         Logger.debug('Initialized filesystem under name "%s"' % spec.name)
 
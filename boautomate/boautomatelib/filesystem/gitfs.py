@@ -3,13 +3,14 @@ import re
 import os
 import git
 import threading
-import time
-import traceback
+from collections import OrderedDict
 from hashlib import sha256
+from typing import Callable, Dict, List, Optional
 from git.exc import GitCommandError
 
-from . import StorageSpec
+from . import Filesystem, StorageSpec
 from .localfs import LocalFilesystem
+from .watcher import ChangeEvent
 from ..resolver import Resolver
 from ..logger import Logger
 from ..exceptions import StorageException
@@ -20,10 +21,24 @@ class GitFilesystem(LocalFilesystem):
     GitFS allows to use GIT as a storage to keep ex. pipeline configuration, scripts
     It's a wrapper on a local filesystem.
 
+    Modes:
+        - worktree: the branch is periodically pulled into a working tree, files are read from the working tree
+        - snapshot: the branch is periodically fetched, files are read directly from git objects at a pinned commit.
+                    Readers never see a half-updated tree, an unchanged branch costs only the fetch.
+
+    To transfer less:
+        - depth: fetch only the last N commits of history
+        - sparse_paths: check out only given paths (relative to chroot), file contents are downloaded only when
+                        needed (partial clone). Applies to the worktree mode - snapshot mode reads objects directly
+                        and has no checkout to download them, so it fetches complete commits
+
     :param Filesystem:
     :return:
     """
 
+    MODE_WORKTREE = 'worktree'
+    MODE_SNAPSHOT = 'snapshot'
+
     _git_repository: str
     _git_branch: str
     _git_passphrase: str
@@ -32,10 +47,15 @@ class GitFilesystem(LocalFilesystem):
     _git_chroot: str
     _git_pull_interval: int
     _git_repo_path: str
+    _git_mode: str
+    _git_depth: Optional[int]
+    _git_sparse_paths: List[str]
 
     _repo: git.Repo
     _git_repositories_path: str
-    _pull_thread: threading.Thread
+    _head: Optional[str]
+    _snapshot: Optional['GitSnapshot']
+    _objects: Optional['GitSnapshot']
 
     def __init__(self, spec: StorageSpec, resolver: Resolver):
         self._prepare_local_path(resolver)
@@ -48,8 +68,20 @@ class GitFilesystem(LocalFilesystem):
         self._git_readonly = spec.params.get('readonly', False)
         self._git_chroot = spec.params.get('chroot', '')
         self._git_pull_interval = spec.params.get('pull_interval', 60)
+        self._git_mode = spec.params.get('mode', self.MODE_WORKTREE)
+        self._git_depth = spec.params.get('depth')
+        self._git_sparse_paths = spec.params.get('sparse_paths', [])
+        self._head = None
+        self._snapshot = None
+        self._objects = None
+
+        if self._git_mode == self.MODE_SNAPSHOT:
+            self._git_repo_path = self._initialize_snapshot()
+        else:
+            self._git_repo_path = self._initialize_git_repository()
 
-        self._git_repo_path = self._initialize_git_repository()
+            # the working tree is changed in place by a pull, pinned views read committed files from git objects
+            self._objects = GitSnapshot(self._repo, self._git_branch, self._git_chroot, self.spec.name)
 
         # initialize local filesystem storage after cloning a remote repository
         super().__init__(
@@ -65,40 +97,112 @@ class GitFilesystem(LocalFilesystem):
             resolver
         )
 
-        self._schedule_git_pull()
+    def file_exists(self, name: str) -> bool:
+        if self._snapshot:
+            return self._snapshot.get_blob_id(name) is not None
 
-    def _schedule_git_pull(self):
-        Logger.info('Scheduling a git pull every %i seconds' % self._git_pull_interval)
-        self._pull_thread = threading.Thread(target=self._pull_thread_main)
-        self._pull_thread.start()
+        return super().file_exists(name)
 
-    def _pull_thread_main(self):
-        while True:
-            Logger.debug('Pulling branch "%s" for filesystem at "%s"' % (self._git_branch, self._git_repo_path))
+    def retrieve_file(self, name: str) -> str:
+        if self._snapshot:
+            return self._snapshot.read(name)
 
-            try:
-                self._repo.remote('origin').pull(self._git_branch)
-            except Exception:
-                Logger.info(traceback.format_exc())
+        return super().retrieve_file(name)
 
-            time.sleep(self._git_pull_interval)
+    def get_revision(self, name: str) -> Optional[str]:
+        if self._snapshot:
+            return self._snapshot.get_blob_id(name)
 
-    def _initialize_git_repository(self):
-        """ Initialize the repository directory """
+        return super().get_revision(name)
 
-        self._repo = git.Repo()
-        self._repo.git.update_environment(GIT_SSH_COMMAND=self._build_ssh_command())
+    def get_local_path(self) -> Optional[str]:
+        # in snapshot mode there is no working tree, changes are published by the adapter itself
+        return None if self._snapshot else super().get_local_path()
+
+    def get_version(self) -> Optional[str]:
+        return self._snapshot.get_commit_id() if self._snapshot else self._head
+
+    def pin(self) -> Filesystem:
+        if self._snapshot:
+            return PinnedGitFilesystem(self, self._snapshot.pin(), worktree=False)
+
+        if self._head:
+            return PinnedGitFilesystem(self, self._objects.pin(self._repo.commit(self._head)), worktree=True)
+
+        return self
+
+    def subscribe(self, callback: Callable):
+        if self._snapshot:
+            self._snapshot.subscribe(callback)
+
+    def get_refresh_interval(self) -> Optional[float]:
+        return self._git_pull_interval
+
+    def refresh(self) -> bool:
+        """ Asks the remote for the branch head first (cheap), fetches or pulls only when it has moved """
+
+        remote_head = self._find_remote_head()
+
+        if remote_head and remote_head == self.get_version():
+            Logger.debug('Branch "%s" of "%s" did not change' % (self._git_branch, self.spec.name))
+            return False
+
+        Logger.debug('Pulling branch "%s" for filesystem at "%s"' % (self._git_branch, self._git_repo_path))
+
+        if self._snapshot:
+            return self._snapshot.update()
+
+        previous = self._head
+        self._update_worktree()
+
+        return previous != self._head
+
+    def _update_worktree(self):
+        origin = self._repo.remote('origin')
+
+        if self._git_depth:
+            # the history is cut, so git cannot tell if the fetched commit is a fast-forward.
+            # The checkout is a mirror of the branch, it is moved to the fetched commit
+            origin.fetch(self._git_branch, **self._get_fetch_options())
+            self._repo.git.reset('--hard', 'refs/remotes/origin/' + self._git_branch)
+        else:
+            origin.pull(self._git_branch)
+
+        self._head = self._repo.git.rev_parse('HEAD')
+
+    def _find_remote_head(self) -> Optional[str]:
+        output = self._repo.git.ls_remote('origin', 'refs/heads/' + self._git_branch)
+
+        return output.split()[0] if output else None
+
+    def _initialize_snapshot(self):
+        """ Initialize a repository without a working tree, only fetch the objects """
 
         repo_path = self._get_constant_path(self.spec.params.get('url'))
-        Logger.info('Cloning into "%s"' % repo_path)
+        Logger.info('Fetching into "%s"' % repo_path)
+
+        self._repo = git.Repo.init(repo_path, bare=True)
+        self._repo.git.update_environment(GIT_SSH_COMMAND=self._build_ssh_command())
 
         try:
-            os.mkdir(repo_path)
-        except FileExistsError:
-            pass
+            self._repo.create_remote('origin', self.spec.params.get('url'))
+        except GitCommandError:
+            Logger.info('Remote already exists, not recreating')
+
+        self._snapshot = GitSnapshot(self._repo, self._git_branch, self._git_chroot, self.spec.name,
+                                     self._get_fetch_options())
+        self._snapshot.update()
+
+        return repo_path
 
-        self._repo.init(repo_path)
-        self._repo.git._working_dir = repo_path
+    def _initialize_git_repository(self):
+        """ Initialize the repository directory """
+
+        repo_path = self._get_constant_path(self.spec.params.get('url'))
+        Logger.info('Cloning into "%s"' % repo_path)
+
+        self._repo = git.Repo.init(repo_path)
+        self._repo.git.update_environment(GIT_SSH_COMMAND=self._build_ssh_command())
 
         try:
             origin = self._repo.create_remote('origin', self.spec.params.get('url'))
@@ -106,11 +210,42 @@ class GitFilesystem(LocalFilesystem):
             Logger.info('Remote already exists, not recreating')
             origin = self._repo.remote('origin')
 
-        origin.fetch()
-        origin.pull(self._git_branch)
+        if self._git_sparse_paths:
+            self._configure_sparse_checkout()
+
+        origin.fetch(self._git_branch, **self._get_fetch_options())
+        self._update_worktree()
 
         return repo_path
 
+    def _get_fetch_options(self) -> dict:
+        options = {'depth': self._git_depth} if self._git_depth else {}
+
+        # a partial clone: trees are fetched, file contents (blobs) are fetched by the sparse checkout.
+        # Snapshot mode would fetch each blob lazily on a read, while serving a request
+        if self._git_sparse_paths and self._git_mode != self.MODE_SNAPSHOT:
+            options['filter'] = 'blob:none'
+
+        return options
+
+    def _configure_sparse_checkout(self):
+        """ Only the listed paths are checked out, so only their contents are downloaded """
+
+        with self._repo.config_writer() as config:
+            config.set_value('core', 'sparseCheckout', 'true')
+
+        os.makedirs(self._repo.git_dir + '/info', exist_ok=True)
+
+        with open(self._repo.git_dir + '/info/sparse-checkout', 'wb') as f:
+            f.write(''.join(map(lambda path: '/' + path + '\n', self._get_sparse_patterns())).encode('utf-8'))
+
+    def _get_sparse_patterns(self) -> List[str]:
+        """ Sparse paths are relative to the chroot, as all paths of the storage """
+
+        chroot = self._git_chroot.strip('/')
+
+        return [(chroot + '/' + path.strip('/')).strip('/') for path in self._git_sparse_paths]
+
     def _build_ssh_command(self) -> str:
         """ Adds support for username and password entering """
 
@@ -134,6 +269,9 @@ class GitFilesystem(LocalFilesystem):
         return repo_path
 
     def add_file(self, name: str, content: str) -> bool:
+        if self._snapshot:
+            raise StorageException('Cannot add "%s", GIT storage in snapshot mode is read-only' % name)
+
         if super(GitFilesystem, self).add_file(name=name, content=content):
             try:
                 self._repo.git.add(name)
@@ -167,6 +305,180 @@ class GitFilesystem(LocalFilesystem):
 
         self._git_repositories_path = resolver.resolve_string('%local_path%/git')
 
-        if not os.path.isdir(self._git_repositories_path):
-            os.mkdir(self._git_repositories_path)
+        # storages are constructed in parallel
+        os.makedirs(self._git_repositories_path, exist_ok=True)
+
+
+class GitSnapshot:
+    """
+    Files of a branch at a pinned commit, read directly from the git object database.
+
+    Contents are addressed by blob id, so they are immutable and can be cached across commits.
+    When the branch moves, the new commit is pinned at once and changed files are published as ChangeEvents.
+    """
+
+    MAX_CACHED_BLOBS = 512
+
+    _repo: git.Repo
+    _branch: str
+    _chroot: str
+    _source: str
+    _commit: Optional[git.Commit]
+    _blob_ids: Dict[str, Optional[str]]
+    _contents: OrderedDict
+    _listeners: List[Callable]
+    _lock: threading.RLock
+    _fetch_options: dict
+
+    def __init__(self, repo: git.Repo, branch: str, chroot: str, source: str, fetch_options: dict = None):
+        self._repo = repo
+        self._fetch_options = fetch_options or {}
+        self._branch = branch
+        self._chroot = chroot.strip('/')
+        self._source = source
+        self._commit = None
+        self._blob_ids = {}
+        self._contents = OrderedDict()
+        self._listeners = []
+
+        # git object database access is not thread-safe
+        self._lock = threading.RLock()
+
+    def subscribe(self, callback: Callable):
+        self._listeners.append(callback)
+
+    def get_commit_id(self) -> Optional[str]:
+        return self._commit.hexsha if self._commit else None
+
+    def update(self) -> bool:
+        """ Fetches the branch, pins the new commit when the branch has moved. Tells if it has moved """
+
+        self._repo.remote('origin').fetch(self._branch, **self._fetch_options)
+
+        with self._lock:
+            commit = self._repo.commit('refs/remotes/origin/' + self._branch)
+
+            if self._commit and commit.hexsha == self._commit.hexsha:
+                return False
+
+            changed = self._find_changed_paths(self._commit, commit) if self._commit else []
+
+            Logger.info('GIT storage "%s" is now at %s' % (self._source, commit.hexsha))
+            self._commit = commit
+            self._blob_ids = {}
+
+        for path in changed:
+            for listener in self._listeners:
+                listener(ChangeEvent(self._source, path, None))
+
+        return True
+
+    def pin(self, commit: git.Commit = None) -> 'GitSnapshot':
+        """ Snapshot that stays at the current (or given) commit, sharing the cached contents """
+
+        with self._lock:
+            pinned = GitSnapshot(self._repo, self._branch, self._chroot, self._source)
+            pinned._commit = commit or self._commit
+            pinned._contents = self._contents
+            pinned._lock = self._lock
+
+            return pinned
+
+    def get_blob_id(self, name: str) -> Optional[str]:
+        with self._lock:
+            if name not in self._blob_ids:
+                self._blob_ids[name] = self._find_blob_id(name)
+
+            return self._blob_ids[name]
+
+    def read(self, name: str) -> str:
+        with self._lock:
+            blob_id = self.get_blob_id(name)
+
+            if blob_id is None:
+                raise StorageException(('File "%s" does not exist at commit %s. ' +
+                                        'Check if it exists, and if a valid filesystem was selected') % (
+                    name, self.get_commit_id()))
+
+            if blob_id in self._contents:
+                self._contents.move_to_end(blob_id)
+                return self._contents[blob_id]
+
+            content = self._repo.odb.stream(bytes.fromhex(blob_id)).read().decode('utf-8')
+            self._contents[blob_id] = content
+
+            while len(self._contents) > self.MAX_CACHED_BLOBS:
+                self._contents.popitem(last=False)
+
+            return content
+
+    def _find_blob_id(self, name: str) -> Optional[str]:
+        try:
+            item = self._commit.tree / self._to_repository_path(name)
+        except KeyError:
+            return None
+
+        return item.hexsha if item.type == 'blob' else None
+
+    def _find_changed_paths(self, previous: git.Commit, current: git.Commit) -> List[str]:
+        """ Paths (relative to chroot) of files that differ between the commits """
+
+        paths = set()
+        prefix = self._chroot + '/' if self._chroot else ''
+
+        for diff in previous.diff(current):
+            for path in [diff.a_path, diff.b_path]:
+                if path and path.startswith(prefix):
+                    paths.add(path[len(prefix):])
+
+        return sorted(paths)
+
+    def _to_repository_path(self, name: str) -> str:
+        name = os.path.normpath(name.strip('/'))
+
+        return self._chroot + '/' + name if self._chroot else name
+
+
+class PinnedGitFilesystem(Filesystem):
+    """
+    GIT storage at a pinned commit (see Filesystem.pin()).
+    In worktree mode only files present in the working tree are visible (eg. sparse checkout), and files that were
+    not committed (added by the application) are read from the working tree.
+    """
+
+    _storage: GitFilesystem
+    _snapshot: GitSnapshot
+    _worktree: bool
+
+    def __init__(self, storage: GitFilesystem, snapshot: GitSnapshot, worktree: bool):
+        self.spec = storage.get_specification()
+        self._storage = storage
+        self._snapshot = snapshot
+        self._worktree = worktree
+
+    def file_exists(self, name: str) -> bool:
+        if self._worktree:
+            return self._storage.file_exists(name)
+
+        return self._snapshot.get_blob_id(name) is not None
+
+    def retrieve_file(self, name: str) -> str:
+        if self._worktree and self._snapshot.get_blob_id(name) is None:
+            return self._storage.retrieve_file(name)
+
+        return self._snapshot.read(name)
+
+    def get_revision(self, name: str) -> Optional[str]:
+        if self._worktree and self._snapshot.get_blob_id(name) is None:
+            return self._storage.get_revision(name)
+
+        return self._snapshot.get_blob_id(name)
+
+    def get_version(self) -> Optional[str]:
+        return self._snapshot.get_commit_id()
+
+    def add_file(self, name: str, content: str) -> bool:
+        return self._storage.add_file(name, content)
 
+    def __str__(self) -> str:
+        return 'PinnedGitFilesystem<%s@%s>' % (self.spec.name, self._snapshot.get_commit_id())
@@ -0,0 +1,78 @@
+
+import threading
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+from . import Filesystem, StorageSpec
+from ..exceptions import StorageException
+
+
+class LazyFilesystem(Filesystem):
+    """
+    Storage that is constructed in background (eg. a GIT repository is being cloned).
+    The application can start meanwhile, access to the storage waits until it is ready.
+    """
+
+    _future: Future
+    _pinned: bool
+    _pinned_storage: Optional[Filesystem]
+    _lock: threading.Lock
+
+    def __init__(self, spec: StorageSpec, future: Future, pinned: bool = False):
+        self.spec = spec
+        self._future = future
+        self._pinned = pinned
+        self._pinned_storage = None
+        self._lock = threading.Lock()
+
+    def is_ready(self) -> bool:
+        return self._future.done() and not self._future.exception()
+
+    def on_ready(self, callback: Callable):
+        """ Callback receives the constructed storage. Called immediately when it is already constructed """
+
+        self._future.add_done_callback(lambda future: None if future.exception() else callback(future.result()))
+
+    def retrieve_file(self, name: str) -> str:
+        return self._get().retrieve_file(name)
+
+    def file_exists(self, name: str) -> bool:
+        return self._get().file_exists(name)
+
+    def add_file(self, name: str, content: str) -> bool:
+        return self._get().add_file(name, content)
+
+    def get_revision(self, name: str) -> Optional[str]:
+        return self._get().get_revision(name)
+
+    def get_version(self) -> Optional[str]:
+        # does not wait, the version tells what was available at the moment
+        if self._pinned:
+            return self._pinned_storage.get_version() if self._pinned_storage else None
+
+        return self._future.result().get_version() if self.is_ready() else None
+
+    def pin(self) -> Filesystem:
+        if self.is_ready():
+            return self._future.result().pin()
+
+        # not waiting for the storage, that may not be needed at all - it is pinned on first access
+        return LazyFilesystem(self.spec, self._future, pinned=True)
+
+    def _get(self) -> Filesystem:
+        try:
+            storage = self._future.result()
+        except Exception as e:
+            raise StorageException('Storage "%s" could not be initialized: %s' % (self.spec.name, str(e)))
+
+        if not self._pinned:
+            return storage
+
+        with self._lock:
+            if not self._pinned_storage:
+                self._pinned_storage = storage.pin()
+
+            return self._pinned_storage
+
+    def __str__(self) -> str:
+        return 'LazyFilesystem<%s>' % self.spec.name
@@ -1,7 +1,9 @@
 
 import os
+from typing import Optional
 
 from . import Filesystem, StorageSpec
+from .cache import FileCache
 from ..exceptions import StorageException
 from ..logger import Logger
 from ..resolver import Resolver
@@ -10,6 +12,7 @@ from ..resolver import Resolver
 class LocalFilesystem(Filesystem):
     path: str
     ro: bool
+    _cache: Optional[FileCache] = None
 
     def __init__(self, spec: StorageSpec, resolver: Resolver):
         self.spec = spec
@@ -21,9 +24,26 @@ class LocalFilesystem(Filesystem):
         self.path = spec.params.get('path')
         Logger.info('Initialized local filesystem at "%s" path' % self.path)
 
+    def get_local_path(self) -> Optional[str]:
+        return self.path
+
+    def use_cache(self, cache: FileCache):
+        self._cache = cache
+
     def file_exists(self, name: str) -> bool:
+        if self._cache:
+            return self._cache.is_file(self.path + '/' + name)
+
         return os.path.isfile(self.path + '/' + name)
 
+    def get_revision(self, name: str) -> Optional[str]:
+        try:
+            stat = os.stat(self.path + '/' + name)
+        except OSError:
+            return None
+
+        return '%i-%i' % (stat.st_mtime_ns, stat.st_size)
+
     def add_file(self, name: str, content: str) -> bool:
         if self.ro:
             raise StorageException('Read-only filesystem')
@@ -32,11 +52,21 @@ class LocalFilesystem(Filesystem):
         f.write(content.encode('utf-8'))
         f.close()
 
+        if self._cache:
+            self._cache.invalidate(self.path + '/' + name)
+
         return self.retrieve_file(self.path + '/' + name) == content
 
     def retrieve_file(self, name: str) -> str:
         Logger.debug('fs.retrieve_file(' + name + ')')
 
+        if self._cache:
+            try:
+                return self._cache.read(self.path + '/' + name)
+            except OSError:
+                raise StorageException(('File "%s" does not exist. ' +
+                                        'Check if it exists, and if a valid filesystem was selected') % name)
+
         if not self.file_exists(name):
             raise StorageException(('File "%s" does not exist. ' +
                                    'Check if it exists, and if a valid filesystem was selected') % name)
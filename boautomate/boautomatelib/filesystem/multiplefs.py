@@ -1,4 +1,5 @@
 
+from typing import Optional
 from . import Filesystem
 from ..exceptions import StorageException
 from ..logger import Logger
@@ -25,6 +26,38 @@ class MultipleFilesystemAdapter(Filesystem):
 
         raise StorageException('File "%s" not found by any configured storage (--storage option)' % name)
 
+    def get_revision(self, name: str) -> Optional[str]:
+        for adapter in self.adapters:
+            if adapter.is_default() and adapter.file_exists(name):
+                revision = adapter.get_revision(name)
+
+                return adapter.get_specification().name + ':' + revision if revision else None
+
+        return None
+
+    def pin(self) -> 'MultipleFilesystemAdapter':
+        pinned = list(map(lambda adapter: adapter.pin(), self.adapters))
+
+        return MultipleFilesystemAdapter(pinned, pinned[self.adapters.index(self.primary)])
+
+    def find_adapter(self, name: str) -> Optional[Filesystem]:
+        for adapter in self.adapters:
+            if adapter.get_specification().name == name:
+                return adapter
+
+        return None
+
+    def get_version(self) -> Optional[str]:
+        versions = []
+
+        for adapter in self.adapters:
+            version = adapter.get_version()
+
+            if version:
+                versions.append(adapter.get_specification().name + '@' + version)
+
+        return ', '.join(versions) if versions else None
+
     def file_exists(self, name: str) -> bool:
         for adapter in self.adapters:
             if adapter.file_exists(name):
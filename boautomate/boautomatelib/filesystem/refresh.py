@@ -0,0 +1,147 @@
+"""
+    Refresh Scheduler
+    =================
+
+    Refreshes remote storages (eg. GIT) using one small pool of workers, instead of a thread per storage.
+
+    Each storage is refreshed every "interval" seconds. When nothing changes, the interval grows (exponential backoff,
+    up to MAX_BACKOFF times), and is randomized a little, so the storages are not refreshed all at the same moment.
+    A change resets the interval. A refresh can be also requested immediately, eg. by a push webhook.
+"""
+
+import random
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from . import Filesystem
+from ..logger import Logger
+
+
+class RefreshState:
+    storage: Filesystem
+    interval: float
+    idle_rounds: int
+    due_at: float
+    running: bool
+    requested: bool
+    refreshed_at: Optional[float]
+    changed_at: Optional[float]
+
+    def __init__(self, storage: Filesystem, interval: float):
+        self.storage = storage
+        self.interval = interval
+        self.idle_rounds = 0
+        self.due_at = 0
+        self.running = False
+        self.requested = False
+        self.refreshed_at = None
+        self.changed_at = None
+
+
+class RefreshScheduler:
+    MAX_BACKOFF = 8
+    JITTER = 0.2
+
+    _storages: Dict[str, RefreshState]
+    _pool: ThreadPoolExecutor
+    _condition: threading.Condition
+    _thread: Optional[threading.Thread]
+
+    def __init__(self, workers: int = 2):
+        self._storages = {}
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='storage-refresh')
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def register(self, name: str, storage: Filesystem, interval: float):
+        with self._condition:
+            self._storages[name] = RefreshState(storage, interval)
+            self._storages[name].due_at = time.time() + self._randomize(interval)
+            self._condition.notify()
+
+    def start(self):
+        Logger.info('Refreshing storages in background, %i registered so far' % len(self._storages))
+
+        self._thread = threading.Thread(target=self._thread_main, name='storage-refresh-scheduler', daemon=True)
+        self._thread.start()
+
+    def refresh_now(self, name: str) -> bool:
+        """ Schedules an immediate refresh. Returns False, when the storage is not refreshed by the scheduler """
+
+        with self._condition:
+            state = self._storages.get(name)
+
+            if not state:
+                return False
+
+            # a refresh that is already running could miss the change that triggered the request
+            state.requested = True
+            state.due_at = 0
+            self._condition.notify()
+
+        return True
+
+    def get_stats(self) -> dict:
+        with self._condition:
+            return {
+                name: {
+                    'interval': state.interval,
+                    'idle_rounds': state.idle_rounds,
+                    'next_in': max(0.0, round(state.due_at - time.time(), 2)) if not state.running else 0.0,
+                    'running': state.running,
+                    'refreshed_at': state.refreshed_at,
+                    'changed_at': state.changed_at
+                }
+                for name, state in self._storages.items()
+            }
+
+    def _thread_main(self):
+        while True:
+            with self._condition:
+                now = time.time()
+                due = [name for name, state in self._storages.items() if not state.running and state.due_at <= now]
+
+                for name in due:
+                    self._storages[name].running = True
+                    self._storages[name].requested = False
+                    self._pool.submit(self._refresh, name)
+
+                waiting = [state.due_at for state in self._storages.values() if not state.running]
+                self._condition.wait(timeout=max(0.0, min(waiting) - now) if waiting else None)
+
+    def _refresh(self, name: str):
+        state = self._storages[name]
+        changed = False
+
+        Logger.debug('Refreshing storage "%s"' % name)
+
+        try:
+            changed = state.storage.refresh()
+        except Exception:
+            Logger.error('Cannot refresh storage "%s": %s' % (name, traceback.format_exc()))
+
+        with self._condition:
+            state.running = False
+            state.refreshed_at = time.time()
+
+            if changed:
+                state.changed_at = state.refreshed_at
+                state.idle_rounds = 0
+            else:
+                state.idle_rounds += 1
+
+            if state.requested:
+                state.due_at = 0
+            else:
+                state.due_at = time.time() + self._randomize(self._get_delay(state))
+
+            self._condition.notify()
+
+    def _get_delay(self, state: RefreshState) -> float:
+        return state.interval * min(2 ** state.idle_rounds, self.MAX_BACKOFF)
+
+    def _randomize(self, delay: float) -> float:
+        return delay * random.uniform(1 - self.JITTER, 1 + self.JITTER)
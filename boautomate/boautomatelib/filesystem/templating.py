@@ -1,4 +1,3 @@
-
 """
     Filesystem Templating
     =====================
@@ -6,68 +5,192 @@
     Templating system designed to allow files inclusion from any place.
     For example in pipeline definition you can place a "@storedAtPath(boautomate/hello-world.py)" that will include
     that file from any filesystem, or you can include it from a specific filesystem by using syntax
-    "@storedAtFilesystem(boautomate-local).atPath(boautomatelib/schema/pipeline-v1.schema.json)"
+    "@storedOnFilesystem(boautomate-local).atPath(boautomatelib/schema/pipeline-v1.schema.json)"
 """
 
+import threading
 import typing
 import re
+from collections import OrderedDict, namedtuple
 from ..logger import Logger
-from . import Filesystem, Syntax
+from . import Filesystem, Dependency
 from .factory import FSFactory
+from .multiplefs import MultipleFilesystemAdapter
 from ..exceptions import StorageTemplateParsingError
 
+TemplateCacheEntry = namedtuple('TemplateCacheEntry', 'content dependencies')
+
+# a path may contain parenthesis, but only balanced ones, so the closing parenthesis of the marker ends the path
+PATH_CHARS = r'A-Za-z.0-9\-_+/,:;%!$ '
+FILESYSTEM_CHARS = r'A-Za-z.0-9\-_+/,:;%!$@\[\]{}?<> '
+MARKER_REGEXP = re.compile(
+    r'@storedOnFilesystem\((?P<filesystem>(?:[{fs}]|\([{fs}]*\))+)\)\.atPath\((?P<fs_path>(?:[{path}]|\([{path}]*\))+)\)'
+    r'|@storedAtPath\((?P<path>(?:[{path}]|\([{path}]*\))+)\)'.format(fs=FILESYSTEM_CHARS, path=PATH_CHARS),
+    re.IGNORECASE
+)
+
 
 class Templating:
+    """
+    Expanded templates are cached. An entry is valid as long as revisions of all included files did not change,
+    or, when the storages are watched for changes, until a change event arrives.
+    """
+
+    MAX_CACHED_TEMPLATES = 256
+
     fs: Filesystem
     fs_factory: FSFactory
+    _cache: typing.Dict[tuple, TemplateCacheEntry]
+    _cache_lock: threading.Lock
+    _verify_revisions: bool
+    _generation: int
 
-    def __init__(self, fs: Filesystem, fs_factory: FSFactory):
+    def __init__(self, fs: Filesystem, fs_factory: FSFactory, verify_revisions: bool = True):
         self.fs = fs
         self.fs_factory = fs_factory
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._verify_revisions = verify_revisions
+        self._generation = 0
 
-    def inject_includes(self, content: str, deep: bool = True):
+    def inject_includes(self, content: str, deep: bool = True, dependencies: list = None, storage: Filesystem = None):
         """
             Injects file contents in place of, example:
               - @storedAtPath(boautomate/hello-world.py)
-              - @storedAtFilesystem(boautomate-local).atPath(boautomatelib/schema/pipeline-v1.schema.json)
+              - @storedOnFilesystem(boautomate-local).atPath(boautomatelib/schema/pipeline-v1.schema.json)
 
-            Works recursively, until the syntax occurs in the content.
+            Markers are found anywhere in the content. With "deep" the included files are processed recursively,
+            each file is read only once, even if included many times. Circular includes are reported as an error.
+            Each included file is appended to "dependencies" list (if passed) as a Dependency.
+            Files are read from "storage" when passed - a pinned view (see Filesystem.pin()), not cached there.
         """
 
-        syntax_list = [
-            Syntax(
-                name="@storedAtPath",
-                regexp=re.compile('@storedAtPath\(([A-Za-z.0-9\-_+/,:;()%!$ ]+)\)', re.IGNORECASE),
-                callback=self._stored_at_path
-            ),
+        if dependencies is None:
+            dependencies = []
+
+        if not content or '@stored' not in content:
+            return content
+
+        if storage is not None and storage is not self.fs:
+            # revisions of a pinned view never change, its entries could not be invalidated
+            own_dependencies = []
+            expanded = self._expand(content, deep, own_dependencies, memo={}, stack=[], storage=storage)
+            dependencies.extend(own_dependencies)
+
+            return expanded
+
+        cache_key = (content, deep)
+        cached = self._get_cached(cache_key)
+
+        if cached:
+            dependencies.extend(cached.dependencies)
+            return cached.content
+
+        with self._cache_lock:
+            generation = self._generation
+
+        own_dependencies = []
+        expanded = self._expand(content, deep, own_dependencies, memo={}, stack=[], storage=self.fs)
+        dependencies.extend(own_dependencies)
+
+        if None not in map(lambda dependency: dependency.revision, own_dependencies):
+            self._store(cache_key, TemplateCacheEntry(content=expanded, dependencies=own_dependencies), generation)
+
+        return expanded
+
+    def on_file_change(self, event):
+        """ Subscriber of a file watcher: drops templates that include the changed file """
+
+        with self._cache_lock:
+            self._generation += 1
+
+            for key, entry in list(self._cache.items()):
+                if any(map(lambda dependency: event.affects(dependency.name), entry.dependencies)):
+                    del self._cache[key]
+
+    def _expand(self, content: str, deep: bool, dependencies: list, memo: dict, stack: list,
+                storage: Filesystem) -> str:
+        """ Single pass over the content, markers are replaced with (expanded) contents of files """
+
+        parts = []
+        position = 0
+
+        for match in MARKER_REGEXP.finditer(content):
+            parts.append(content[position:match.start()])
+            parts.append(self._include(match, deep, dependencies, memo, stack, storage))
+            position = match.end()
+
+        parts.append(content[position:])
+
+        return ''.join(parts)
+
+    def _include(self, match: typing.Match, deep: bool, dependencies: list, memo: dict, stack: list,
+                 storage: Filesystem) -> str:
+        if match.group('filesystem'):
+            fs = self._get_named_storage(storage, match.group('filesystem'))
+            name = match.group('fs_path')
+        else:
+            fs = storage
+            name = match.group('path')
+
+        key = (id(fs), name)
+
+        if key in stack:
+            raise StorageTemplateParsingError('Circular include of "%s": %s' % (
+                name, ' -> '.join(map(lambda item: item[1], stack + [key]))))
+
+        if key in memo:
+            return memo[key]
+
+        Logger.debug('fs.Templating injecting template ' + str(match.groups()))
+        included = self._retrieve(fs, name, dependencies)
+
+        if deep:
+            included = self._expand(included, deep, dependencies, memo, stack + [key], storage)
+
+        memo[key] = included
+
+        return included
+
+    def _get_named_storage(self, storage: Filesystem, name: str) -> Filesystem:
+        """ A named storage from the same pinned view, when reading from one """
+
+        if storage is not self.fs and isinstance(storage, MultipleFilesystemAdapter):
+            pinned = storage.find_adapter(name)
+
+            if pinned:
+                return pinned
+
+        return self.fs_factory.get(name)
+
+    def _get_cached(self, key: tuple) -> typing.Optional[TemplateCacheEntry]:
+        with self._cache_lock:
+            entry = self._cache.get(key)
 
-            Syntax(
-                name="@storedOnFilesystem",
-                regexp=re.compile(
-                    '@storedOnFilesystem\(([A-Za-z.0-9\-_+\/,:;()%!$@\[\]{}?<> ]+)\).atPath\(([A-Za-z.0-9\-_+\/,:;()%!$ ]+)\)',
-                    re.IGNORECASE),
-                callback=self._stored_on_filesystem
-            )
-        ]
+            if entry:
+                self._cache.move_to_end(key)
 
-        for syntax in syntax_list:
-            while syntax.name in content:
-                Logger.debug('Templating.inject_includes() is matching %s' % syntax.name)
-                match = syntax.regexp.match(content)
+        if entry and self._verify_revisions:
+            for dependency in entry.dependencies:
+                if dependency.filesystem.get_revision(dependency.name) != dependency.revision:
+                    return None
 
-                if not match:
-                    if not deep:
-                        break
+        return entry
 
-                    raise StorageTemplateParsingError('Logic error, marker "%s" found, but regexp failed to parse it' % syntax.name)
+    def _store(self, key: tuple, entry: TemplateCacheEntry, generation: int):
+        with self._cache_lock:
+            # files could change while they were read
+            if generation != self._generation:
+                return
 
-                Logger.debug('fs.Templating injecting template ' + str(match.groups()))
-                content = content.replace(match.string, syntax.callback(match))
+            self._cache[key] = entry
 
-        return content
+            while len(self._cache) > self.MAX_CACHED_TEMPLATES:
+                self._cache.popitem(last=False)
 
-    def _stored_at_path(self, match: typing.Match):
-        return self.fs.retrieve_file(match.group(1))
+    @staticmethod
+    def _retrieve(fs: Filesystem, name: str, dependencies: list):
+        # revision is taken before reading, so a change during reading results in a stale revision, not stale content
+        dependencies.append(Dependency(filesystem=fs, name=name, revision=fs.get_revision(name)))
 
-    def _stored_on_filesystem(self, match: typing.Match):
-        return self.fs_factory.get(match.group(1)).retrieve_file(match.group(2))
+        return fs.retrieve_file(name)
@@ -0,0 +1,314 @@
+"""
+    File Watcher
+    ============
+
+    Notifies subscribers (caches) that a file on a local storage was changed, so the caches can trust their entries
+    until a notification arrives, instead of validating them on each access.
+
+    Two implementations:
+        - InotifyWatcher: Linux inotify called via ctypes, changes are noticed within milliseconds
+        - PollingWatcher: periodically compares mtime and size of all files, works everywhere
+"""
+
+import abc
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ..exceptions import StorageException
+from ..logger import Logger
+
+
+class ChangeEvent:
+    """ A file (or directory) was created, modified or deleted. When "path" is None, then anything could change """
+
+    source: str
+    path: Optional[str]
+    absolute_path: Optional[str]
+
+    def __init__(self, source: str, path: Optional[str], absolute_path: Optional[str]):
+        self.source = source
+        self.path = path
+        self.absolute_path = absolute_path
+
+    def affects(self, name: str) -> bool:
+        """ Tells if a file (path relative to the storage root) could be changed """
+
+        if self.path is None:
+            return True
+
+        return name == self.path or name.startswith(self.path + '/')
+
+    def __str__(self) -> str:
+        return '%s:%s' % (self.source, self.path if self.path is not None else '*')
+
+
+class Watcher(abc.ABC):
+    IGNORED_DIRECTORIES = ['.git']
+
+    _roots: Dict[str, str]
+    _roots_lock: threading.Lock
+    _subscribers: List[Callable]
+    _thread: threading.Thread
+
+    def __init__(self):
+        self._roots = {}
+        self._roots_lock = threading.Lock()
+        self._subscribers = []
+
+    def watch(self, source: str, path: str):
+        """ Watch a directory recursively. Events are published with paths relative to that directory """
+
+        # storages can be added later (--lazy-storages), while the watcher thread is already running
+        with self._roots_lock:
+            self._roots[source] = os.path.abspath(path)
+
+    def get_roots(self) -> Dict[str, str]:
+        with self._roots_lock:
+            return dict(self._roots)
+
+    def subscribe(self, callback: Callable):
+        """ Callback receives a ChangeEvent. It is called from the watcher thread, so it needs to be quick """
+
+        self._subscribers.append(callback)
+
+    def start(self):
+        Logger.info('%s is watching: %s' % (self.__class__.__name__, ', '.join(self.get_roots().values())))
+
+        self._thread = threading.Thread(target=self._thread_main, name='fs-watcher', daemon=True)
+        self._thread.start()
+
+    def publish(self, event: ChangeEvent):
+        Logger.debug('File changed: %s' % str(event))
+
+        for subscriber in self._subscribers:
+            try:
+                subscriber(event)
+            except Exception:
+                Logger.error('File change subscriber failed: ' + traceback.format_exc())
+
+    def _publish_path(self, absolute_path: str):
+        """ Publishes an event for each watched directory containing the path (directories can be nested) """
+
+        for source, root in self.get_roots().items():
+            if absolute_path == root:
+                self.publish(ChangeEvent(source, None, root))
+
+            elif absolute_path.startswith(root + '/'):
+                self.publish(ChangeEvent(source, absolute_path[len(root) + 1:], absolute_path))
+
+    def _walk_directories(self, root: str):
+        for directory, subdirectories, files in os.walk(root):
+            subdirectories[:] = [name for name in subdirectories if name not in self.IGNORED_DIRECTORIES]
+
+            yield directory, files
+
+    @abc.abstractmethod
+    def _thread_main(self):
+        pass
+
+
+class InotifyWatcher(Watcher):
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+
+    WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE \
+        | IN_DELETE_SELF | IN_MOVE_SELF
+    EVENT_HEADER = struct.Struct('iIII')
+
+    _libc: ctypes.CDLL
+    _fd: int
+    _directories: Dict[int, str]
+
+    def __init__(self):
+        super().__init__()
+        self._directories = {}
+
+        try:
+            self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            self._fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        except (OSError, AttributeError) as e:
+            raise StorageException('inotify is not available: %s' % str(e))
+
+        if self._fd < 0:
+            raise StorageException('inotify is not available: %s' % os.strerror(ctypes.get_errno()))
+
+    def watch(self, source: str, path: str):
+        super().watch(source, path)
+
+        for directory, files in self._walk_directories(os.path.abspath(path)):
+            self._add_watch(directory)
+
+    def _add_watch(self, directory: str):
+        descriptor = self._libc.inotify_add_watch(self._fd, directory.encode('utf-8'), self.WATCH_MASK)
+
+        if descriptor < 0:
+            error = ctypes.get_errno()
+
+            if error == errno.ENOSPC:
+                raise StorageException('Cannot watch "%s", inotify watches limit reached ' % directory +
+                                       '(see fs.inotify.max_user_watches sysctl)')
+
+            Logger.warning('Cannot watch "%s": %s' % (directory, os.strerror(error)))
+            return
+
+        self._directories[descriptor] = directory
+
+    def _thread_main(self):
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except InterruptedError:
+                continue
+
+            # the thread must survive, in other case the caches would stay stale forever
+            try:
+                for descriptor, mask, name in self._parse(data):
+                    self._handle(descriptor, mask, name)
+
+            except Exception:
+                Logger.error('Cannot handle file change events: ' + traceback.format_exc())
+
+    def _parse(self, data: bytes) -> List[Tuple[int, int, str]]:
+        events = []
+        position = 0
+
+        while position < len(data):
+            descriptor, mask, cookie, length = self.EVENT_HEADER.unpack_from(data, position)
+            position += self.EVENT_HEADER.size
+            name = data[position:position + length].rstrip(b'\0').decode('utf-8', errors='replace')
+            position += length
+
+            events.append((descriptor, mask, name))
+
+        return events
+
+    def _handle(self, descriptor: int, mask: int, name: str):
+        if mask & self.IN_Q_OVERFLOW:
+            # events were lost, everything needs to be considered as changed
+            Logger.warning('inotify queue overflow, invalidating all watched files')
+
+            for source, root in self.get_roots().items():
+                self.publish(ChangeEvent(source, None, root))
+
+            return
+
+        if mask & self.IN_IGNORED:
+            self._directories.pop(descriptor, None)
+            return
+
+        directory = self._directories.get(descriptor)
+
+        if directory is None or name in self.IGNORED_DIRECTORIES:
+            return
+
+        path = os.path.join(directory, name) if name else directory
+
+        # new directory: watch it, files could be created inside before the watch was added
+        if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+            try:
+                for subdirectory, files in self._walk_directories(path):
+                    self._add_watch(subdirectory)
+
+            except StorageException as e:
+                Logger.error('Changes in "%s" will not be noticed: %s' % (path, str(e)))
+
+        self._publish_path(path)
+
+
+class PollingWatcher(Watcher):
+    _interval: float
+    _snapshots: Dict[str, Dict[str, Tuple[int, int]]]
+
+    def __init__(self, interval: float = 1.0):
+        super().__init__()
+        self._interval = interval
+        self._snapshots = {}
+
+    def watch(self, source: str, path: str):
+        super().watch(source, path)
+        self._snapshots[source] = self._take_snapshot(os.path.abspath(path))
+
+    def _thread_main(self):
+        while True:
+            time.sleep(self._interval)
+
+            for source, root in self.get_roots().items():
+                try:
+                    self._compare_snapshot(source, root)
+
+                except Exception:
+                    Logger.error('Cannot check "%s" for file changes: %s' % (root, traceback.format_exc()))
+
+    def _compare_snapshot(self, source: str, root: str):
+        previous = self._snapshots.get(source, {})
+        current = self._take_snapshot(root)
+        self._snapshots[source] = current
+
+        for path in set(previous.keys()) | set(current.keys()):
+            if previous.get(path) != current.get(path):
+                self._publish_path(path)
+
+    def _take_snapshot(self, root: str) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+
+        for directory, files in self._walk_directories(root):
+            for name in files:
+                path = os.path.join(directory, name)
+
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+
+        return snapshot
+
+
+def create_watcher(mode: str, directories: Dict[str, str], poll_interval: float = 1.0) -> Optional[Watcher]:
+    """
+    Creates a watcher for given directories (source name => path)
+    mode: off, auto (inotify when available, polling in other case), inotify, poll
+    """
+
+    if mode == 'off':
+        return None
+
+    if mode != 'poll':
+        try:
+            watcher = InotifyWatcher()
+
+            for source, path in directories.items():
+                watcher.watch(source, path)
+
+            return watcher
+
+        except StorageException as e:
+            if mode == 'inotify':
+                raise
+
+            Logger.warning('%s, falling back to polling for file changes' % str(e))
+
+    watcher = PollingWatcher(poll_interval)
+
+    for source, path in directories.items():
+        watcher.watch(source, path)
+
+    return watcher
@@ -6,7 +6,11 @@ import asyncio
 from tornado_swagger.setup import setup_swagger
 
 from .index import MainHandler
+from .stats import StatsHandler
+from .storage import StorageRefreshHandler
+from .worker import WorkerLeaseHandler, WorkerHeartbeatHandler, WorkerFinishHandler
 from .pipeline.execution import ExecutionHandler
+from .pipeline.log import ExecutionLogHandler
 from .pipeline.declaration import DeclarationHandler
 from .pipeline.env import EnvHandler
 from .pipeline.api.locks import LocksHandler
@@ -36,7 +40,13 @@ class HttpServer:  # pragma: no cover
             (r"" + self._path_prefix + "/pipeline/([a-z0-9-]+)/api/lock/([a-z0-9-_.]+)", LocksHandler),
             (r"" + self._path_prefix + "/pipeline/([a-z0-9-]+)/api/execute-other", ExecutionFromOtherPipeline),
             (r"" + self._path_prefix + "/pipeline/([a-z0-9-]+)/execute", ExecutionHandler),
-            (r"" + self._path_prefix + "/lock/list", LocksListHandler)
+            (r"" + self._path_prefix + "/pipeline/([a-z0-9-]+)/execution/([0-9]+)/log", ExecutionLogHandler),
+            (r"" + self._path_prefix + "/lock/list", LocksListHandler),
+            (r"" + self._path_prefix + "/stats", StatsHandler),
+            (r"" + self._path_prefix + "/storage/([A-Za-z0-9-_.]+)/refresh", StorageRefreshHandler),
+            (r"" + self._path_prefix + "/worker/([A-Za-z0-9-_.]+)/lease", WorkerLeaseHandler),
+            (r"" + self._path_prefix + "/worker/([A-Za-z0-9-_.]+)/lease/([a-f0-9]+)/heartbeat", WorkerHeartbeatHandler),
+            (r"" + self._path_prefix + "/worker/([A-Za-z0-9-_.]+)/lease/([a-f0-9]+)/finish", WorkerFinishHandler)
         ]
 
         for handler in handlers:
@@ -1,5 +1,6 @@
 
 import json
+import hmac
 import tornado.web
 import traceback
 from abc import ABC
@@ -53,6 +54,9 @@ class BaseHandler(ABC, tornado.web.RequestHandler):
     def data_received(self, chunk: bytes) -> Optional[Awaitable[None]]:
         pass
 
+    def on_finish(self) -> None:
+        self.container.connection.remove()
+
     def raise_not_found_error(self, msg: str = 'Not found') -> None:
         Logger.error(msg)
         raise HttpError(404, json.dumps({'error': msg, 'type': 'not_found'}))
@@ -61,9 +65,21 @@ class BaseHandler(ABC, tornado.web.RequestHandler):
         Logger.error(msg)
         raise HttpError(400, json.dumps({'error': msg, 'type': 'validation_error'}))
 
+    def raise_service_unavailable_error(self, msg: str = 'Service unavailable'):
+        Logger.error(msg)
+        raise HttpError(503, json.dumps({'error': msg, 'type': 'service_unavailable'}))
+
     def write_no_access_error(self, msg: str) -> None:
         raise HttpError(403, json.dumps({'error': msg, 'type': 'no_access'}))
 
+    def assert_has_admin_access(self):
+        """ Administrative endpoints are accessible with --admin-token passed in "Token" header or "token" query """
+
+        token = self.request.headers.get('Token', self.get_query_argument('token', ''))
+
+        if not self.container.admin_token or not hmac.compare_digest(token, self.container.admin_token):
+            self.write_no_access_error('Invalid admin token, or admin token is not configured')
+
     def write_error(self, status_code: int, **kwargs: Any) -> None:
         details = []
 
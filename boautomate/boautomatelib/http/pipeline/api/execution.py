@@ -4,10 +4,6 @@ from ..execution import ExecutionHandler
 from ....persistence import Pipeline
 
 
-def route_execute(context_pipeline_id: str, pipeline_to_execute_id: str) -> str:
-    return '/pipeline/%s/api/execute-other?pipeline_id=%s' % (context_pipeline_id, pipeline_to_execute_id)
-
-
 class ExecutionFromOtherPipeline(ExecutionHandler):
 
     async def post(self, pipeline_id: str):
@@ -11,18 +11,6 @@ from ....exceptions import EntityNotFound, RequestValidationException
 Payload = namedtuple('Payload', 'expires_at regexp keywords schema')
 
 
-def route_put_lock(pipeline_id: str, lock_id: str) -> str:
-    return "/pipeline/%s/api/lock/%s" % (pipeline_id, lock_id)
-
-
-def route_delete_lock(pipeline_id: str, lock_id: str) -> str:
-    return route_put_lock(pipeline_id, lock_id)
-
-
-def route_get_lock(pipeline_id: str, lock_id: str) -> str:
-    return route_put_lock(pipeline_id, lock_id)
-
-
 class LocksHandler(BasePipelineHandler):
     def _get_lock(self, lock_id: str, pipeline_id: str, create: bool) -> Lock:
         try:
@@ -78,6 +66,7 @@ class LocksHandler(BasePipelineHandler):
         lock.payload_keywords = payload.keywords
 
         self.container.lock_repository.flush(lock)
+        self.container.locks_manager.invalidate(subject_pipeline_id)
         self.write({
             'status': 'OK',
             'lock': lock.to_dict()
@@ -100,6 +89,7 @@ class LocksHandler(BasePipelineHandler):
             return
 
         self.container.lock_repository.delete(lock)
+        self.container.locks_manager.invalidate(pipeline_id)
         self.write({'status': 'OK', 'detail': 'deleted'})
 
     async def get(self, pipeline_id: str, lock_id: str):
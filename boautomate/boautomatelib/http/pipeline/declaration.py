@@ -15,5 +15,6 @@ class DeclarationHandler(BasePipelineHandler):  # pragma: no cover
         self.write({
             'id': pipeline.id,
             'script': pipeline.retrieve_script(),
+            'requirements': pipeline.retrieve_requirements(),
             'configs': json_loads(pipeline.configs)
         })
@@ -11,9 +11,13 @@ class EnvHandler(BasePipelineHandler):  # pragma: no cover
         pipeline = self._get_pipeline(pipeline_id)
         self.assert_has_access(pipeline)
 
+        # not stored, so it does not take a number from the counter - shows the number the next execution will get
+        execution = self.container.execution_repository.create(pipeline, '0.0.0.0', '')
+        execution.execution_number = self.container.execution_repository.find_last_execution_number(pipeline) + 1
+
         self.write(self.container.supervisor.env_to_string(
             self.container.supervisor.prepare_environment(
-                execution=self.container.execution_repository.create(pipeline, '0.0.0.0', '', ''),
+                execution=execution,
                 payload=self.request.body.decode('utf-8'),
                 communication_token='test-token',  # @todo: Token generator and token management
                 query=self._get_serializable_query_arguments(),
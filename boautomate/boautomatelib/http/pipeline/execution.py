@@ -1,7 +1,12 @@
 
 import typing
+from urllib.parse import urljoin
 from . import BasePipelineHandler
 from tornado.ioloop import IOLoop
+from ...persistence import Attributes
+from ...runner import PipelineSources
+from ...exceptions import EntityNotFound, ExecutionQueueFullException, SupervisorsSaturatedException
+from ...routes import route_execution_status, route_execution_log
 
 
 class ExecutionHandler(BasePipelineHandler):  # pragma: no cover
@@ -9,7 +14,8 @@ class ExecutionHandler(BasePipelineHandler):  # pragma: no cover
 
     async def get(self, pipeline_id: str):
         """
-        List of all past and current executions of a Pipeline
+        List of all past and current executions of a Pipeline,
+        or a single execution when "execution_number" is passed in the query string
 
         :param pipeline_id:
         :return:
@@ -18,16 +24,43 @@ class ExecutionHandler(BasePipelineHandler):  # pragma: no cover
         pipeline = self._get_pipeline(pipeline_id)
 
         self.assert_has_access(pipeline)
+
+        if self.get_query_argument('execution_number', ''):
+            self._get_single_execution(pipeline, self.get_query_argument('execution_number'))
+            return
+
         last_executions = self.container.execution_repository.find_last_executions(pipeline, limit=20)
 
         self.write({
             'last_execution_number': self.container.execution_repository.find_last_execution_number(pipeline),
             'executions': list(map(
-                lambda execution: execution.to_summary_dict(),
+                lambda execution: self._to_summary(pipeline, execution),
                 last_executions
             ))
         })
 
+    def _get_single_execution(self, pipeline, execution_number: str):
+        if not execution_number.isdigit():
+            self.raise_validation_error('"execution_number" needs to be a number')
+
+        try:
+            execution = self.container.execution_repository.find_by_number(pipeline, int(execution_number))
+        except EntityNotFound as e:
+            self.raise_not_found_error(str(e))
+            return
+
+        summary = self._to_summary(pipeline, execution)
+        summary['payload'] = execution.payload
+
+        self.write(summary)
+
+    def _to_summary(self, pipeline, execution) -> dict:
+        summary = execution.to_summary_dict()
+        summary['log_url'] = urljoin(self.container.self_url,
+                                     route_execution_log(pipeline.id, execution.execution_number))
+
+        return summary
+
     async def post(self, pipeline_id: str):
         """
         Performs an Execution of a Pipeline
@@ -58,6 +91,9 @@ class ExecutionHandler(BasePipelineHandler):  # pragma: no cover
         responses:
             200:
                 description: Log from the execution
+            202:
+                description: Execution was queued (when running with --execution-mode=async).
+                    Contains the execution number, a status URL and a live log URL
             400:
                 description: When the fields are not correct, or the Pipeline is locked from execution
                 schema:
@@ -74,42 +110,113 @@ class ExecutionHandler(BasePipelineHandler):  # pragma: no cover
                 description: On server error
                 schema:
                     $ref: '#/definitions/ServerError'
+            503:
+                description: When the execution queue is full, or all supervisors are busy for too long
+                schema:
+                    $ref: '#/definitions/RequestError'
         """
+
+        if self.container.execution_queue:
+            await IOLoop.current().run_in_executor(None, self._enqueue, pipeline_id)
+            return
+
         await IOLoop.current().run_in_executor(None, self._post, pipeline_id)
 
     def _post(self, pipeline_id: str):
-        pipeline = self._get_pipeline(pipeline_id)
-
-        self.assert_has_access(pipeline)
-        self.assert_payload_not_blocked(pipeline, self.request.body.decode('utf-8'))
+        # runs in a thread pool, the Session needs to be released after the Execution
+        with self.container.connection.scope():
+            self._run_pipeline(pipeline_id)
 
-        script = pipeline.retrieve_script()
+    def _run_pipeline(self, pipeline_id: str):
+        pipeline, sources, payload = self._prepare(pipeline_id)
 
         # mark that we are "in-progress"
-        execution = self.container.execution_repository.create(
+        execution = self.container.execution_runner.create_execution(
             pipeline=pipeline,
             ip_address=self.request.remote_ip,
-            payload=self.request.body.decode('utf-8'),
-            log=''
+            payload=payload,
+            status=Attributes.STATUS_IN_PROGRESS,
+            sources=sources
         )
-        self.container.execution_repository.flush(execution)
-        get_token = self.container.token_manager.transaction
 
         # execute the script
-        with get_token(pipeline, execution) as token:
-            run = self.container.supervisor.execute(
+        try:
+            result = self.container.execution_runner.run(
+                pipeline=pipeline,
                 execution=execution,
-                script=script,
-                payload=self.request.body.decode('utf-8'),
-                communication_token=token,
+                sources=sources,
+                payload=payload,
                 query=self._get_serializable_query_arguments(),
-                headers=dict(self.request.headers.get_all()),
-                configuration_payloads=pipeline.get_configuration_payloads(),
-                params=pipeline.params
+                headers=dict(self.request.headers.get_all())
             )
 
-        # finish
-        execution.mark_as_finished(run.is_success(), run.output)
-        self.container.execution_repository.flush(execution)
+        except SupervisorsSaturatedException as e:
+            self.raise_service_unavailable_error(str(e))
+
+        self.write(result.output)
+
+    def _enqueue(self, pipeline_id: str):
+        with self.container.connection.scope():
+            self._submit_to_queue(pipeline_id)
+
+    def _submit_to_queue(self, pipeline_id: str):
+        pipeline, sources, payload = self._prepare(pipeline_id)
+
+        execution = self.container.execution_runner.create_execution(
+            pipeline=pipeline,
+            ip_address=self.request.remote_ip,
+            payload=payload,
+            status=Attributes.STATUS_QUEUED,
+            sources=sources
+        )
+
+        # request data needs to be copied, as the job will run after the request is finished
+        query = self._get_serializable_query_arguments()
+        headers = dict(self.request.headers.get_all())
+        execution_id = execution.id
+        response = {
+            'status': execution.status,
+            'execution_number': execution.execution_number,
+            'status_url': urljoin(self.container.self_url,
+                                  route_execution_status(pipeline.id, execution.execution_number)),
+            'log_url': urljoin(self.container.self_url,
+                               route_execution_log(pipeline.id, execution.execution_number))
+        }
+
+        try:
+            self.container.execution_queue.submit(
+                lambda: self._run_queued(self.container, pipeline, execution_id, sources, payload, query, headers)
+            )
+
+        except ExecutionQueueFullException as e:
+            self.container.execution_log_repository.append(execution, str(e), offset=0)
+            execution.mark_as_finished(False)
+            self.container.execution_repository.flush(execution)
+            self.raise_service_unavailable_error(str(e))
+
+        self.set_status(202)
+        self.write(response)
+
+    @staticmethod
+    def _run_queued(container, pipeline, execution_id: int, sources: PipelineSources, payload: str, query: dict,
+                    headers: dict):
+        """ Runs in a queue worker thread, so the Execution is loaded again in the worker's own Session """
+
+        with container.connection.scope():
+            container.execution_runner.run(
+                pipeline=pipeline,
+                execution=container.execution_repository.find_by_id(execution_id),
+                sources=sources,
+                payload=payload,
+                query=query,
+                headers=headers
+            )
+
+    def _prepare(self, pipeline_id: str) -> tuple:
+        pipeline = self._get_pipeline(pipeline_id)
+        payload = self.request.body.decode('utf-8')
+
+        self.assert_has_access(pipeline)
+        self.assert_payload_not_blocked(pipeline, payload)
 
-        self.write(execution.log)
+        return pipeline, self.container.execution_runner.read_sources(pipeline), payload
@@ -0,0 +1,230 @@
+
+import asyncio
+import re
+from typing import Callable
+from tornado.ioloop import IOLoop
+from tornado.iostream import StreamClosedError
+from . import BasePipelineHandler
+from ...persistence import Attributes
+from ...exceptions import EntityNotFound
+
+
+class ExecutionLogHandler(BasePipelineHandler):  # pragma: no cover
+    """
+    Tails the output of an Execution, until the Execution finishes.
+    Alternatively returns a part of the output, when a "Range" header or "offset" query argument is present.
+    """
+
+    POLL_INTERVAL = 1.0
+    CHUNKS_PER_QUERY = 100
+    DEFAULT_PAGE_SIZE = 1024 * 1024
+    RANGE_REGEXP = re.compile(r'^bytes=(\d*)-(\d*)$')
+    RUNNING_STATUSES = [Attributes.STATUS_QUEUED, Attributes.STATUS_IN_PROGRESS]
+
+    async def get(self, pipeline_id: str, execution_number: str):
+        """
+        ---
+        tags: ['pipeline']
+        summary: Watch the Execution output
+        description: Streams the output of an Execution while it is running. The response is finished together with
+            the Execution. Sends Server-Sent-Events when requested with "Accept: text/event-stream" header,
+            in other case the output is sent as a plain text in chunks.
+            When the "Range" header is sent, then only the requested bytes range of the current output is returned
+            (HTTP 206). Output can be also paged with "offset" and "limit" query arguments.
+        produces: ['text/plain', 'text/event-stream']
+        parameters:
+            - name: pipeline_id
+              in: path
+              description: Name/ID of a pipeline
+              required: true
+              type: string
+
+            - name: execution_number
+              in: path
+              description: Execution number (build number)
+              required: true
+              type: integer
+
+            - name: secret
+              in: query
+              description: Secret key for a pipeline
+              required: true
+              type: string
+
+            - name: offset
+              in: query
+              description: Return a page of the output starting at given byte, "X-Next-Offset" header points to the
+                next page
+              required: false
+              type: integer
+
+            - name: limit
+              in: query
+              description: Page size in bytes (defaults to 1 MiB)
+              required: false
+              type: integer
+        responses:
+            200:
+                description: Output of the Execution
+            206:
+                description: Requested range of the output
+            403:
+                description: When secret code does not match
+                schema:
+                    $ref: '#/definitions/RequestError'
+            404:
+                description: When pipeline or Execution does not exist
+                schema:
+                    $ref: '#/definitions/RequestError'
+            416:
+                description: When the requested range is not satisfiable
+        """
+
+        pipeline = self._get_pipeline(pipeline_id)
+        self.assert_has_access(pipeline)
+
+        execution = await self._run_in_scope(self._find_execution, pipeline, int(execution_number))
+        self.set_header('Accept-Ranges', 'bytes')
+
+        if self.request.headers.get('Range'):
+            await self._run_in_scope(self._write_range, execution)
+            return
+
+        if self.get_query_argument('offset', ''):
+            await self._run_in_scope(self._write_page, execution)
+            return
+
+        is_sse = 'text/event-stream' in self.request.headers.get('Accept', '')
+        self.set_header('Content-Type', 'text/event-stream' if is_sse else 'text/plain; charset=UTF-8')
+        self.set_header('Cache-Control', 'no-cache')
+
+        last_chunk_id = 0
+        any_chunk_sent = False
+
+        while True:
+            # each poll has its own Session, so it sees the chunks committed in the meantime
+            status, chunks = await self._run_in_scope(self._poll, execution, last_chunk_id)
+
+            for chunk_id, content in chunks:
+                self._write_output(content, is_sse)
+                last_chunk_id = chunk_id
+                any_chunk_sent = True
+
+            if status not in self.RUNNING_STATUSES:
+                break
+
+            try:
+                await self.flush()
+            except StreamClosedError:
+                return
+
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+        # executions that were stored without chunks
+        if not any_chunk_sent and execution.log:
+            self._write_output(execution.log, is_sse)
+
+        if is_sse:
+            super().write('event: end\ndata: %s\n\n' % status)
+
+    async def _run_in_scope(self, method: Callable, *args):
+        """ Database queries are blocking, so they run in the thread pool, not to stall other requests """
+
+        def run():
+            with self.container.connection.scope():
+                return method(*args)
+
+        return await IOLoop.current().run_in_executor(None, run)
+
+    def _find_execution(self, pipeline, execution_number: int):
+        try:
+            return self.container.execution_repository.find_by_number(pipeline, execution_number)
+        except EntityNotFound as e:
+            self.raise_not_found_error(str(e))
+
+    def _poll(self, execution, last_chunk_id: int) -> tuple:
+        """ Status of the execution and (id, content) of chunks stored after "last_chunk_id" """
+
+        # status needs to be checked before reading chunks, chunks are complete when the execution has finished
+        status = self.container.execution_repository.find_status(execution)
+        new_chunks = []
+
+        while True:
+            chunks = self.container.execution_log_repository.find_chunks_since(
+                execution, last_chunk_id, limit=self.CHUNKS_PER_QUERY)
+
+            for chunk in chunks:
+                new_chunks.append((chunk.id, chunk.get_content().decode('utf-8', errors='replace')))
+                last_chunk_id = chunk.id
+
+            if len(chunks) < self.CHUNKS_PER_QUERY:
+                return status, new_chunks
+
+    def _write_range(self, execution):
+        size, legacy_log = self._get_size(execution)
+        match = self.RANGE_REGEXP.match(self.request.headers.get('Range').strip())
+
+        if match and match.group(1):
+            start = int(match.group(1))
+            end = min(int(match.group(2)) + 1, size) if match.group(2) else size
+
+        elif match and match.group(2):
+            # suffix range: last N bytes
+            start = max(size - int(match.group(2)), 0)
+            end = size
+
+        else:
+            start, end = size, size
+
+        if start >= size or start >= end:
+            self.set_status(416)
+            self.set_header('Content-Range', 'bytes */%i' % size)
+            return
+
+        self.set_status(206)
+        self.set_header('Content-Type', 'text/plain; charset=UTF-8')
+        self.set_header('Content-Range', 'bytes %i-%i/%i' % (start, end - 1, size))
+        super().write(self._read(execution, legacy_log, start, end))
+
+    def _write_page(self, execution):
+        offset = self.get_query_argument('offset', '0')
+        limit = self.get_query_argument('limit', str(self.DEFAULT_PAGE_SIZE))
+
+        if not offset.isdigit() or not limit.isdigit() or int(limit) == 0:
+            self.raise_validation_error('"offset" and "limit" need to be positive numbers')
+
+        size, legacy_log = self._get_size(execution)
+        start = min(int(offset), size)
+        end = min(start + int(limit), size)
+
+        self.set_header('Content-Type', 'text/plain; charset=UTF-8')
+        self.set_header('X-Log-Size', str(size))
+
+        if end < size:
+            self.set_header('X-Next-Offset', str(end))
+
+        super().write(self._read(execution, legacy_log, start, end))
+
+    def _get_size(self, execution) -> tuple:
+        """ Size of the output, and the output itself for executions stored before the output was chunked """
+
+        size = self.container.execution_log_repository.find_log_size(execution)
+
+        if not size and execution.log:
+            legacy_log = execution.log.encode('utf-8')
+            return len(legacy_log), legacy_log
+
+        return size, None
+
+    def _read(self, execution, legacy_log, start: int, end: int) -> bytes:
+        if legacy_log is not None:
+            return legacy_log[start:end]
+
+        return self.container.execution_log_repository.read_range(execution, start, end)
+
+    def _write_output(self, content: str, is_sse: bool):
+        if not is_sse:
+            super().write(content)
+            return
+
+        super().write(''.join(map(lambda line: 'data: %s\n' % line, content.split('\n'))) + '\n')
@@ -0,0 +1,47 @@
+
+from .base import BaseHandler
+
+
+class StatsHandler(BaseHandler):  # pragma: no cover
+    def get(self):
+        """
+        ---
+        tags: ['admin']
+        summary: Internal statistics
+        description: Database query timings, connection pool, pipeline and file caches, storage refreshing,
+            execution queue, supervisors (eg. container pools), startup timings
+            and maintenance state. Requires the admin token (--admin-token)
+        produces: ['application/json']
+        parameters:
+            - name: Token
+              in: header
+              description: Admin token, alternatively can be passed as "token" in query string
+              required: true
+              type: string
+        responses:
+            200:
+                description: Statistics
+            403:
+                description: When the admin token does not match, or is not configured
+                schema:
+                    $ref: '#/definitions/RequestError'
+        """
+
+        self.assert_has_admin_access()
+
+        queue = self.container.execution_queue
+        reaper = self.container.reaper
+
+        self.write({
+            'database': {
+                'pool': self.container.connection.engine.pool.status(),
+                'queries': self.container.query_instrumentation.get_stats()
+            },
+            'pipeline_cache': self.container.pipeline_repository.get_cache_stats(),
+            'file_cache': self.container.file_cache.get_stats() if self.container.file_cache else None,
+            'storage_refresh': self.container.storage_refresh.get_stats(),
+            'execution_queue': {'size': queue.size()} if queue else None,
+            'supervisors': self.container.supervisor.get_stats(),
+            'startup': self.container.startup_report.to_dict(),
+            'maintenance': dict(reaper.last_report._asdict()) if reaper and reaper.last_report else None
+        })
@@ -0,0 +1,44 @@
+
+from .base import BaseHandler
+
+
+class StorageRefreshHandler(BaseHandler):  # pragma: no cover
+    def post(self, storage_name: str):
+        """
+        ---
+        tags: ['admin']
+        summary: Refresh a remote storage now
+        description: Schedules an immediate refresh (eg. GIT fetch) of a storage, meant to be called by a push webhook.
+            Requires the admin token (--admin-token)
+        produces: ['application/json']
+        parameters:
+            - name: storage_name
+              in: path
+              description: Name of the storage, as in storage.yaml
+              required: true
+              type: string
+            - name: Token
+              in: header
+              description: Admin token, alternatively can be passed as "token" in query string
+              required: true
+              type: string
+        responses:
+            202:
+                description: Refresh was scheduled
+            403:
+                description: When the admin token does not match, or is not configured
+                schema:
+                    $ref: '#/definitions/RequestError'
+            404:
+                description: Storage does not exist, or it is not a remote storage
+                schema:
+                    $ref: '#/definitions/RequestError'
+        """
+
+        self.assert_has_admin_access()
+
+        if not self.container.storage_refresh.refresh_now(storage_name):
+            self.raise_not_found_error('Storage "%s" does not exist, or is not refreshed from a remote' % storage_name)
+
+        self.set_status(202)
+        self.write({'status': 'scheduled', 'storage': storage_name})
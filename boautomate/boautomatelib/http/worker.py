@@ -0,0 +1,196 @@
+
+import base64
+import json
+import time
+from datetime import timedelta
+from tornado import gen
+from tornado.ioloop import IOLoop
+from tornado.locks import Event
+from .base import BaseHandler
+from ..exceptions import HttpError
+from ..supervisor.remote import LeaseQueue
+
+
+class BaseWorkerHandler(BaseHandler):  # pragma: no cover
+    MAX_POLL_TIME = 30
+
+    def _get_lease_queue(self, node_name: str) -> LeaseQueue:
+        node = self.container.supervisor.find_node(node_name)
+        queue = node.get_lease_queue() if node else None
+
+        if not queue:
+            self.raise_not_found_error('Node "%s" does not exist, or is not a remote-worker node' % node_name)
+
+        if not queue.is_token_valid(self.request.headers.get('Token', '')):
+            self.write_no_access_error('Invalid worker token')
+
+        return queue
+
+    @staticmethod
+    def raise_lease_lost_error():
+        raise HttpError(410, json.dumps({'error': 'Lease expired or was cancelled, stop the execution',
+                                         'type': 'lease_lost'}))
+
+
+class WorkerLeaseHandler(BaseWorkerHandler):  # pragma: no cover
+    async def post(self, node_name: str):
+        """
+        ---
+        tags: ['worker']
+        summary: Lease an execution
+        description: Long polling - waits up to "wait" seconds for an execution queued on a remote-worker node.
+            The worker has to send heartbeats while the execution is running, in other case the lease expires
+        produces: ['application/json']
+        parameters:
+            - name: node_name
+              in: path
+              description: Name of the remote-worker node, as in supervisor.yaml
+              required: true
+              type: string
+            - name: worker
+              in: query
+              description: Worker identifier, shown in the statistics and logs
+              required: true
+              type: string
+            - name: wait
+              in: query
+              description: Maximum number of seconds to wait for an execution (max. 30)
+              required: false
+              type: integer
+            - name: Token
+              in: header
+              description: Worker token, configured in the node attributes as "worker_token"
+              required: true
+              type: string
+        responses:
+            200:
+                description: Leased execution - lease id, script, environment, timeout and heartbeat interval
+            204:
+                description: Nothing to execute, poll again
+            403:
+                description: When the worker token does not match
+                schema:
+                    $ref: '#/definitions/RequestError'
+            404:
+                description: When the node does not exist, or is not a remote-worker node
+                schema:
+                    $ref: '#/definitions/RequestError'
+        """
+
+        queue = self._get_lease_queue(node_name)
+        worker = self.get_query_argument('worker', self.request.remote_ip)
+        deadline = time.time() + min(float(self.get_query_argument('wait', 20)), self.MAX_POLL_TIME)
+
+        loop = IOLoop.current()
+        submitted = Event()
+        unsubscribe = queue.subscribe(lambda: loop.add_callback(submitted.set))
+
+        try:
+            while True:
+                job = queue.lease(worker)
+
+                if job:
+                    self.write(dict(job.payload, lease_id=job.lease_id, attempt=job.attempts))
+                    return
+
+                remaining = deadline - time.time()
+
+                if remaining <= 0:
+                    self.set_status(204)
+                    return
+
+                try:
+                    await submitted.wait(timeout=timedelta(seconds=remaining))
+                except gen.TimeoutError:
+                    pass
+
+                submitted.clear()
+
+        finally:
+            unsubscribe()
+
+
+class WorkerHeartbeatHandler(BaseWorkerHandler):  # pragma: no cover
+    def post(self, node_name: str, lease_id: str):
+        """
+        ---
+        tags: ['worker']
+        summary: Extend the lease and send the output
+        description: Request body is a new part of the execution output (can be empty)
+        parameters:
+            - name: node_name
+              in: path
+              required: true
+              type: string
+            - name: lease_id
+              in: path
+              required: true
+              type: string
+            - name: Token
+              in: header
+              required: true
+              type: string
+        responses:
+            200:
+                description: Lease extended
+            410:
+                description: Lease expired or was cancelled, the worker should kill the execution
+                schema:
+                    $ref: '#/definitions/RequestError'
+        """
+
+        if not self._get_lease_queue(node_name).heartbeat(lease_id, self.request.body):
+            self.raise_lease_lost_error()
+
+        self.write({'status': 'OK'})
+
+
+class WorkerFinishHandler(BaseWorkerHandler):  # pragma: no cover
+    def post(self, node_name: str, lease_id: str):
+        """
+        ---
+        tags: ['worker']
+        summary: Report the result of a leased execution
+        description: Request body is a JSON with "exit_code" of the pipeline script, and optionally "output" -
+            the rest of the output (base64), that was not sent with heartbeats
+        parameters:
+            - name: node_name
+              in: path
+              required: true
+              type: string
+            - name: lease_id
+              in: path
+              required: true
+              type: string
+            - name: Token
+              in: header
+              required: true
+              type: string
+        responses:
+            200:
+                description: Result accepted
+            400:
+                description: Missing exit code
+                schema:
+                    $ref: '#/definitions/RequestError'
+            410:
+                description: Lease expired or was cancelled, the result is not accepted
+                schema:
+                    $ref: '#/definitions/RequestError'
+        """
+
+        queue = self._get_lease_queue(node_name)
+
+        try:
+            body = json.loads(self.request.body.decode('utf-8'))
+            exit_code = int(body['exit_code'])
+            chunk = base64.b64decode(body.get('output', ''), validate=True)
+
+        except (ValueError, KeyError, TypeError):
+            self.raise_validation_error('"exit_code" is missing or is not a number, or "output" is not base64')
+            return
+
+        if not queue.finish(lease_id, exit_code, chunk):
+            self.raise_lease_lost_error()
+
+        self.write({'status': 'OK'})
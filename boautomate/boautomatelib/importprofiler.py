@@ -0,0 +1,89 @@
+"""
+    Import Profiler
+    ===============
+
+    Measures how long each module takes to import (--profile-startup), similar to "python -X importtime",
+    but reported by the application itself, grouped by the top-level package.
+"""
+
+import importlib.abc
+import sys
+import time
+from collections import OrderedDict
+from typing import Dict, List
+
+
+class ImportProfiler(importlib.abc.MetaPathFinder):
+    _stack: List[List[float]]
+    _timings: Dict[str, tuple]
+
+    def __init__(self):
+        self._stack = []
+        self._timings = OrderedDict()
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+
+            spec = finder.find_spec(fullname, path, target)
+
+            if spec is None:
+                continue
+
+            # builtin and frozen modules are loaded by shared importer classes, these are cheap anyway
+            if spec.loader is not None and not isinstance(spec.loader, type) and hasattr(spec.loader, 'exec_module'):
+                spec.loader.exec_module = self._measure(fullname, spec.loader.exec_module)
+
+            return spec
+
+        return None
+
+    def _measure(self, name: str, exec_module):
+        def measured(module):
+            self._stack.append([0.0])
+            started_at = time.perf_counter()
+
+            try:
+                return exec_module(module)
+            finally:
+                cumulative = time.perf_counter() - started_at
+                children = self._stack.pop()[0]
+                self._timings[name] = (cumulative - children, cumulative)
+
+                if self._stack:
+                    self._stack[-1][0] += cumulative
+
+        return measured
+
+    def get_report(self, limit: int = 25) -> str:
+        """ Time spent per top-level package, and the slowest modules (self time excludes imports of other modules) """
+
+        packages = {}
+
+        for name, (own, cumulative) in self._timings.items():
+            package = name.split('.')[0]
+            packages[package] = packages.get(package, 0.0) + own
+
+        lines = ['Import time by package (ms):']
+
+        for package, own in sorted(packages.items(), key=lambda item: item[1], reverse=True)[0:limit]:
+            lines.append('  %10.1f  %s' % (own * 1000, package))
+
+        lines.append('Slowest modules (self ms / cumulative ms):')
+
+        slowest = sorted(self._timings.items(), key=lambda item: item[1][0], reverse=True)[0:limit]
+
+        for name, (own, cumulative) in slowest:
+            lines.append('  %10.1f / %10.1f  %s' % (own * 1000, cumulative * 1000, name))
+
+        lines.append('Total: %.1f ms in %i modules' % (sum(packages.values()) * 1000, len(self._timings)))
+
+        return '\n'.join(lines)
@@ -0,0 +1,118 @@
+"""
+    Database instrumentation
+    ========================
+
+    Measures time of every SQL statement executed by the engine, using SQLAlchemy cursor events.
+    Keeps a latency histogram per statement and logs slow queries.
+"""
+
+import threading
+import time
+from typing import Dict, List
+from sqlalchemy import event
+from sqlalchemy.engine.base import Engine
+
+from .logger import Logger
+
+
+class StatementStats:
+    """ Latency of a single (parametrized) SQL statement """
+
+    # upper bounds of histogram buckets, in milliseconds
+    BUCKETS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+    statement: str
+    count: int
+    total_ms: float
+    max_ms: float
+    histogram: List[int]
+
+    def __init__(self, statement: str):
+        self.statement = statement
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.histogram = [0] * (len(self.BUCKETS) + 1)
+
+    def record(self, duration_ms: float):
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+
+        for num, upper_bound in enumerate(self.BUCKETS):
+            if duration_ms <= upper_bound:
+                self.histogram[num] += 1
+                return
+
+        self.histogram[-1] += 1
+
+    def to_dict(self) -> dict:
+        # the last bucket has no upper bound
+        bounds = self.BUCKETS + [None]
+
+        return {
+            'statement': self.statement,
+            'count': self.count,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0,
+            'max_ms': round(self.max_ms, 3),
+            'histogram': list(map(lambda bucket: {'le_ms': bucket[0], 'count': bucket[1]},
+                                  zip(bounds, self.histogram)))
+        }
+
+
+class QueryInstrumentation:
+    """
+    Attached to an Engine, collects statistics of executed statements.
+
+    Number of tracked statements is limited, statements over the limit are accounted together as "other".
+    """
+
+    MAX_STATEMENTS = 250
+    OTHER = '(other)'
+
+    _slow_query_ms: float
+    _stats: Dict[str, StatementStats]
+    _lock: threading.Lock
+
+    def __init__(self, slow_query_ms: float = 0):
+        self._slow_query_ms = slow_query_ms
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def attach(self, engine: Engine):
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def get_stats(self) -> list:
+        """ Statistics of statements, the most time consuming first """
+
+        with self._lock:
+            stats = list(map(lambda entry: entry.to_dict(), self._stats.values()))
+
+        return sorted(stats, key=lambda entry: entry['total_ms'], reverse=True)
+
+    def record(self, statement: str, duration_ms: float):
+        with self._lock:
+            if statement not in self._stats:
+                if len(self._stats) >= self.MAX_STATEMENTS:
+                    statement = self.OTHER
+
+                self._stats.setdefault(statement, StatementStats(statement))
+
+            self._stats[statement].record(duration_ms)
+
+        if self._slow_query_ms and duration_ms >= self._slow_query_ms:
+            Logger.warning('Slow query (%.1fms): %s' % (duration_ms, ' '.join(statement.split())))
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # kept on the execution context, not on the connection - a failed statement never gets to "after" event
+        if context is not None:
+            context.boautomate_started_at = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started_at = getattr(context, 'boautomate_started_at', None)
+
+        if started_at is not None:
+            self.record(statement, (time.perf_counter() - started_at) * 1000)
@@ -2,16 +2,27 @@
 from sqlalchemy.orm.session import Session
 
 from .persistence import ORM
+from .instrumentation import QueryInstrumentation
 from .filesystem import Filesystem
+from .filesystem.lazy import LazyFilesystem
 from .filesystem.factory import FSFactory
+from .filesystem.cache import FileCache
+from .filesystem.watcher import Watcher, create_watcher
+from .filesystem.refresh import RefreshScheduler
 from .filesystem.templating import Templating
-from .repository import PipelineRepository, ExecutionRepository, TokenRepository, LocksRepository
+from .repository import PipelineRepository, ExecutionRepository, ExecutionLogRepository, TokenRepository, \
+    LocksRepository
 from .supervisor import Supervisor
 from .supervisor.factory import SupervisorFactory
 from .tokenmanager import TokenManager
 from .locks import LocksManager
+from .runner import ExecutionRunner
+from .jobqueue import JobQueue
+from .maintenance import Reaper
+from .startup import StartupReport
 from .resolver import Resolver
 from .logger import Logger
+from .schema import Schema
 
 
 class Container:
@@ -22,46 +33,144 @@ class Container:
     """
 
     connection: ORM
+    query_instrumentation: QueryInstrumentation
     orm: Session  # type: Session
     fs_factory: FSFactory
+    file_cache: FileCache  # None, when disabled
+    fs_watcher: Watcher  # None, when disabled
+    storage_refresh: RefreshScheduler
     filesystem: Filesystem
     fs_tpl: Templating
     pipeline_repository: PipelineRepository
     execution_repository: ExecutionRepository
+    execution_log_repository: ExecutionLogRepository
     lock_repository: LocksRepository
     token_repository: TokenRepository
     token_manager: TokenManager
     supervisor: Supervisor
     self_url: str
+    admin_token: str
     local_path: str
     resolver: Resolver
     supervisor_factory: SupervisorFactory
+    execution_runner: ExecutionRunner
+    execution_queue: JobQueue  # None, when executions are synchronous
+    reaper: Reaper  # None, when the maintenance is disabled
+    startup_report: StartupReport
 
     def __init__(self, params: dict):
         Logger.debug('Initializing the IoC container')
 
+        self.startup_report = StartupReport()
         self.resolver = Resolver(params)
         self.local_path = params['local_path']
+        workers = int(params['startup_workers'])
+
+        with self.startup_report.measure('schema'):
+            Schema.preload()
 
         # http
         self.self_url = params['node_master_url']
+        self.admin_token = params['admin_token']
 
         # database related
-        self.connection = ORM(params['db_string'])
+        self.query_instrumentation = QueryInstrumentation(slow_query_ms=float(params['db_slow_query_ms']))
+
+        with self.startup_report.measure('database'):
+            self.connection = ORM(
+                db_string=params['db_string'],
+                pool_size=int(params['db_pool_size']),
+                max_overflow=int(params['db_max_overflow']),
+                pool_pre_ping=bool(params['db_pool_pre_ping']),
+                echo=params['log_level'] == 'debug',
+                instrumentation=self.query_instrumentation
+            )
         self.orm = self.connection.session
         self.execution_repository = ExecutionRepository(self.orm)
+        self.execution_log_repository = ExecutionLogRepository(self.orm)
         self.token_repository = TokenRepository(orm=self.orm)
         self.lock_repository = LocksRepository(orm=self.orm)
         self.token_manager = TokenManager(repository=self.token_repository)
 
         # filesystem related
-        self.fs_factory = FSFactory(self.resolver)
-        self.filesystem = self.fs_factory.create()
-        self.fs_tpl = Templating(self.filesystem, self.fs_factory)
-        self.pipeline_repository = PipelineRepository(self.filesystem, self.fs_tpl)
+        is_watched = params.get('fs_watch', 'off') != 'off'
+        self.file_cache = FileCache(int(params['fs_cache_size']), trusted=is_watched) \
+            if int(params.get('fs_cache_size', 0)) > 0 else None
+        self.storage_refresh = RefreshScheduler(workers=int(params['storage_refresh_workers']))
+        self.fs_factory = FSFactory(self.resolver, self.file_cache, self.storage_refresh, self.startup_report)
+        self.filesystem = self.fs_factory.create(workers=workers, lazy=bool(params['lazy_storages']))
+        self.storage_refresh.start()
+        self.fs_tpl = Templating(self.filesystem, self.fs_factory, verify_revisions=not is_watched)
+        self.pipeline_repository = PipelineRepository(self.filesystem, self.fs_tpl, verify_revisions=not is_watched)
+        self.fs_watcher = self._create_fs_watcher(params) if is_watched else None
 
         self.locks_manager = LocksManager(repository=self.lock_repository, fs_templating=self.fs_tpl)
 
         # supervisors related
-        self.supervisor_factory = SupervisorFactory(self.resolver, self.self_url, self.pipeline_repository)
+        self.supervisor_factory = SupervisorFactory(self.resolver, self.self_url, self.pipeline_repository,
+                                                    workers=workers, startup_report=self.startup_report)
         self.supervisor = self.supervisor_factory.create()
+
+        # execution
+        self.execution_runner = ExecutionRunner(
+            repository=self.execution_repository,
+            log_repository=self.execution_log_repository,
+            token_manager=self.token_manager,
+            supervisor=self.supervisor,
+            filesystem=self.filesystem,
+            log_flush_interval=float(params['execution_log_flush_interval']),
+            log_memory_limit=int(params['execution_log_memory_limit'])
+        )
+        self.execution_queue = None
+
+        if params.get('execution_mode') == 'async':
+            self.execution_queue = JobQueue(workers=int(params['execution_workers']),
+                                            max_size=int(params['execution_queue_size']))
+            self.execution_queue.start()
+
+        # maintenance
+        self.reaper = None
+
+        if int(params.get('maintenance_interval', 0)) > 0:
+            self.reaper = Reaper(
+                connection=self.connection,
+                locks_repository=self.lock_repository,
+                token_repository=self.token_repository,
+                locks_manager=self.locks_manager,
+                interval=int(params['maintenance_interval']),
+                batch_size=int(params['maintenance_batch_size'])
+            )
+            self.reaper.start()
+
+        self.startup_report.finish()
+
+    def _create_fs_watcher(self, params: dict) -> Watcher:
+        """ Watches local directories of storages and schemas, changes invalidate the caches """
+
+        watcher = create_watcher(params['fs_watch'], {'schema': Schema.get_directory()},
+                                 float(params['fs_watch_poll_interval']))
+
+        for name, adapter in self.fs_factory.constructed.items():
+            if isinstance(adapter, LazyFilesystem):
+                adapter.on_ready(lambda constructed, name=name: self._watch_storage(watcher, name, constructed))
+            else:
+                self._watch_storage(watcher, name, adapter)
+
+        watcher.subscribe(self.pipeline_repository.on_file_change)
+        watcher.subscribe(self.fs_tpl.on_file_change)
+        watcher.subscribe(Schema.on_file_change)
+
+        if self.file_cache:
+            watcher.subscribe(self.file_cache.on_file_change)
+
+        watcher.start()
+
+        return watcher
+
+    @staticmethod
+    def _watch_storage(watcher: Watcher, name: str, adapter: Filesystem):
+        if adapter.get_local_path():
+            watcher.watch(name, adapter.get_local_path())
+        else:
+            # storages without a local directory (eg. GIT snapshots) publish their changes on their own
+            adapter.subscribe(watcher.publish)
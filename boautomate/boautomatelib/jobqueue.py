@@ -0,0 +1,59 @@
+"""
+    Job Queue
+    =========
+
+    Bounded in-process queue drained by a pool of worker threads.
+    Allows to accept a Pipeline Execution request immediately and run it in the background.
+"""
+
+import queue
+import threading
+import traceback
+from typing import Callable, List
+
+from .exceptions import ExecutionQueueFullException
+from .logger import Logger
+
+
+class JobQueue:
+    _queue: queue.Queue
+    _workers: List[threading.Thread]
+    _workers_count: int
+
+    def __init__(self, workers: int, max_size: int):
+        self._queue = queue.Queue(maxsize=max_size)
+        self._workers = []
+        self._workers_count = workers
+
+    def start(self):
+        """ Spawn worker threads. Workers are daemons, so they do not block the application shutdown """
+
+        Logger.info('Starting %i job queue workers' % self._workers_count)
+
+        for num in range(0, self._workers_count):
+            worker = threading.Thread(target=self._worker_main, name='job-queue-worker-%i' % num, daemon=True)
+            worker.start()
+
+            self._workers.append(worker)
+
+    def submit(self, job: Callable):
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            raise ExecutionQueueFullException('Execution queue is full (%i jobs waiting)' % self._queue.maxsize)
+
+        Logger.debug('Job submitted, %i jobs in queue' % self._queue.qsize())
+
+    def size(self) -> int:
+        return self._queue.qsize()
+
+    def _worker_main(self):
+        while True:
+            job = self._queue.get()
+
+            try:
+                job()
+            except Exception:
+                Logger.error('Job failed in queue worker: ' + traceback.format_exc())
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,79 @@
+"""
+    Keyword Matcher
+    ===============
+
+    Finds many keywords in a text with a single scan (Aho-Corasick automaton).
+    Each keyword is associated with a value, search returns values of all keywords that occur in the text.
+"""
+
+from collections import deque
+from typing import Dict, List, Set
+
+
+class KeywordMatcher:
+    _goto: List[Dict[str, int]]
+    _fail: List[int]
+    _output: List[Set]
+    _always: Set
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [set()]
+        self._always = set()
+
+    def add(self, keyword: str, value):
+        """ Adds a keyword. Needs to be followed by build() when all keywords are added """
+
+        # empty keyword is contained in any text
+        if not keyword:
+            self._always.add(value)
+            return
+
+        state = 0
+
+        for char in keyword:
+            if char not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(set())
+                self._goto[state][char] = len(self._goto) - 1
+
+            state = self._goto[state][char]
+
+        self._output[state].add(value)
+
+    def build(self):
+        """ Computes failure links, so the search never goes back in the text """
+
+        queue = deque(self._goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] |= self._output[self._fail[next_state]]
+
+        return self
+
+    def search(self, text: str) -> set:
+        found = set(self._always)
+        state = 0
+
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+
+            state = self._goto[state].get(char, 0)
+
+            if self._output[state]:
+                found |= self._output[state]
+
+        return found
@@ -1,9 +1,14 @@
 
 import re
 import json
+import heapq
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Pattern
 
 from .repository import LocksRepository
-from .persistence import Pipeline
+from .persistence import Pipeline, Lock
+from .keywordmatcher import KeywordMatcher
 from .logger import Logger
 from .schema import Schema
 from .exceptions import RequestValidationException, SchemaValidationException
@@ -13,10 +18,16 @@ from .filesystem.templating import Templating
 class LocksManager:
     repo: LocksRepository
     templating: Templating
+    _indexes: Dict[str, 'LockIndex']
+    _generations: Dict[str, int]
+    _indexes_lock: threading.Lock
 
     def __init__(self, repository: LocksRepository, fs_templating: Templating):
         self.repo = repository
         self.templating = fs_templating
+        self._indexes = {}
+        self._generations = {}
+        self._indexes_lock = threading.Lock()
 
     @staticmethod
     def validate_filters_for_lock(keywords, regexp: str, schema: str):
@@ -44,74 +55,163 @@ class LocksManager:
             - Blocks run that payload schema is valid with defined schema
             - Blocks run that payload has matches by defined regexp
 
+        Locks are evaluated using an in-memory index, that is rebuilt after a Lock is created, updated or deleted.
+
         :param pipeline:
         :param payload:
         :return:
         """
 
-        all_locks_on_pipe = self.repo.find_all_for_pipe(pipeline.id)
+        if self._get_index(pipeline.id).is_blocking(payload):
+            Logger.info('Pipeline run blocked by a lock')
+            return True
+
+        Logger.debug('Pipeline run is not blocked')
+        return False
+
+    def invalidate(self, pipeline_id: str):
+        """ Needs to be called after any change of Locks of given Pipeline """
+
+        with self._indexes_lock:
+            self._indexes.pop(pipeline_id, None)
+            self._generations[pipeline_id] = self._generations.get(pipeline_id, 0) + 1
+
+    def _get_index(self, pipeline_id: str) -> 'LockIndex':
+        index = self._indexes.get(pipeline_id)
+
+        if index is None:
+            generation = self._generations.get(pipeline_id, 0)
+            index = LockIndex(self.repo.find_all_for_pipe(pipeline_id))
+
+            # do not store an index built from data that was modified in the meantime
+            with self._indexes_lock:
+                if self._generations.get(pipeline_id, 0) == generation:
+                    self._indexes[pipeline_id] = index
+
+        return index
+
+
+class CompiledLock:
+    """ Lock with filters prepared to be matched against many payloads """
+
+    id: str
+    expires_at: datetime
+    regexp: Optional[Pattern]
+    validator: any
+    keywords: list
+    filters_count: int
+
+    def __init__(self, lock: Lock):
+        self.id = lock.id
+        self.expires_at = lock.expires_at
+        self.filters_count = lock.count_payload_filters()
+        self.regexp = re.compile(lock.payload_regexp) if lock.payload_regexp else None
+        self.validator = Schema.compile(dict(json.loads(lock.payload_schema))) if lock.payload_schema else None
+        self.keywords = lock.payload_keywords if lock.payload_keywords else []
+
+        if type(self.keywords) is not list:
+            raise RequestValidationException('Payload keywords in a Lock needs to be of a "list" type')
+
+
+class LockIndex:
+    """
+    All active Locks of a single Pipeline, with compiled filters.
+
+    Keywords of all Locks are searched in the payload at once, the payload is decoded only once.
+    Expired locks are evicted in order of expiration.
+    """
+
+    _locks: Dict[str, CompiledLock]
+    _keywords: KeywordMatcher
+    _expiration_heap: list
+    _lock: threading.Lock
+
+    def __init__(self, locks: List[Lock]):
+        self._locks = {}
+        self._keywords = KeywordMatcher()
+        self._expiration_heap = []
+        self._lock = threading.Lock()
 
-        for lock in all_locks_on_pipe:
+        for lock in locks:
             if lock.is_expired():
                 Logger.debug('Lock "%s" is expired' % lock.id)
                 continue
 
-            enabled_checks_count = lock.count_payload_filters()
-            checks = []
+            try:
+                compiled = CompiledLock(lock)
+            except Exception as e:
+                Logger.error('Cannot compile Lock "%s" for pipeline_id=%s, skipping it. %s' %
+                             (lock.id, lock.pipeline_id, str(e)))
+                continue
 
-            Logger.debug('Checking Lock "%s" with "%i" filters' % (lock.id, enabled_checks_count))
+            self._locks[compiled.id] = compiled
+            heapq.heappush(self._expiration_heap, (compiled.expires_at, compiled.id))
 
-            if lock.payload_regexp:
-                try:
-                    checks.append(len(re.findall(lock.payload_regexp, payload)) > 0)
-                    Logger.debug('Payload was matched by regexp "%s" on lock "%s"' % (lock.payload_regexp, str(lock.id)))
+            for keyword in compiled.keywords:
+                self._keywords.add(str(keyword), compiled.id)
 
-                except re.error as e:
-                    Logger.error('Error compiling regexp "%s" in LocksManager, for pipeline_id=%s. %s' %
-                                 (lock.payload_regexp, pipeline.id, str(e)))
-                    continue
+        self._keywords.build()
 
-            if lock.payload_schema:
-                try:
-                    Schema.validate(payload=dict(json.loads(payload)),
-                                    schema=dict(json.loads(lock.schema.encode('utf-8'))))
-                    checks.append(True)
-                    Logger.info('Payload was matched by schema')
+    def is_blocking(self, payload: str) -> bool:
+        self._evict_expired()
 
-                except SchemaValidationException as e:
-                    Logger.debug('Payload not matched by schema, but schema validation present. ' + str(e))
+        locks = list(self._locks.values())
+        keyword_hits = self._keywords.search(payload) if locks else set()
+        parsed_payload = None
 
-                    checks.append(False)
-                except Exception as e:
-                    Logger.error('Error when validating schema in LocksManager. ' + str(e))
-                    continue
+        for lock in locks:
+            Logger.debug('Checking Lock "%s" with "%i" filters' % (lock.id, lock.filters_count))
+
+            if lock.filters_count == 0:
+                """ Case: When any Pipeline Execution is blocked """
+                return True
+
+            if lock.regexp and not lock.regexp.search(payload):
+                continue
+
+            if lock.keywords and lock.id not in keyword_hits:
+                continue
+
+            if lock.validator:
+                if parsed_payload is None:
+                    parsed_payload = self._parse_payload(payload)
 
-            if lock.payload_keywords:
-                if not type(lock.payload_keywords) == list:
-                    Logger.error('Payload keywords in a Lock needs to be of a "list" type')
+                if not self._is_matching_schema(lock, parsed_payload):
                     continue
 
-                for keyword in lock.payload_keywords:
-                    if keyword in payload:
-                        Logger.debug('"%s" keyword matches the payload, blocking')
-                        checks.append(True)
-                        break
+            """ Case: When a specific Pipeline Execution is blocked, when the payload is matching all criteria """
+            Logger.debug('Payload matches all filters of Lock "%s"' % lock.id)
+            return True
 
-            hits = list(filter(lambda match: match is True, checks))
+        return False
 
-            if len(checks) == 0:
-                """ Case: When any Pipeline Execution is blocked """
+    def _evict_expired(self):
+        now = datetime.now()
 
-                Logger.info('Pipeline run blocked without checks')
-                return True
+        with self._lock:
+            while self._expiration_heap and self._expiration_heap[0][0] < now:
+                expires_at, lock_id = heapq.heappop(self._expiration_heap)
+                self._locks.pop(lock_id, None)
 
-            if enabled_checks_count == len(hits):
-                """ Case: When a specific Pipeline Execution is blocked, when the payload is matching
-                          some criteria. 
-                """
+                Logger.debug('Lock "%s" expired at %s' % (lock_id, str(expires_at)))
 
-                Logger.info('Pipeline run blocked with checks')
-                return True
+    @staticmethod
+    def _parse_payload(payload: str):
+        try:
+            return dict(json.loads(payload))
+        except Exception:
+            return False
 
-        Logger.debug('Pipeline run is not blocked')
-        return False
+    @staticmethod
+    def _is_matching_schema(lock: CompiledLock, parsed_payload) -> bool:
+        if parsed_payload is False:
+            Logger.debug('Payload is not a JSON object, so it cannot match schema of Lock "%s"' % lock.id)
+            return False
+
+        try:
+            Schema.validate_with(lock.validator, parsed_payload)
+            return True
+
+        except SchemaValidationException as e:
+            Logger.debug('Payload not matched by schema, but schema validation present. ' + str(e))
+            return False
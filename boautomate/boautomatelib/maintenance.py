@@ -0,0 +1,98 @@
+"""
+    Maintenance
+    ===========
+
+    Periodic clean up of the database, running in a background thread of the master process.
+    Deletes expired Locks and Tokens that cannot be used anymore, in batches, so the tables do not grow without bound.
+"""
+
+import threading
+import time
+import traceback
+from collections import namedtuple
+
+from .persistence import ORM
+from .repository import LocksRepository, TokenRepository
+from .locks import LocksManager
+from .logger import Logger
+
+MaintenanceReport = namedtuple('MaintenanceReport', 'finished_at duration deleted_locks deleted_tokens')
+
+
+class Reaper:
+    _connection: ORM
+    _locks_repository: LocksRepository
+    _token_repository: TokenRepository
+    _locks_manager: LocksManager
+    _interval: int
+    _batch_size: int
+    _thread: threading.Thread
+    last_report: MaintenanceReport
+
+    def __init__(self, connection: ORM, locks_repository: LocksRepository, token_repository: TokenRepository,
+                 locks_manager: LocksManager, interval: int, batch_size: int):
+        self._connection = connection
+        self._locks_repository = locks_repository
+        self._token_repository = token_repository
+        self._locks_manager = locks_manager
+        self._interval = interval
+        self._batch_size = batch_size
+        self.last_report = None
+
+    def start(self):
+        Logger.info('Scheduling a database maintenance every %i seconds' % self._interval)
+
+        self._thread = threading.Thread(target=self._thread_main, name='maintenance', daemon=True)
+        self._thread.start()
+
+    def run_once(self) -> MaintenanceReport:
+        started_at = time.time()
+        deleted_locks = self._reap_locks()
+        deleted_tokens = self._reap_tokens()
+
+        self.last_report = MaintenanceReport(
+            finished_at=time.time(),
+            duration=time.time() - started_at,
+            deleted_locks=deleted_locks,
+            deleted_tokens=deleted_tokens
+        )
+
+        Logger.info('Maintenance: Reclaimed %i expired locks and %i tokens in %.3fs' % (
+            deleted_locks, deleted_tokens, self.last_report.duration))
+
+        return self.last_report
+
+    def _reap_locks(self) -> int:
+        total = 0
+
+        while True:
+            deleted_per_pipeline = self._locks_repository.delete_expired(self._batch_size)
+
+            for pipeline_id in deleted_per_pipeline.keys():
+                self._locks_manager.invalidate(pipeline_id)
+
+            deleted = sum(deleted_per_pipeline.values())
+            total += deleted
+
+            if deleted < self._batch_size:
+                return total
+
+    def _reap_tokens(self) -> int:
+        total = 0
+
+        while True:
+            deleted = self._token_repository.delete_inactive_or_expired(self._batch_size)
+            total += deleted
+
+            if deleted < self._batch_size:
+                return total
+
+    def _thread_main(self):
+        while True:
+            time.sleep(self._interval)
+
+            try:
+                with self._connection.scope():
+                    self.run_once()
+            except Exception:
+                Logger.error('Maintenance failed: ' + traceback.format_exc())
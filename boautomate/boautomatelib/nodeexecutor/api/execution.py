@@ -2,7 +2,7 @@
 import sys
 from requests import Response
 
-from ...http.pipeline.api.execution import route_execute
+from ...routes import route_execute
 from ...exceptions import PipelineSyntaxError
 from . import Api
 
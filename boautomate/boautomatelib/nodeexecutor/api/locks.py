@@ -5,7 +5,7 @@ from datetime import datetime, timedelta
 
 from ...exceptions import PipelineSyntaxError, PipelineLockedException, TimeoutException
 from . import Api
-from ...http.pipeline.api.locks import route_put_lock, route_delete_lock, route_get_lock
+from ...routes import route_put_lock, route_delete_lock, route_get_lock
 from ..pipeline import wait_until
 
 """
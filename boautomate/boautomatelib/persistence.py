@@ -1,32 +1,115 @@
 
-from sqlalchemy import create_engine, Column, Integer, String, types, DateTime, Boolean, ForeignKey, PrimaryKeyConstraint, JSON
+from sqlalchemy import create_engine, inspect, Column, Integer, String, types, DateTime, Boolean, ForeignKey, PrimaryKeyConstraint, JSON, Index, LargeBinary
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship
 from sqlalchemy.dialects.mysql.base import MSText
 from sqlalchemy.orm.session import Session
 from sqlalchemy.engine.base import Engine
 from typing import Callable
+from contextlib import contextmanager
 from datetime import datetime
 import uuid
+import zlib
 from .logger import Logger
+from .instrumentation import QueryInstrumentation
 Base = declarative_base()
 
 
 class Attributes:
+    STATUS_QUEUED = 'queued'
     STATUS_IN_PROGRESS = 'in-progress'
     STATUS_DONE = 'success'
     STATUS_FAILURE = 'failure'
 
 
 class ORM:
+    """
+        Database connection
+
+        Each thread gets its own Session from the registry (scoped_session), sessions share a pool of connections.
+        Repositories commit their changes, a thread should call remove() when it finishes its unit of work,
+        so the connection is given back to the pool.
+    """
+
     engine: Engine
     session: Session  # type: Session
 
-    def __init__(self, db_string: str):
+    def __init__(self, db_string: str, pool_size: int = 5, max_overflow: int = 10, pool_pre_ping: bool = False,
+                 echo: bool = False, instrumentation: QueryInstrumentation = None):
         Logger.info('ORM is initializing')
-        self.engine = create_engine(db_string, echo=True)
-        self.session = sessionmaker(bind=self.engine, autoflush=False, autocommit=True)()
+        self.engine = create_engine(db_string, echo=echo,
+                                    **self._get_pool_options(db_string, pool_size, max_overflow, pool_pre_ping))
+
+        if instrumentation:
+            instrumentation.attach(self.engine)
+
+        self.session = scoped_session(
+            sessionmaker(bind=self.engine, autoflush=False, autocommit=False, expire_on_commit=False)
+        )
         Base.metadata.create_all(self.engine)
+        self._create_missing_columns()
+        self._create_missing_indexes()
+
+    def remove(self):
+        """ Closes the Session of current thread, gives the connection back to the pool """
+
+        self.session.remove()
+
+    @contextmanager
+    def scope(self):
+        """ Unit of work for threads living longer than a single task (eg. thread pools) """
+
+        try:
+            yield self.session
+        finally:
+            self.remove()
+
+    @staticmethod
+    def _get_pool_options(db_string: str, pool_size: int, max_overflow: int, pool_pre_ping: bool) -> dict:
+        options = {'pool_pre_ping': pool_pre_ping}
+
+        # SQLite does not use a QueuePool, so the size cannot be configured
+        if not db_string.startswith('sqlite'):
+            options['pool_size'] = pool_size
+            options['max_overflow'] = max_overflow
+
+        return options
+
+    def _create_missing_columns(self):
+        """ create_all() does not alter existing tables, nullable columns added later are added there """
+
+        inspector = inspect(self.engine)
+
+        for table in Base.metadata.sorted_tables:
+            existing = list(map(lambda column: column['name'], inspector.get_columns(table.name)))
+
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    Logger.info('ORM is adding missing column "%s.%s"' % (table.name, column.name))
+
+                    with self.engine.begin() as connection:
+                        connection.execute('ALTER TABLE %s ADD COLUMN %s %s' % (
+                            table.name, column.name, column.type.compile(self.engine.dialect)))
+
+    def _create_missing_indexes(self):
+        """ create_all() skips already existing tables, so indexes added later need to be created separately """
+
+        inspector = inspect(self.engine)
+
+        for table in Base.metadata.sorted_tables:
+            existing = list(map(lambda index: index['name'], inspector.get_indexes(table.name)))
+
+            for index in table.indexes:
+                if index.name not in existing:
+                    Logger.info('ORM is creating missing index "%s"' % index.name)
+
+                    try:
+                        index.create(self.engine)
+                    except SQLAlchemyError as e:
+                        # eg. a unique index cannot be created, when duplicates were already stored
+                        Logger.error('Cannot create index "%s", please fix the data manually. Details: %s' % (
+                            index.name, str(e)))
 
 
 class UUID(types.TypeDecorator):
@@ -64,7 +147,9 @@ class Pipeline:
     supervisor_label: str
     configs: list
     params: dict
+    requirements: str
     retrieve_script: Callable
+    retrieve_requirements: Callable
 
     def get_configuration_payloads(self):
         if type(self.configs) is not list:
@@ -74,9 +159,17 @@ class Pipeline:
 
 
 class Execution(Base):
-    """ Every single execution of a Pipeline """
+    """
+        Every single execution of a Pipeline
+
+        Output is stored separately, as ExecutionLogChunk. The "log" column is kept only for executions
+        recorded before the output was stored in chunks.
+    """
 
     __tablename__ = 'execution'
+    __table_args__ = (
+        Index('ix_execution_pipeline_number', 'pipeline_id', 'execution_number', unique=True),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     execution_number = Column(Integer, nullable=False)
@@ -86,6 +179,9 @@ class Execution(Base):
     pipeline_id = Column(String, nullable=False)
     status = Column(String, nullable=False, default=Attributes.STATUS_IN_PROGRESS)
 
+    # version of the storages (eg. a GIT commit) the execution was started with
+    revision = Column(String, nullable=True)
+
     def to_ident_string(self) -> str:
         return 'pipe_' + self.pipeline_id + '_exec_' + str(self.execution_number)
 
@@ -94,28 +190,63 @@ class Execution(Base):
             'id': self.id,
             'execution_number': self.execution_number,
             'invoked_by_ip': self.invoked_by_ip,
-            'payload': self.payload,
-            'log': self.log,
-            'status': self.status
+            'status': self.status,
+            'revision': self.revision
         }
 
-    def mark_as_finished(self, result: bool, log: str):
-        self.log = log
+    def mark_as_finished(self, result: bool):
         self.status = Attributes.STATUS_DONE if result else Attributes.STATUS_FAILURE
 
 
+class ExecutionCounter(Base):
+    """
+        Last allocated execution number of a Pipeline. Incremented atomically, so concurrent executions
+        cannot get the same number.
+    """
+
+    __tablename__ = 'execution_counter'
+
+    pipeline_id = Column(String, primary_key=True)
+    last_number = Column(Integer, nullable=False, default=0)
+
+
+class ExecutionLogChunk(Base):
+    """
+        Part of an Execution output, appended while the Pipeline is running.
+        Stored compressed, "offset" and "length" describe position of the chunk in the (uncompressed, UTF-8) output.
+    """
+
+    __tablename__ = 'execution_log_chunk'
+    __table_args__ = (
+        Index('ix_execution_log_chunk_offset', 'execution_id', 'offset'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    execution_id = Column(Integer, ForeignKey('execution.id'), nullable=False, index=True)
+    offset = Column(Integer, nullable=False)
+    length = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+
+    def set_content(self, content: bytes):
+        self.length = len(content)
+        self.data = zlib.compress(content)
+
+    def get_content(self) -> bytes:
+        return zlib.decompress(self.data)
+
+
 class Token(Base):
     """
         Access tokens - assigned to a pipeline and execution, or unassigned
-        Never deleted, only deactivated.
+        Deactivated when not needed anymore, then deleted by the periodic maintenance together with expired ones.
     """
 
     __tablename__ = 'token'
 
     id = Column(UUID, primary_key=True)
-    pipeline_id = Column(String, nullable=True)
-    expires_at = Column(DateTime, nullable=False)
-    active = Column(Boolean, nullable=False, default=True)
+    pipeline_id = Column(String, nullable=True, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    active = Column(Boolean, nullable=False, default=True, index=True)
     execution_id = Column(Integer, ForeignKey('execution.id'))
     execution = relationship("Execution")  # type: Execution
 
@@ -126,7 +257,7 @@ class Lock(Base):
         for given resource. With a lock we can mark that
         eg. "we pushed 1.0.5 tag at git, so we don't want to be notified that it was pushed, so we can skip event if lock exists"
 
-        Locks are deleted from database when not needed anymore and when expired.
+        Locks are deleted from database when not needed anymore, expired locks are deleted by the periodic maintenance.
     """
 
     __tablename__ = 'lock'
@@ -136,8 +267,8 @@ class Lock(Base):
     )
 
     id = Column(String, nullable=False)             # lock name, custom
-    pipeline_id = Column(String, nullable=False)
-    expires_at = Column(DateTime, nullable=False)
+    pipeline_id = Column(String, nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
     payload_regexp = Column(String, nullable=True)   # optional regexp to filter payload by
     payload_schema = Column(String, nullable=True)   # optional jsonschema to filter payload by
     payload_keywords = Column(JSON, nullable=True)   # optional keywords to filter payload by
@@ -25,5 +25,6 @@ class PipelineParser:
         pipe.configs = parsed['configs']
         pipe.title = parsed['title']
         pipe.params = parsed['params']
+        pipe.requirements = parsed.get('requirements', '')
 
         return pipe
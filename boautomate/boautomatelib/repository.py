@@ -1,18 +1,25 @@
 
-from .persistence import Pipeline, Execution, Token, Lock
-from .filesystem import Filesystem
+from .persistence import Pipeline, Execution, ExecutionCounter, ExecutionLogChunk, Token, Lock
+from .filesystem import Filesystem, Dependency
 from .filesystem.templating import Templating
 from .pipelineparser import PipelineParser
 from .exceptions import EntityNotFound
+from .logger import Logger
 from sqlalchemy.orm.session import Session
-from sqlalchemy import func, desc
+from sqlalchemy.orm import defer
+from sqlalchemy import func, desc, or_
 from sqlalchemy.orm.exc import NoResultFound as ORMNoResultFound
-from typing import List
+from sqlalchemy.exc import IntegrityError
+from typing import List, Dict
+from collections import namedtuple
 from uuid import uuid4
 import datetime
+import threading
 from json import loads as json_loads
 from json import JSONDecodeError
 
+PipelineCacheEntry = namedtuple('PipelineCacheEntry', 'pipeline dependencies')
+
 
 class BaseRepository:
     orm: Session
@@ -20,28 +27,108 @@ class BaseRepository:
     def __init__(self, orm: Session):
         self.orm = orm
 
+    def _save(self, entity):
+        self.orm.add(entity)
+        self._commit()
+
+    def _commit(self):
+        """ Ends the transaction. On failure the transaction is rolled back, so the Session stays usable """
+
+        try:
+            self.orm.commit()
+        except Exception:
+            self.orm.rollback()
+            raise
+
 
 class PipelineRepository:
+    """
+    Pipelines are stored as JSON files on the storage.
+
+    Parsed Pipelines are cached. Cache entry is valid as long as revisions of the definition file
+    and all of the included files did not change.
+
+    When the storages are watched for changes, the revisions are not verified on each access,
+    entries are dropped on change events instead.
+    """
+
     fs: Filesystem
     fs_tpl: Templating
-
-    def __init__(self, fs: Filesystem, fs_tpl: Templating):
+    cache_hits: int
+    cache_misses: int
+    _cache: Dict[str, PipelineCacheEntry]
+    _cache_lock: threading.Lock
+    _verify_revisions: bool
+    _generation: int
+
+    def __init__(self, fs: Filesystem, fs_tpl: Templating, verify_revisions: bool = True):
         self.fs = fs
         self.fs_tpl = fs_tpl
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self._verify_revisions = verify_revisions
+        self._generation = 0
 
     def find_by_id(self, pipeline_id: str) -> Pipeline:
         """ Find a Pipeline by it's id (filename without extension) """
 
-        return self._read_pipeline(
-            id=pipeline_id,
-            content=self.fs.retrieve_file(Filesystem.PIPELINES_PATH + '/' + pipeline_id + '.json')
-        )
+        entry = self._cache.get(pipeline_id)
+
+        if entry and (not self._verify_revisions or self._is_up_to_date(entry)):
+            with self._cache_lock:
+                self.cache_hits += 1
+
+            return entry.pipeline
+
+        with self._cache_lock:
+            self.cache_misses += 1
+            generation = self._generation
+
+        path = Filesystem.PIPELINES_PATH + '/' + pipeline_id + '.json'
+        dependencies = [Dependency(filesystem=self.fs, name=path, revision=self.fs.get_revision(path))]
+        pipeline = self._read_pipeline(id=pipeline_id, content=self.fs.retrieve_file(path), dependencies=dependencies)
+
+        if None not in map(lambda dependency: dependency.revision, dependencies):
+            with self._cache_lock:
+                # files could change while they were read
+                if generation == self._generation:
+                    self._cache[pipeline_id] = PipelineCacheEntry(pipeline=pipeline, dependencies=dependencies)
+
+        return pipeline
+
+    def on_file_change(self, event):
+        """ Subscriber of a file watcher: drops Pipelines that depend on the changed file """
+
+        with self._cache_lock:
+            self._generation += 1
+
+            for pipeline_id, entry in list(self._cache.items()):
+                if any(map(lambda dependency: event.affects(dependency.name), entry.dependencies)):
+                    del self._cache[pipeline_id]
+
+    def get_cache_stats(self) -> dict:
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'size': len(self._cache)
+        }
 
-    def _read_pipeline(self, id: str, content: str) -> Pipeline:
+    @staticmethod
+    def _is_up_to_date(entry: PipelineCacheEntry) -> bool:
+        for dependency in entry.dependencies:
+            if dependency.filesystem.get_revision(dependency.name) != dependency.revision:
+                Logger.debug('Pipeline cache: "%s" was modified' % dependency.name)
+                return False
+
+        return True
+
+    def _read_pipeline(self, id: str, content: str, dependencies: list) -> Pipeline:
         """ Create a Pipeline object from file content """
 
         pipeline = PipelineParser.parse(id, content)
-        pipeline.configs = self.fs_tpl.inject_includes(pipeline.configs)
+        pipeline.configs = self.fs_tpl.inject_includes(pipeline.configs, dependencies=dependencies)
 
         if type(pipeline.configs) == str:
             try:
@@ -49,37 +136,109 @@ class PipelineRepository:
             except JSONDecodeError:
                 pass
 
-        pipeline.retrieve_script = lambda: self.fs_tpl.inject_includes(pipeline.script, deep=False)
+        pipeline.retrieve_script = lambda storage=None: self.fs_tpl.inject_includes(
+            pipeline.script, deep=False, storage=storage)
+        pipeline.retrieve_requirements = lambda storage=None: self.fs_tpl.inject_includes(
+            pipeline.requirements, deep=False, storage=storage)
 
         return pipeline
 
 
 class ExecutionRepository(BaseRepository):
-    """ Each Pipeline execution is recorded there """
+    """
+    Each Pipeline execution is recorded there
+
+    Execution number is allocated from a per-pipeline counter, in the same transaction as the Execution is inserted.
+    """
 
-    def create(self, pipeline: Pipeline, ip_address: str, payload: str, log: str) -> Execution:
+    def create(self, pipeline: Pipeline, ip_address: str, payload: str) -> Execution:
         execution = Execution()
         execution.pipeline_id = pipeline.id
         execution.invoked_by_ip = ip_address
         execution.payload = payload
-        execution.log = log
-        execution.execution_number = int(self.find_last_execution_number(pipeline)) + 1
+        execution.log = ''  # output is stored in ExecutionLogRepository
 
         return execution
 
     def flush(self, execution: Execution):
-        self.orm.add(execution)
-        self.orm.flush([execution])
+        """ Stores the Execution. A new Execution gets its number there """
+
+        if execution.id is None:
+            try:
+                execution.execution_number = self._allocate_execution_number(execution.pipeline_id)
+            except Exception:
+                self.orm.rollback()
+                raise
+
+        self._save(execution)
+
+    def _allocate_execution_number(self, pipeline_id: str) -> int:
+        """ Increments the counter. The row stays locked until the transaction is committed """
+
+        updated = self.orm.query(ExecutionCounter) \
+            .filter(ExecutionCounter.pipeline_id == pipeline_id) \
+            .update({ExecutionCounter.last_number: ExecutionCounter.last_number + 1}, synchronize_session=False)
+
+        if not updated:
+            # first execution since the counter was introduced, continue numbering of already stored executions
+            counter = ExecutionCounter()
+            counter.pipeline_id = pipeline_id
+            counter.last_number = self._find_max_execution_number(pipeline_id) + 1
+
+            try:
+                self.orm.add(counter)
+                self.orm.flush([counter])
+            except IntegrityError:
+                # other thread created the counter in the meantime
+                self.orm.rollback()
+                return self._allocate_execution_number(pipeline_id)
+
+        return self.orm.query(ExecutionCounter.last_number) \
+            .filter(ExecutionCounter.pipeline_id == pipeline_id) \
+            .scalar()
 
     def find_last_executions(self, pipeline: Pipeline, limit: int):
+        """ Summaries only - the payload and legacy log are not loaded """
+
         return self.orm.query(Execution)\
+            .options(defer(Execution.payload), defer(Execution.log)) \
             .filter(Execution.pipeline_id == pipeline.id) \
             .order_by(desc(Execution.id)) \
             .limit(limit)\
             .all()
 
-    def find_last_execution_number(self, pipeline: Pipeline):
-        last_num = self.orm.query(func.max(Execution.execution_number)).filter(Execution.pipeline_id == pipeline.id)\
+    def find_by_id(self, execution_id: int) -> Execution:
+        try:
+            return self.orm.query(Execution).filter(Execution.id == execution_id).one()
+        except ORMNoResultFound:
+            raise EntityNotFound('Execution id=%i not found' % execution_id)
+
+    def find_by_number(self, pipeline: Pipeline, execution_number: int) -> Execution:
+        try:
+            return self.orm.query(Execution) \
+                .filter(Execution.pipeline_id == pipeline.id, Execution.execution_number == execution_number) \
+                .limit(1) \
+                .one()
+        except ORMNoResultFound:
+            raise EntityNotFound('Execution #%i of pipeline "%s" not found' % (execution_number, pipeline.id))
+
+    def find_status(self, execution: Execution) -> str:
+        """ Fresh status read directly from the database, bypassing the session identity map """
+
+        return self.orm.query(Execution.status).filter(Execution.id == execution.id).scalar()
+
+    def find_last_execution_number(self, pipeline: Pipeline) -> int:
+        last_num = self.orm.query(ExecutionCounter.last_number) \
+            .filter(ExecutionCounter.pipeline_id == pipeline.id) \
+            .scalar()
+
+        if last_num is None:
+            return self._find_max_execution_number(pipeline.id)
+
+        return last_num
+
+    def _find_max_execution_number(self, pipeline_id: str) -> int:
+        last_num = self.orm.query(func.max(Execution.execution_number)).filter(Execution.pipeline_id == pipeline_id)\
             .scalar()
 
         if not last_num:
@@ -88,6 +247,61 @@ class ExecutionRepository(BaseRepository):
         return last_num
 
 
+class ExecutionLogRepository(BaseRepository):
+    """
+    Output of Executions, stored in compressed chunks while the Pipeline is running
+
+    Each chunk knows its position in the output, so any range of the output can be read without
+    decompressing the whole log.
+    """
+
+    def append(self, execution: Execution, content: str, offset: int) -> ExecutionLogChunk:
+        """ "offset" is the size of the output stored so far, known by the only writer of the output - the runner """
+
+        chunk = ExecutionLogChunk()
+        chunk.execution_id = execution.id
+        chunk.offset = offset
+        chunk.set_content(content.encode('utf-8'))
+
+        self._save(chunk)
+
+        return chunk
+
+    def find_log_size(self, execution: Execution) -> int:
+        """ Size in bytes of the uncompressed output (for readers, it is not cheap on long outputs) """
+
+        size = self.orm.query(func.max(ExecutionLogChunk.offset + ExecutionLogChunk.length)) \
+            .filter(ExecutionLogChunk.execution_id == execution.id) \
+            .scalar()
+
+        return size if size else 0
+
+    def find_chunks_since(self, execution: Execution, last_chunk_id: int, limit: int = 100) -> List[ExecutionLogChunk]:
+        return self.orm.query(ExecutionLogChunk) \
+            .filter(ExecutionLogChunk.execution_id == execution.id, ExecutionLogChunk.id > last_chunk_id) \
+            .order_by(ExecutionLogChunk.id) \
+            .limit(limit) \
+            .all()
+
+    def read_range(self, execution: Execution, start: int, end: int) -> bytes:
+        """ Reads bytes of the output from "start" to "end" (exclusive) """
+
+        chunks = self.orm.query(ExecutionLogChunk) \
+            .filter(ExecutionLogChunk.execution_id == execution.id,
+                    ExecutionLogChunk.offset < end,
+                    ExecutionLogChunk.offset + ExecutionLogChunk.length > start) \
+            .order_by(ExecutionLogChunk.offset) \
+            .all()
+
+        if not chunks:
+            return b''
+
+        content = b''.join(map(lambda chunk: chunk.get_content(), chunks))
+        content_start = chunks[0].offset
+
+        return content[start - content_start:end - content_start]
+
+
 class TokenRepository(BaseRepository):
     def create(self, pipeline: Pipeline, execution: Execution):
         token = Token()
@@ -101,8 +315,23 @@ class TokenRepository(BaseRepository):
         return token
 
     def flush(self, token: Token):
-        self.orm.add(token)
-        self.orm.flush([token])
+        self._save(token)
+
+    def delete_inactive_or_expired(self, limit: int) -> int:
+        """ Deletes a batch of tokens that cannot be used anymore. Returns number of deleted tokens """
+
+        ids = list(map(lambda row: row[0], self.orm.query(Token.id)
+                       .filter(or_(Token.active.is_(False), Token.expires_at < datetime.datetime.now()))
+                       .limit(limit)
+                       .all()))
+
+        if not ids:
+            return 0
+
+        deleted = self.orm.query(Token).filter(Token.id.in_(ids)).delete(synchronize_session=False)
+        self._commit()
+
+        return deleted
 
     def find_by_id(self, id: str) -> Token:
         try:
@@ -143,10 +372,30 @@ class LocksRepository(BaseRepository):
         except ORMNoResultFound:
             raise EntityNotFound('Lock not found')
 
+    def delete_expired(self, limit: int) -> Dict[str, int]:
+        """ Deletes a batch of expired locks. Returns number of deleted locks per pipeline """
+
+        now = datetime.datetime.now()
+        expired = self.orm.query(Lock.id, Lock.pipeline_id).filter(Lock.expires_at < now).limit(limit).all()
+        ids_by_pipeline = {}
+
+        for lock_id, pipeline_id in expired:
+            ids_by_pipeline.setdefault(pipeline_id, []).append(lock_id)
+
+        deleted = {}
+
+        for pipeline_id, ids in ids_by_pipeline.items():
+            deleted[pipeline_id] = self.orm.query(Lock) \
+                .filter(Lock.pipeline_id == pipeline_id, Lock.id.in_(ids), Lock.expires_at < now) \
+                .delete(synchronize_session=False)
+
+        self._commit()
+
+        return deleted
+
     def delete(self, lock: Lock):
         self.orm.delete(lock)
-        self.orm.flush([lock])
+        self._commit()
 
     def flush(self, lock: Lock):
-        self.orm.add(lock)
-        self.orm.flush([lock])
+        self._save(lock)
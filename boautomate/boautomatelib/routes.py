@@ -0,0 +1,47 @@
+"""
+    Routes
+    ======
+
+    URLs of the HTTP API. Kept apart from the handlers, so the node side (NodeExecutor) can build URLs
+    without importing the HTTP server.
+"""
+
+
+def route_execution_status(pipeline_id: str, execution_number: int) -> str:
+    return '/pipeline/%s/execute?execution_number=%i' % (pipeline_id, execution_number)
+
+
+def route_execution_log(pipeline_id: str, execution_number: int) -> str:
+    return '/pipeline/%s/execution/%i/log' % (pipeline_id, execution_number)
+
+
+def route_execute(context_pipeline_id: str, pipeline_to_execute_id: str) -> str:
+    return '/pipeline/%s/api/execute-other?pipeline_id=%s' % (context_pipeline_id, pipeline_to_execute_id)
+
+
+def route_put_lock(pipeline_id: str, lock_id: str) -> str:
+    return "/pipeline/%s/api/lock/%s" % (pipeline_id, lock_id)
+
+
+def route_delete_lock(pipeline_id: str, lock_id: str) -> str:
+    return route_put_lock(pipeline_id, lock_id)
+
+
+def route_get_lock(pipeline_id: str, lock_id: str) -> str:
+    return route_put_lock(pipeline_id, lock_id)
+
+
+def route_refresh_storage(storage_name: str) -> str:
+    return "/storage/%s/refresh" % storage_name
+
+
+def route_worker_lease(node_name: str) -> str:
+    return "/worker/%s/lease" % node_name
+
+
+def route_worker_heartbeat(node_name: str, lease_id: str) -> str:
+    return "/worker/%s/lease/%s/heartbeat" % (node_name, lease_id)
+
+
+def route_worker_finish(node_name: str, lease_id: str) -> str:
+    return "/worker/%s/lease/%s/finish" % (node_name, lease_id)
@@ -0,0 +1,128 @@
+"""
+    Execution Runner
+    ================
+
+    Runs a Pipeline Execution on a Supervisor and records the result.
+    Shared between synchronous HTTP requests and background queue workers.
+"""
+
+import traceback
+from collections import namedtuple
+from typing import Callable
+
+from .filesystem import Filesystem
+from .persistence import Pipeline, Execution, Attributes
+from .repository import ExecutionRepository, ExecutionLogRepository
+from .supervisor import Supervisor
+from .supervisor.base import OutputStream, ExecutionResult
+from .tokenmanager import TokenManager
+from .logger import Logger
+
+PipelineSources = namedtuple('PipelineSources', 'script requirements revision')
+
+
+class ExecutionRunner:
+    _repository: ExecutionRepository
+    _log_repository: ExecutionLogRepository
+    _token_manager: TokenManager
+    _supervisor: Supervisor
+    _filesystem: Filesystem
+    _log_flush_interval: float
+    _log_memory_limit: int
+
+    def __init__(self, repository: ExecutionRepository, log_repository: ExecutionLogRepository,
+                 token_manager: TokenManager, supervisor: Supervisor, filesystem: Filesystem,
+                 log_flush_interval: float, log_memory_limit: int):
+        self._repository = repository
+        self._log_repository = log_repository
+        self._token_manager = token_manager
+        self._supervisor = supervisor
+        self._filesystem = filesystem
+        self._log_flush_interval = log_flush_interval
+        self._log_memory_limit = log_memory_limit
+
+    def read_sources(self, pipeline: Pipeline) -> PipelineSources:
+        """
+        Script and requirements, read from one pinned version of the storages - a refresh in the meantime
+        does not change them, and the recorded revision is the one that is executed
+        """
+
+        storage = self._filesystem.pin()
+        script = pipeline.retrieve_script(storage)
+        requirements = pipeline.retrieve_requirements(storage)
+
+        # taken after reading, lazy storages are pinned when accessed for the first time
+        return PipelineSources(script=script, requirements=requirements, revision=storage.get_version())
+
+    def create_execution(self, pipeline: Pipeline, ip_address: str, payload: str, status: str,
+                         sources: PipelineSources) -> Execution:
+        """ Persist a new Execution, so it gets its number and is visible on the executions list """
+
+        execution = self._repository.create(
+            pipeline=pipeline,
+            ip_address=ip_address,
+            payload=payload
+        )
+        execution.status = status
+        execution.revision = sources.revision
+        self._repository.flush(execution)
+
+        return execution
+
+    def run(self, pipeline: Pipeline, execution: Execution, sources: PipelineSources, payload: str,
+            query: dict, headers: dict) -> ExecutionResult:
+
+        """ Execute the script and mark the Execution as finished. Output is stored in the log repository """
+
+        execution.status = Attributes.STATUS_IN_PROGRESS
+        self._repository.flush(execution)
+
+        output = OutputStream(
+            on_chunk=self._create_log_writer(execution),
+            flush_interval=self._log_flush_interval,
+            memory_limit=self._log_memory_limit
+        )
+
+        try:
+            with self._token_manager.transaction(pipeline, execution) as token:
+                run = self._supervisor.execute(
+                    execution=execution,
+                    script=sources.script,
+                    payload=payload,
+                    communication_token=token,
+                    query=query,
+                    headers=headers,
+                    configuration_payloads=pipeline.get_configuration_payloads(),
+                    params=pipeline.params,
+                    requirements=sources.requirements,
+                    output=output
+                )
+
+        except Exception:
+            Logger.error('Execution "%s" crashed' % execution.to_ident_string())
+            crash_details = traceback.format_exc()
+
+            output.write(crash_details.encode('utf-8'))
+            output.close()
+            execution.mark_as_finished(False)
+            self._repository.flush(execution)
+            raise
+
+        # all chunks need to be stored before the Execution is marked as finished
+        output.close()
+
+        execution.mark_as_finished(run.is_success())
+        self._repository.flush(execution)
+
+        return run
+
+    def _create_log_writer(self, execution: Execution) -> Callable:
+        """ The runner is the only writer of the output, so it keeps the offset instead of querying the database """
+
+        offset = 0
+
+        def append(chunk: str):
+            nonlocal offset
+            offset += self._log_repository.append(execution, chunk, offset).length
+
+        return append
@@ -1,18 +1,97 @@
 
 import os
+import threading
 from json import loads as json_loads, JSONDecodeError
 from yaml import load as yaml_load, FullLoader as YamlFullLoader
-from jsonschema import validate
-from jsonschema.exceptions import ValidationError as JsonSchemaValidationError
+from jsonschema.validators import validator_for
+from jsonschema.exceptions import ValidationError as JsonSchemaValidationError, SchemaError as JsonSchemaError
 
-from .exceptions import SchemaNotFoundError, SchemaValidationException
+from .exceptions import SchemaException, SchemaNotFoundError, SchemaValidationException
+from .logger import Logger
 
 
 class Schema:
     """
     Parses and validates configuration schemas, input payloads
+
+    Validators for named schemas (files in the "schema" directory) are built and checked once,
+    then kept in a process-wide registry.
     """
 
+    SCHEMA_FILE_SUFFIX = '.schema.json'
+
+    _validators = {}
+    _validators_lock = threading.Lock()
+
+    @staticmethod
+    def preload():
+        """ Builds validators for all known schemas, so the first request does not pay the cost """
+
+        schema_dir = Schema._get_schema_dir() + '/schema/'
+
+        for root, dirs, files in os.walk(schema_dir):
+            for file_name in files:
+                if not file_name.endswith(Schema.SCHEMA_FILE_SUFFIX):
+                    continue
+
+                path = os.path.join(root, file_name)[len(schema_dir):]
+                Schema.get_validator(path[0:-len(Schema.SCHEMA_FILE_SUFFIX)])
+
+        Logger.info('Schema: Preloaded %i validators' % len(Schema._validators))
+
+    @staticmethod
+    def reload(name: str = None):
+        """ Drops cached validator (or all validators, when no name given), so the schema is read again """
+
+        with Schema._validators_lock:
+            if name is None:
+                Schema._validators = {}
+                return
+
+            Schema._validators.pop(name, None)
+
+    @staticmethod
+    def on_file_change(event):
+        """ Subscriber of a file watcher, for events of the "schema" directory (see get_directory()) """
+
+        if event.source != 'schema':
+            return
+
+        if event.path is None or not event.path.endswith(Schema.SCHEMA_FILE_SUFFIX):
+            Schema.reload()
+            return
+
+        Schema.reload(event.path[0:-len(Schema.SCHEMA_FILE_SUFFIX)])
+
+    @staticmethod
+    def get_directory() -> str:
+        return Schema._get_schema_dir() + '/schema'
+
+    @staticmethod
+    def get_validator(name: str):
+        validator = Schema._validators.get(name)
+
+        if validator is None:
+            validator = Schema.compile(Schema.load(name))
+
+            with Schema._validators_lock:
+                Schema._validators[name] = validator
+
+        return validator
+
+    @staticmethod
+    def compile(schema: dict):
+        """ Builds a validator for a schema, checking the schema itself only once """
+
+        validator_class = validator_for(schema)
+
+        try:
+            validator_class.check_schema(schema)
+        except JsonSchemaError as e:
+            raise SchemaException('Invalid schema: %s' % str(e.message))
+
+        return validator_class(schema)
+
     @staticmethod
     def load(name: str):
         path = Schema._get_schema_dir() + '/schema/' + name + '.schema.json'
@@ -29,12 +108,16 @@ class Schema:
 
     @staticmethod
     def validate_parsed_payload(parsed_payload, schema_name: str):
-        return Schema.validate(parsed_payload, Schema.load(schema_name))
+        return Schema.validate_with(Schema.get_validator(schema_name), parsed_payload)
 
     @staticmethod
     def validate(payload, schema):
+        Schema.validate_with(Schema.compile(schema), payload)
+
+    @staticmethod
+    def validate_with(validator, payload):
         try:
-            validate(instance=payload, schema=schema)
+            validator.validate(payload)
 
         except JsonSchemaValidationError as e:
             raise SchemaValidationException(str(e.message))
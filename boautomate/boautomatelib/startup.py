@@ -0,0 +1,73 @@
+"""
+    Startup
+    =======
+
+    Components that are slow to construct (GIT storages cloning a repository, supervisors connecting to Docker)
+    are constructed in parallel. Time spent on each component is recorded and logged, when the application is ready.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+from .logger import Logger
+
+
+class StartupReport:
+    _timings: OrderedDict
+    _lock: threading.Lock
+    _started_at: float
+    _finished_at: float
+
+    def __init__(self):
+        self._timings = OrderedDict()
+        self._lock = threading.Lock()
+        self._started_at = time.time()
+        self._finished_at = None
+
+    @contextmanager
+    def measure(self, component: str):
+        started_at = time.time()
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._timings[component] = time.time() - started_at
+
+    def finish(self):
+        self._finished_at = time.time()
+
+        Logger.info('Started in %.3fs: %s' % (self._finished_at - self._started_at, ', '.join(
+            map(lambda item: '%s=%.3fs' % item, self.to_dict()['components'].items()))))
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            components = OrderedDict(sorted(self._timings.items(), key=lambda item: item[1], reverse=True))
+
+        return {
+            'total': (self._finished_at - self._started_at) if self._finished_at else None,
+            'components': components
+        }
+
+
+def run_in_parallel(tasks: Dict[str, Callable], workers: int, report: StartupReport = None) -> Dict[str, object]:
+    """ Runs the tasks on a thread pool, results are returned in order of the tasks. First error is raised """
+
+    def measured(name: str, task: Callable):
+        if not report:
+            return task()
+
+        with report.measure(name):
+            return task()
+
+    if workers <= 1 or len(tasks) <= 1:
+        return OrderedDict((name, measured(name, task)) for name, task in tasks.items())
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='startup') as pool:
+        futures = OrderedDict((name, pool.submit(measured, name, task)) for name, task in tasks.items())
+
+        return OrderedDict((name, future.result()) for name, future in futures.items())
@@ -1,10 +1,16 @@
 import abc
 import json
 import os
+import codecs
+import threading
+import traceback
+import tempfile
 from collections import namedtuple
+from typing import Callable, Optional
 from tzlocal import get_localzone
 
 from ..persistence import Execution
+from ..logger import Logger
 
 
 class ExecutionResult:
@@ -19,6 +25,113 @@ class ExecutionResult:
         return self.exit_code == 0
 
 
+class OutputStream:
+    """
+    Collects output of a running Pipeline.
+
+    New output is periodically passed to the listener in chunks (eg. to be stored in database),
+    so the log can be watched while the Pipeline is still running.
+
+    The complete output is retained in memory up to "memory_limit" bytes, then it is spilled to a temporary file,
+    so a chatty Pipeline cannot exhaust the memory. getvalue() returns at most the last "memory_limit" bytes,
+    the complete log is what the listener received. The temporary file is released on close().
+    """
+
+    _on_chunk: Callable
+    _flush_interval: float
+    _decoder: codecs.IncrementalDecoder
+    _pending: list
+    _retained: tempfile.SpooledTemporaryFile
+    _memory_limit: int
+    _value: Optional[str]
+    _lock: threading.Lock
+    _closed: threading.Event
+    _flusher: threading.Thread
+
+    def __init__(self, on_chunk: Callable = None, flush_interval: float = 2.0, memory_limit: int = 1024 * 1024):
+        self._on_chunk = on_chunk
+        self._flush_interval = flush_interval
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._pending = []
+        self._retained = tempfile.SpooledTemporaryFile(max_size=memory_limit, mode='w+b', prefix='boautomate-log-')
+        self._memory_limit = memory_limit
+        self._value = None
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flusher_main, daemon=True)
+
+        if self._on_chunk:
+            self._flusher.start()
+
+    def write(self, data: bytes):
+        with self._lock:
+            # eg. a crash reported after the supervisor closed the stream still goes to the listener
+            if not self._retained.closed:
+                self._retained.write(data)
+
+            if self._on_chunk:
+                self._pending.append(self._decoder.decode(data))
+
+    def flush(self):
+        with self._lock:
+            chunk = ''.join(self._pending)
+            self._pending = []
+
+        if chunk:
+            try:
+                self._on_chunk(chunk)
+            except Exception:
+                Logger.error('Cannot store output chunk: ' + traceback.format_exc())
+
+    def close(self):
+        """ Stops the periodic flushing, flushes everything that is left and releases the retained output """
+
+        if self._on_chunk:
+            with self._lock:
+                self._pending.append(self._decoder.decode(b'', final=True))
+
+        self._closed.set()
+
+        if self._flusher.is_alive():
+            self._flusher.join()
+
+        if self._on_chunk:
+            self.flush()
+
+        with self._lock:
+            if not self._retained.closed:
+                self._value = self._read_tail()
+                self._retained.close()
+
+    def getvalue(self) -> str:
+        """ Last "memory_limit" bytes of the output """
+
+        with self._lock:
+            if self._value is not None:
+                return self._value
+
+            return self._read_tail()
+
+    def _read_tail(self) -> str:
+        self._retained.seek(0, os.SEEK_END)
+        size = self._retained.tell()
+        self._retained.seek(max(0, size - self._memory_limit))
+        content = self._retained.read()
+
+        if size <= self._memory_limit:
+            return content.decode('utf-8', errors='replace')
+
+        # the cut could be in the middle of a multi-byte character
+        content = content.lstrip(bytes(range(0x80, 0xC0)))
+
+        return '(output truncated to the last %i bytes)\n' % self._memory_limit + \
+            content.decode('utf-8', errors='replace')
+
+    def _flusher_main(self):
+        while not self._closed.wait(self._flush_interval):
+            self.flush()
+
+
 class Supervisor(abc.ABC):
     _master_url: str
 
@@ -27,9 +140,25 @@ class Supervisor(abc.ABC):
 
     @abc.abstractmethod
     def execute(self, execution: Execution, script: str, payload: str, communication_token: str,
-                query: dict, headers: dict, configuration_payloads: list, params: dict) -> ExecutionResult:
+                query: dict, headers: dict, configuration_payloads: list, params: dict, requirements: str = '',
+                output: OutputStream = None) -> ExecutionResult:
+        """
+        Runs the script. Output should be written to the "output" stream as soon as it appears,
+        so it can be watched live. "requirements" are Python packages (requirements.txt format) the script needs.
+        """
+
         pass
 
+    def get_stats(self) -> Optional[dict]:
+        """ Metrics of the supervisor, None when it has nothing to report """
+
+        return None
+
+    def get_lease_queue(self):
+        """ Queue of executions leased by remote workers, None when the supervisor runs the executions itself """
+
+        return None
+
     def prepare_environment(self, payload: str,
                             communication_token: str,
                             query: dict,
@@ -68,5 +197,9 @@ class Supervisor(abc.ABC):
         return os.path.dirname(os.path.abspath(__file__)) + '/../../../'
 
 
-SupervisorDefinition = namedtuple('SupervisorDefinition', 'default labels supervisor name')
-Settings = namedtuple('Settings', 'selection_strategy')
+SupervisorDefinition = namedtuple('SupervisorDefinition', 'default labels supervisor name max_concurrent weight')
+Settings = namedtuple('Settings', 'selection_strategy max_wait max_waiting')
+
+# namedtuple(defaults=...) requires Python 3.7
+SupervisorDefinition.__new__.__defaults__ = (0, 1)
+Settings.__new__.__defaults__ = (60, 100)
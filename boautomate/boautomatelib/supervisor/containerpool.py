@@ -0,0 +1,230 @@
+"""
+    Container Pool
+    ==============
+
+    Keeps already started containers of an image, so an execution does not wait for creating a container.
+
+    A container is checked out for a single execution and destroyed after it - containers are never reused, so one
+    pipeline cannot see what other pipeline left. The pool is refilled in background up to "min_idle" containers,
+    and never holds more than "max_total" containers (idle and checked out together).
+"""
+
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from typing import Callable, Deque, Optional
+
+from ..logger import Logger
+
+
+class IdleContainer:
+    container: object
+    started_at: float
+
+    def __init__(self, container, started_at: float):
+        self.container = container
+        self.started_at = started_at
+
+
+class ContainerPool:
+    LABEL = 'org.riotkit.boautomate.pool'
+    LATENCY_SAMPLES = 500
+
+    _create: Callable
+    _min_idle: int
+    _max_total: int
+    _max_idle_age: float
+    _idle: Deque[IdleContainer]
+    _total: int
+    _starting: int
+    _condition: threading.Condition
+    _latencies: Deque[float]
+    _thread: Optional[threading.Thread]
+
+    pool_id: str
+    checkouts: int
+    hits: int
+    misses: int
+    discarded: int
+
+    def __init__(self, create: Callable, min_idle: int = 0, max_total: int = 0, max_idle_age: float = 3600):
+        """
+        :param create: Creates a started container, receives name and labels
+        :param min_idle: Number of started containers waiting for executions, 0 disables the pooling
+        :param max_total: Maximum number of containers, 0 means no limit
+        :param max_idle_age: Idle containers are recreated after that time, as they are started with a finite command
+        """
+
+        self._create = create
+        self._min_idle = min_idle
+        self._max_total = max_total
+        self._max_idle_age = max_idle_age
+        self._idle = deque()
+        self._total = 0
+        self._starting = 0
+        self._condition = threading.Condition()
+        self._latencies = deque(maxlen=self.LATENCY_SAMPLES)
+        self._thread = None
+
+        self.pool_id = uuid.uuid4().hex[0:12]
+        self.checkouts = 0
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+
+    def start(self):
+        if self._min_idle <= 0:
+            return
+
+        Logger.info('Keeping %i started container(s) in pool %s' % (self._min_idle, self.pool_id))
+
+        self._thread = threading.Thread(target=self._refill_main, name='container-pool-' + self.pool_id, daemon=True)
+        self._thread.start()
+
+    def checkout(self, name: str):
+        """ Takes a started container for an execution. Waits, when "max_total" containers are already in use """
+
+        started_at = time.time()
+
+        with self._condition:
+            while True:
+                idle = self._take_idle()
+
+                if idle or not self._max_total or self._total < self._max_total:
+                    break
+
+                self._condition.wait()
+
+            if not idle:
+                self._total += 1
+
+            self.checkouts += 1
+
+        container = self._use_idle(idle, name) if idle else None
+
+        with self._condition:
+            if container:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if not container:
+            try:
+                container = self._create(name=name, labels={self.LABEL: self.pool_id})
+            except Exception:
+                self._forget()
+                raise
+
+        with self._condition:
+            self._latencies.append(time.time() - started_at)
+            self._condition.notify_all()
+
+        return container
+
+    def release(self, container):
+        """ Destroys a container after the execution """
+
+        self._kill(container)
+        self._forget()
+
+    def get_stats(self) -> dict:
+        with self._condition:
+            latencies = sorted(self._latencies)
+
+            return {
+                'idle': len(self._idle),
+                'total': self._total,
+                'min_idle': self._min_idle,
+                'max_total': self._max_total,
+                'checkouts': self.checkouts,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / self.checkouts, 4) if self.checkouts else None,
+                'discarded': self.discarded,
+                'checkout_latency': {
+                    'avg_ms': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+                    'p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 2) if latencies else None,
+                    'max_ms': round(latencies[-1] * 1000, 2) if latencies else None
+                }
+            }
+
+    def _use_idle(self, idle: IdleContainer, name: str):
+        """ Returns None, when the container cannot be used (eg. it has died), its place in the pool is kept """
+
+        try:
+            idle.container.rename(name)
+            return idle.container
+
+        except Exception as e:
+            Logger.warning('Pooled container cannot be used, creating a new one: %s' % str(e))
+            self._kill(idle.container)
+
+            return None
+
+    def _take_idle(self) -> Optional[IdleContainer]:
+        """ Must be called with the lock held """
+
+        while self._idle:
+            idle = self._idle.popleft()
+
+            if time.time() - idle.started_at < self._max_idle_age:
+                return idle
+
+            self._discard(idle)
+
+        return None
+
+    def _discard(self, idle: IdleContainer):
+        """ Must be called with the lock held, the container is killed in background """
+
+        self.discarded += 1
+        threading.Thread(target=self.release, args=(idle.container,), daemon=True).start()
+
+    @staticmethod
+    def _kill(container):
+        try:
+            container.kill()
+        except Exception as e:
+            Logger.warning('Cannot kill container: %s' % str(e))
+
+    def _forget(self):
+        with self._condition:
+            self._total -= 1
+            self._condition.notify_all()
+
+    def _refill_main(self):
+        while True:
+            with self._condition:
+                for idle in [idle for idle in self._idle if time.time() - idle.started_at >= self._max_idle_age]:
+                    self._idle.remove(idle)
+                    self._discard(idle)
+
+                if len(self._idle) + self._starting >= self._min_idle \
+                        or (self._max_total and self._total >= self._max_total):
+                    self._condition.wait(timeout=60)
+                    continue
+
+                self._starting += 1
+                self._total += 1
+
+            try:
+                container = self._create(name='boautomate-pool-%s-%s' % (self.pool_id, uuid.uuid4().hex[0:8]),
+                                         labels={self.LABEL: self.pool_id})
+
+                with self._condition:
+                    self._idle.append(IdleContainer(container, time.time()))
+
+            except Exception:
+                Logger.error('Cannot start a container for the pool: ' + traceback.format_exc())
+
+                with self._condition:
+                    self._total -= 1
+
+                time.sleep(5)
+
+            finally:
+                with self._condition:
+                    self._starting -= 1
+                    self._condition.notify_all()
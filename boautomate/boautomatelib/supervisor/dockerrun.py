@@ -4,43 +4,101 @@
     =====================
 
     Runs the pipeline in a docker container spawning a new container on each run.
+    Containers can be started in advance (pool_min_idle), still each container is used only for a single run.
+
+    The library is copied into the container when it is created (from an archive built once),
+    only the script is copied for the execution.
 """
 
-import tarfile
-import io
-import os
-from docker import DockerClient
-from docker.models.containers import Container as DockerContainer, ExecResult
+import typing
 
 from ..persistence import Execution
 from ..logger import Logger
-from .base import Supervisor, ExecutionResult
+from .base import Supervisor, ExecutionResult, OutputStream
+from .containerpool import ContainerPool
+from .runtimearchive import RuntimeArchive
+
+
+if typing.TYPE_CHECKING:
+    from docker import DockerClient
+    from docker.models.containers import Container as DockerContainer
 
 
 class DockerRunSupervisor(Supervisor):
-    docker: DockerClient
+    # maximum time of a single run
+    RUN_TIME = 7200
+
+    docker: 'DockerClient'
     image: str
+    pool: ContainerPool
+    runtime_archive: RuntimeArchive
+    _sleep_time: int
 
-    def __init__(self, master_url: str, base_url=None, image: str = 'python:3.7-alpine'):
+    def __init__(self, master_url: str, base_url=None, image: str = 'python:3.7-alpine', pool_min_idle: int = 0,
+                 pool_max_total: int = 0, pool_max_idle_age: int = 3600):
         super().__init__(master_url)
+
+        # docker client library is heavy, imported only when a docker supervisor is configured
+        from docker import DockerClient
+
         self.docker = DockerClient(base_url=base_url)
         self.image = image
+        self.runtime_archive = RuntimeArchive.shared(self._get_boautomate_path())
+        self.runtime_archive.prepare_in_background()
+        self.pool = ContainerPool(self._create_container, min_idle=pool_min_idle, max_total=pool_max_total,
+                                  max_idle_age=pool_max_idle_age)
+        self.pool.start()
+
+        # a pooled container waits for an execution first, it needs to live longer
+        self._sleep_time = self.RUN_TIME + (pool_max_idle_age if pool_min_idle > 0 else 0)
 
     def execute(self, execution: Execution, script: str, payload: str, communication_token: str,
-                query: dict, headers: dict, configuration_payloads: list, params: dict) -> ExecutionResult:
+                query: dict, headers: dict, configuration_payloads: list, params: dict, requirements: str = '',
+                output: OutputStream = None) -> ExecutionResult:
+
+        Logger.debug('Taking a docker container')
+
+        container: 'DockerContainer' = self.pool.checkout(execution.to_ident_string())
+
+        if requirements and output:
+            output.write(b'[boautomate] Pipeline requirements are not installed in docker-run containers, ' +
+                         b'the image has to contain them\n')
+
+        try:
+            return self._execute_in_container(container, execution, script, payload, communication_token, query,
+                                              headers, configuration_payloads, params, output)
+        finally:
+            self.pool.release(container)
 
-        Logger.debug('Spawning docker container')
+    def get_stats(self) -> dict:
+        return {'container_pool': self.pool.get_stats(), 'runtime_archive': self.runtime_archive.get_stats()}
 
-        container: DockerContainer = self.docker.containers.run(
+    def _create_container(self, name: str, labels: dict) -> 'DockerContainer':
+        Logger.debug('Spawning docker container "%s"' % name)
+
+        container = self.docker.containers.run(
             image=self.image,
             remove=True,
             detach=True,
-            command='sleep 7200',
-            name=execution.to_ident_string(),
+            command='sleep %i' % self._sleep_time,
+            name=name,
+            labels=labels,
             stdin_open=True
         )
 
-        container.put_archive('/', self.prepare_archive(script))
+        try:
+            container.put_archive('/', self.runtime_archive.get_library_archive().content)
+        except Exception:
+            container.kill()
+            raise
+
+        return container
+
+    def _execute_in_container(self, container: 'DockerContainer', execution: Execution, script: str, payload: str,
+                              communication_token: str, query: dict, headers: dict, configuration_payloads: list,
+                              params: dict, output: OutputStream = None) -> ExecutionResult:
+
+        container.put_archive('/', RuntimeArchive.create_entrypoint_archive(script))
         # container.exec_run('/bin/sh -c "test -f ./requirements.txt && pip install -r ./requirements.txt"')
 
         env = self.prepare_environment(
@@ -52,37 +110,16 @@ class DockerRunSupervisor(Supervisor):
 
         Logger.debug('supervisor: ' + Supervisor.env_to_string(env))
 
-        run: ExecResult = container.exec_run('python3 entrypoint.py', environment=env)
-        container.kill()
-
-        return ExecutionResult(output=run.output.decode('utf-8'), exit_code=run.exit_code)
-
-    def prepare_archive(self, script: str) -> bytes:
-        """ Prepares the script as a TAR.GZ archive that will be natively unpacked by docker """
-
-        Logger.debug('Preparing a tar.gz to send to docker daemon')
-
-        tar_in_bytes = io.BytesIO()
-        tar = tarfile.open(fileobj=tar_in_bytes, mode='w:gz')
-
-        script_file = io.BytesIO(script.encode('utf-8'))
-        script_file.seek(0)
-
-        script_info = tarfile.TarInfo(name='entrypoint.py')
-        script_info.size = len(script)
-
-        # add script as entrypoint.py
-        tar.addfile(tarinfo=script_info, fileobj=script_file)
+        if output is None:
+            output = OutputStream()
 
-        # library
-        tar.add(self._get_boautomate_path() + '/../', '/opt/boautomate', recursive=True)
+        # low-level API is used to receive the output while the process is still running
+        exec_id = self.docker.api.exec_create(container.id, 'python3 entrypoint.py', environment=env)['Id']
 
-        # write
-        tar.close()
+        for chunk in self.docker.api.exec_start(exec_id, stream=True):
+            output.write(chunk)
 
-        tar_in_bytes.seek(0)
-        return tar_in_bytes.read()
+        exit_code = self.docker.api.exec_inspect(exec_id)['ExitCode']
+        output.close()
 
-    @staticmethod
-    def _get_boautomate_path():
-        return os.path.dirname(os.path.abspath(__file__)) + '/../../'
+        return ExecutionResult(output=output.getvalue(), exit_code=exit_code)
\ No newline at end of file
@@ -5,20 +5,23 @@ from ..resolver import Resolver
 from ..schema import Schema
 from ..repository import PipelineRepository
 from ..plugin import PluginUtils
+from ..startup import StartupReport, run_in_parallel
 from .base import SupervisorDefinition, Settings, Supervisor
 from .dockerrun import DockerRunSupervisor
 from .native import NativeRunSupervisor
+from .remote import RemoteWorkerSupervisor
 from .multiple import MultipleSupervisor
 
 
 class SupervisorFactory:
     """
-        Parses configuration file, and creates all Supervisor at once
+        Parses configuration file, and creates all Supervisor at once (in parallel, as eg. connecting to Docker takes time)
     """
 
     MAPPING = {
         'native': NativeRunSupervisor,
-        'docker-run': DockerRunSupervisor
+        'docker-run': DockerRunSupervisor,
+        'remote-worker': RemoteWorkerSupervisor
     }
 
     _settings: Settings
@@ -26,27 +29,39 @@ class SupervisorFactory:
     _master_url: str
     _pipe_repository: PipelineRepository
 
-    def __init__(self, resolver: Resolver, master_url: str, pipe_repository: PipelineRepository):
+    def __init__(self, resolver: Resolver, master_url: str, pipe_repository: PipelineRepository, workers: int = 1,
+                 startup_report: StartupReport = None):
         self._config_path = resolver.get('local_path') + '/supervisor.yaml'
         self._master_url = master_url
         self._pipe_repository = pipe_repository
         self._supervisors = {}
-        self._parse_config()
+        self._parse_config(workers, startup_report)
 
-    def _parse_config(self):
+    def _parse_config(self, workers: int, startup_report: StartupReport = None):
         with open(self._config_path, 'rb') as f:
             to_dict = Schema.parse_yaml_with_validation(f.read().decode('utf-8'), 'config/supervisor')
 
         self._settings = Settings(**to_dict['settings'])
 
-        for name, attributes in to_dict['nodes'].items():
-            supervisor_type = attributes['type']
+        supervisors = run_in_parallel(
+            {
+                'supervisor:' + name: (
+                    lambda attributes=attributes: self._create_supervisor(attributes['type'], attributes['attributes'])
+                )
+                for name, attributes in to_dict['nodes'].items()
+            },
+            workers=workers,
+            report=startup_report
+        )
 
+        for name, attributes in to_dict['nodes'].items():
             self._supervisors[name] = SupervisorDefinition(
                 default=attributes['default'],
                 labels=attributes['labels'],
                 name=name,
-                supervisor=self._create_supervisor(supervisor_type, attributes['attributes'])
+                supervisor=supervisors['supervisor:' + name],
+                max_concurrent=attributes.get('max_concurrent', 0),
+                weight=attributes.get('weight', 1)
             )
 
     def _create_supervisor(self, type_name: str, attributes: dict) -> Supervisor:
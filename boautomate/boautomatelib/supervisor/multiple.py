@@ -6,25 +6,33 @@
     A scheduler that decides which Supervisor could be picked for given job.
     The "children" and "settings" should be prepared in a factory and passed there as parsed objects.
 
-    There are multiple strategies of selecting a supervisor - see STRATEGY_* class variables
+    There are multiple strategies of selecting a supervisor - see the "scheduling" module
+
+    Each node can have a "max_concurrent" limit of executions running at once. When all matching nodes are saturated,
+    the execution waits up to "max_wait" seconds for a free slot, and no more than "max_waiting" executions can wait
+    at once - in both cases SupervisorsSaturatedException is raised (HTTP 503).
 """
 
-from typing import List
-from random import randrange
+import threading
+import time
+from typing import Dict, List, Optional
 from ..persistence import Execution
 from ..repository import PipelineRepository
+from ..exceptions import SupervisorsSaturatedException
 from ..logger import Logger
 from .base import Supervisor, ExecutionResult, SupervisorDefinition, Settings
+from .scheduling import SelectionStrategy, create_strategy
 
 
 class MultipleSupervisor(Supervisor):
-    STRATEGY_RANDOM = 'random'
-    STRATEGY_ROUND_ROBIN = 'round-robin'
-
     children: List[SupervisorDefinition]
     settings: Settings
     pipe_repo: PipelineRepository
-    round_robin_memory: {}
+    strategy: SelectionStrategy
+    in_flight: Dict[str, int]
+    waiting: int
+    rejected: int
+    _condition: threading.Condition
 
     def __init__(self, master_url: str, children: List[SupervisorDefinition],
                  settings: Settings, repository: PipelineRepository):
@@ -33,90 +41,128 @@ class MultipleSupervisor(Supervisor):
         self.children = children
         self.settings = settings
         self.pipe_repo = repository
-        self.round_robin_memory = {}
+        self.strategy = create_strategy(settings.selection_strategy)
+        self.in_flight = {child.name: 0 for child in children}
+        self.waiting = 0
+        self.rejected = 0
+        self._condition = threading.Condition()
 
     def execute(self, **kwargs) -> ExecutionResult:
-        supervisor: Supervisor = self.find_supervisor_for_execution(kwargs['execution'])
+        selected = self.acquire_supervisor_for_execution(kwargs['execution'])
+        started_at = time.time()
 
-        return supervisor.execute(**kwargs)
+        try:
+            return selected.supervisor.execute(**kwargs)
+        finally:
+            self.release_supervisor(selected, time.time() - started_at)
 
-    def find_supervisor_for_execution(self, execution: Execution) -> Supervisor:
-        """ Find proper Supervisor that will execute the pipeline """
+    def get_stats(self) -> dict:
+        stats = {}
+        strategy_stats = self.strategy.get_stats()
 
-        pipeline = self.pipe_repo.find_by_id(execution.pipeline_id)
+        for child in self.children:
+            child_stats = child.supervisor.get_stats()
+
+            with self._condition:
+                stats[child.name] = {
+                    'in_flight': self.in_flight[child.name],
+                    'max_concurrent': child.max_concurrent,
+                    'weight': child.weight,
+                    'executions': 0
+                }
+
+            stats[child.name].update(strategy_stats.get(child.name, {}))
+
+            if child_stats:
+                stats[child.name].update(child_stats)
+
+        with self._condition:
+            return {
+                'selection_strategy': self.settings.selection_strategy,
+                'waiting': self.waiting,
+                'rejected': self.rejected,
+                'nodes': stats
+            }
+
+    def find_node(self, name: str) -> Optional[Supervisor]:
+        for child in self.children:
+            if child.name == name:
+                return child.supervisor
 
-        if not pipeline.supervisor_label:
-            return self.select_supervisor_considering_strategy(self.children, self.settings.selection_strategy, True)
+        return None
 
-        label = pipeline.supervisor_label
-        matching_supervisors = []
+    def acquire_supervisor_for_execution(self, execution: Execution) -> SupervisorDefinition:
+        """
+        Reserves a slot on a Supervisor that will execute the pipeline.
+        Waits, when all matching supervisors are running "max_concurrent" executions.
+        The slot has to be given back with release_supervisor()
+        """
 
-        for child in self.children:
-            if label in child.labels or child.name == label:
-                matching_supervisors.append(child)
+        candidates = self.find_candidates_for_execution(execution)
+        deadline = time.time() + self.settings.max_wait
 
-        if not matching_supervisors:
-            raise Exception('Cannot match any supervisor for "%s" pipeline' % pipeline.id)
+        with self._condition:
+            if self.settings.max_waiting and self.waiting >= self.settings.max_waiting \
+                    and not self._find_not_saturated(candidates):
+                self.rejected += 1
+                raise SupervisorsSaturatedException(
+                    'All supervisors are busy and %i executions are already waiting' % self.waiting)
 
-        return self.select_supervisor_considering_strategy(matching_supervisors, self.STRATEGY_RANDOM, False)
+            self.waiting += 1
 
-    def select_supervisor_considering_strategy(self, supervisors: List[SupervisorDefinition],
-                                               strategy: str, only_default: bool) -> Supervisor:
+            try:
+                while True:
+                    available = self._find_not_saturated(candidates)
 
-        """
-        Selects a supervisor considering the strategy
+                    if available:
+                        selected = self.strategy.select(available, self.in_flight)
+                        self.strategy.started(selected)
+                        self.in_flight[selected.name] += 1
 
-        :param only_default:
-        :param supervisors:
-        :param strategy:
-        :return:
-        """
+                        return selected
 
-        selected = None
+                    remaining = deadline - time.time()
 
-        if only_default:
-            supervisors = list(filter(
-                lambda child: child.default,
-                supervisors
-            ))
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise SupervisorsSaturatedException(
+                            'All supervisors are busy, no free slot within %is' % self.settings.max_wait)
 
-        if strategy == self.STRATEGY_RANDOM:
-            selected = supervisors[randrange(0, len(supervisors))]
-        elif strategy == self.STRATEGY_ROUND_ROBIN:
-            selected = self._round_robin_find_next(supervisors)
+                    Logger.debug('Supervisor: All matching nodes are saturated, waiting')
+                    self._condition.wait(timeout=remaining)
 
-        if selected:
-            self._round_robin_increment(selected.name)
-            return selected.supervisor
+            finally:
+                self.waiting -= 1
 
-        raise Exception('Cannot match supervisor, invalid selection_strategy')
+    def release_supervisor(self, selected: SupervisorDefinition, duration: float):
+        self.strategy.finished(selected, duration)
 
-    def _round_robin_find_next(self, supervisors: List[SupervisorDefinition]) -> SupervisorDefinition:
-        min_used = 0
-        min_sv: SupervisorDefinition = None
+        with self._condition:
+            self.in_flight[selected.name] -= 1
+            self._condition.notify_all()
 
-        for supervisor in supervisors:
-            # first time
-            if supervisor.name not in self.round_robin_memory:
-                return supervisor
+    def find_candidates_for_execution(self, execution: Execution) -> List[SupervisorDefinition]:
+        """ Find Supervisors that could execute the pipeline """
 
-            count = self.round_robin_memory[supervisor.name]
+        pipeline = self.pipe_repo.find_by_id(execution.pipeline_id)
 
-            if count < min_used or min_sv is None:
-                min_used = count
-                min_sv = supervisor
+        if not pipeline.supervisor_label:
+            return list(filter(lambda child: child.default, self.children))
 
-        Logger.debug('Supervisor: Selected "%s" using round-robin strategy' % min_sv.name)
+        label = pipeline.supervisor_label
+        matching_supervisors = []
 
-        return min_sv
+        for child in self.children:
+            if label in child.labels or child.name == label:
+                matching_supervisors.append(child)
 
-    def _round_robin_increment(self, supervisor_name: str):
-        if supervisor_name not in self.round_robin_memory:
-            self.round_robin_memory[supervisor_name] = 0
+        if not matching_supervisors:
+            raise Exception('Cannot match any supervisor for "%s" pipeline' % pipeline.id)
 
-        self.round_robin_memory[supervisor_name] += 1
+        return matching_supervisors
 
-        Logger.debug('Supervisor round_robin_memory[%s] = %i' % (
-            supervisor_name,
-            self.round_robin_memory[supervisor_name])
-        )
+    def _find_not_saturated(self, supervisors: List[SupervisorDefinition]) -> List[SupervisorDefinition]:
+        return [
+            supervisor for supervisor in supervisors
+            if not supervisor.max_concurrent or self.in_flight[supervisor.name] < supervisor.max_concurrent
+        ]
@@ -4,28 +4,55 @@
     =====================
 
     Runs the pipeline on primary node without any kind of isolation, runs as a regular script - natively.
+
+    Each execution runs in its own workspace, prepared from files of the previous successful execution.
+    Pipeline requirements are installed into a virtualenv shared between executions (see "workspace" module).
 """
 
+import contextlib
+import shlex
 import subprocess
+import selectors
+import signal
+import threading
+import time
 import os
+from typing import Optional
 
-from .base import Supervisor, ExecutionResult
+from .base import Supervisor, ExecutionResult, OutputStream
+from .workspace import WorkspaceManager, VirtualenvCache
 from ..persistence import Execution
+from ..exceptions import ExecutorException
+from ..logger import Logger
 
 
 class NativeRunSupervisor(Supervisor):
-    _workspaces_path: str
-    _read_timeout = 3600
+    _workspaces: WorkspaceManager
+    _virtualenvs: VirtualenvCache
+    _read_timeout: int
+    _read_size = 64 * 1024
+
+    def __init__(self, master_url: str, workspaces_path: str, timeout: int = 3600,
+                 workspaces_budget: int = 2 * 1024 * 1024 * 1024, workspaces_hardlinks: bool = False,
+                 python: str = ''):
+        """
+        :param workspaces_path: Directory of workspaces, pipeline caches and virtualenvs
+        :param timeout: Maximum time (in seconds) of a pipeline run
+        :param workspaces_budget: Maximum size (in bytes) of the "workspaces_path", 0 disables removing old workspaces
+        :param workspaces_hardlinks: Workspaces share files with the pipeline cache (cheap, but not isolated)
+        :param python: Python interpreter the virtualenvs are created from, defaults to the one running Boautomate
+        """
 
-    def __init__(self, master_url: str, workspaces_path: str):
         super().__init__(master_url)
-        self._workspaces_path = workspaces_path
+        self._read_timeout = timeout
 
-        if not os.path.isdir(self._workspaces_path):
-            os.mkdir(self._workspaces_path)
+        os.makedirs(workspaces_path, exist_ok=True)
+        self._workspaces = WorkspaceManager(workspaces_path, workspaces_budget, workspaces_hardlinks)
+        self._virtualenvs = VirtualenvCache(self._workspaces.get_virtualenvs_path(), python)
 
     def execute(self, execution: Execution, script: str, payload: str, communication_token: str,
-                query: dict, headers: dict, configuration_payloads: list, params: dict) -> ExecutionResult:
+                query: dict, headers: dict, configuration_payloads: list, params: dict, requirements: str = '',
+                output: OutputStream = None) -> ExecutionResult:
 
         env = self.prepare_environment(
             payload=payload, communication_token=communication_token,
@@ -33,32 +60,145 @@ class NativeRunSupervisor(Supervisor):
             execution=execution,
             params=params
         )
+
+        if output is None:
+            output = OutputStream()
+
+        exit_code = self.run_script(execution.pipeline_id, execution.execution_number, script, env, output,
+                                    requirements=requirements)
+        output.close()
+
+        return ExecutionResult(output.getvalue(), exit_code)
+
+    def run_script(self, pipeline_id: str, execution_number: int, script: str, env: dict, output: OutputStream,
+                   requirements: str = '', cancelled: threading.Event = None, timeout: int = None) -> int:
+
+        """ Runs the script with prepared environment, returns the exit code. Used also by remote workers """
+
         env['BOAUTOMATE_PATH'] = self._get_boautomate_path()
 
-        workspace_path = self._get_workspace_path(execution.pipeline_id)
+        try:
+            with self._workspaces.use(pipeline_id, execution_number) as workspace, \
+                    self._use_virtualenv(requirements, output) as virtualenv_path:
+
+                exit_code = self._execute_pipeline_code(script, workspace.path, env, output, virtualenv_path,
+                                                        cancelled, timeout or self._read_timeout)
+
+                if exit_code == 0:
+                    self._workspaces.save_as_cache(workspace, skip=['entrypoint.py'])
 
-        if not os.path.isdir(workspace_path):
-            os.mkdir(workspace_path)
+        except ExecutorException as e:
+            Logger.error(str(e))
+            output.write(('\n[boautomate] %s\n' % str(e)).encode('utf-8'))
+            exit_code = 1
 
-        output, exit_code = self._execute_pipeline_code(script, workspace_path, env)
+        self._workspaces.collect_garbage_in_background()
 
-        return ExecutionResult(output, exit_code)
+        return exit_code
 
-    def _execute_pipeline_code(self, script: str, workspace_path: str, env: dict) -> tuple:
+    def get_stats(self) -> dict:
+        return {
+            'workspaces': self._workspaces.last_gc,
+            'virtualenvs': {'hits': self._virtualenvs.hits, 'builds': self._virtualenvs.builds}
+        }
+
+    @contextlib.contextmanager
+    def _use_virtualenv(self, requirements: str, output: OutputStream):
+        if not requirements or not requirements.strip():
+            yield None
+            return
+
+        with self._virtualenvs.use(requirements, output) as path:
+            yield path
+
+    def _execute_pipeline_code(self, script: str, workspace_path: str, env: dict, output: OutputStream,
+                               virtualenv_path: Optional[str], cancelled: Optional[threading.Event],
+                               timeout: int) -> int:
         self._put_script_at_workspace(script, workspace_path)
+        command = './entrypoint.py'
+
+        if virtualenv_path:
+            env['VIRTUAL_ENV'] = virtualenv_path
+            env['PATH'] = virtualenv_path + '/bin:' + os.getenv('PATH', os.defpath)
+            command = shlex.quote(virtualenv_path + '/bin/python') + ' ./entrypoint.py'
+
+        # stderr is redirected into stdout, so the output is in the same order as it was printed
+        # a new session allows to kill the whole process group on timeout, not only the shell
+        with subprocess.Popen('cd %s && %s' % (shlex.quote(workspace_path), command), shell=True, env=env,
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, start_new_session=True) as proc:
+
+            reason = self._drain_output(proc, output, timeout, cancelled)
+
+            if reason:
+                Logger.warning('Killing pipeline process: ' + reason)
+                output.write(('\n[boautomate] %s, killing the process\n' % reason).encode('utf-8'))
+                os.killpg(proc.pid, signal.SIGKILL)
+
+            return proc.wait()
 
-        with subprocess.Popen('cd %s && ./entrypoint.py' % workspace_path, shell=True, env=env,
-                              stdout=subprocess.PIPE, stderr=subprocess.PIPE) as proc:
-            proc.wait(self._read_timeout)
-            return proc.stdout.read().decode('utf-8') + proc.stderr.read().decode('utf-8'), proc.returncode
+    def _drain_output(self, proc: subprocess.Popen, output: OutputStream, timeout: int,
+                      cancelled: threading.Event = None) -> Optional[str]:
+        """
+        Reads the output while the process is running, so the pipe buffer never fills up and blocks the process,
+        then waits until the process exits. Returns the reason, when the process has to be killed
+        (timeout exceeded, execution cancelled).
+        """
 
-    def _get_workspace_path(self, pipeline_id: str):
-        return self._workspaces_path + '/' + pipeline_id
+        deadline = time.monotonic() + timeout
+        poll_interval = 1.0 if cancelled is not None else None
+        fd = proc.stdout.fileno()
+
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+
+            while True:
+                reason = self._get_kill_reason(deadline, timeout, cancelled)
+
+                if reason:
+                    return reason
+
+                if not selector.select(timeout=min(deadline - time.monotonic(), poll_interval or timeout)):
+                    continue
+
+                chunk = os.read(fd, self._read_size)
+
+                if not chunk:
+                    break
+
+                output.write(chunk)
+
+        # the script could close, or redirect its stdout and still run
+        while True:
+            reason = self._get_kill_reason(deadline, timeout, cancelled)
+
+            if reason:
+                return reason
+
+            try:
+                proc.wait(timeout=min(deadline - time.monotonic(), poll_interval or timeout))
+                return None
+
+            except subprocess.TimeoutExpired:
+                continue
+
+    @staticmethod
+    def _get_kill_reason(deadline: float, timeout: int, cancelled: Optional[threading.Event]) -> Optional[str]:
+        if time.monotonic() >= deadline:
+            return 'Timeout of %i seconds exceeded' % timeout
+
+        if cancelled is not None and cancelled.is_set():
+            return 'Execution was cancelled'
+
+        return None
 
     @staticmethod
     def _put_script_at_workspace(content: str, workspace_path: str):
         script_path = workspace_path + '/entrypoint.py'
 
+        # could be a hardlink shared with the pipeline cache ("workspaces_hardlinks"), must not be overwritten in place
+        if os.path.lexists(script_path):
+            os.unlink(script_path)
+
         f = open(script_path, 'wb')
         f.write(content.encode('utf-8'))
         f.close()
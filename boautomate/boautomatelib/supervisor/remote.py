@@ -0,0 +1,276 @@
+"""
+    Remote Worker Supervisor
+    ========================
+
+    Executions are not pushed anywhere - they wait in a queue on the master, and worker processes (boautomate-worker)
+    running on other machines lease them over HTTP (long polling), so only the master has to be reachable.
+
+    A worker runs the script natively (as NativeRunSupervisor does), sends the output back together with heartbeats,
+    and reports the exit code at the end. When the heartbeats stop (eg. the worker machine died), the lease expires
+    and the execution is queued again, up to "max_attempts" times. A worker that lost its lease is told so
+    on its next heartbeat (HTTP 410), and kills the process.
+"""
+
+import hmac
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+from .base import Supervisor, ExecutionResult, OutputStream
+from ..persistence import Execution
+from ..logger import Logger
+
+
+class Job:
+    job_id: str
+    ident: str
+    payload: dict
+    output: OutputStream
+    attempts: int
+    lease_id: Optional[str]
+    worker: Optional[str]
+    last_heartbeat: float
+    exit_code: Optional[int]
+    finished: threading.Event
+
+    def __init__(self, ident: str, payload: dict, output: OutputStream):
+        self.job_id = uuid.uuid4().hex
+        self.ident = ident
+        self.payload = payload
+        self.output = output
+        self.attempts = 0
+        self.lease_id = None
+        self.worker = None
+        self.last_heartbeat = 0
+        self.exit_code = None
+        self.finished = threading.Event()
+
+
+class LeaseQueue:
+    """ Executions waiting for a worker, and executions leased by workers """
+
+    _pending: Deque[Job]
+    _leased: Dict[str, Job]
+    _workers: Dict[str, float]
+    _listeners: List[Callable]
+    _lock: threading.Lock
+    _token: str
+
+    leases: int
+    requeued: int
+    completed: int
+
+    def __init__(self, token: str):
+        self._token = token
+        self._pending = deque()
+        self._leased = {}
+        self._workers = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+        self.leases = 0
+        self.requeued = 0
+        self.completed = 0
+
+    def is_token_valid(self, token: str) -> bool:
+        """ Workers authenticate with a token configured per node, no token means no worker is allowed """
+
+        return bool(self._token) and hmac.compare_digest(token, self._token)
+
+    def submit(self, job: Job, first: bool = False):
+        with self._lock:
+            if first:
+                self._pending.appendleft(job)
+            else:
+                self._pending.append(job)
+
+            listeners = list(self._listeners)
+
+        for listener in listeners:
+            listener()
+
+    def subscribe(self, listener: Callable) -> Callable:
+        """ Listener is called (from any thread) when a job is submitted. Returns a function that unsubscribes """
+
+        with self._lock:
+            self._listeners.append(listener)
+
+        def unsubscribe():
+            with self._lock:
+                if listener in self._listeners:
+                    self._listeners.remove(listener)
+
+        return unsubscribe
+
+    def lease(self, worker: str) -> Optional[Job]:
+        with self._lock:
+            self._workers[worker] = time.time()
+
+            if not self._pending:
+                return None
+
+            job = self._pending.popleft()
+            job.attempts += 1
+            job.lease_id = uuid.uuid4().hex
+            job.worker = worker
+            job.last_heartbeat = time.time()
+
+            self._leased[job.lease_id] = job
+            self.leases += 1
+
+            return job
+
+    def heartbeat(self, lease_id: str, chunk: bytes = b'') -> bool:
+        """ Extends the lease and appends the output. False means the lease was lost (expired, cancelled) """
+
+        with self._lock:
+            job = self._leased.get(lease_id)
+
+            if not job:
+                return False
+
+            job.last_heartbeat = time.time()
+            self._workers[job.worker] = job.last_heartbeat
+
+        if chunk:
+            job.output.write(chunk)
+
+        return True
+
+    def finish(self, lease_id: str, exit_code: int, chunk: bytes = b'') -> bool:
+        if not self.heartbeat(lease_id, chunk):
+            return False
+
+        with self._lock:
+            job = self._leased.pop(lease_id, None)
+
+            if not job:
+                return False
+
+            job.exit_code = exit_code
+            self.completed += 1
+
+        job.finished.set()
+
+        return True
+
+    def expire(self, job: Job, lease_timeout: float) -> bool:
+        """ Takes the job back from a worker that did not send a heartbeat for "lease_timeout" seconds """
+
+        with self._lock:
+            if job.lease_id not in self._leased or time.time() - job.last_heartbeat < lease_timeout:
+                return False
+
+            del self._leased[job.lease_id]
+            job.lease_id = None
+
+            return True
+
+    def requeue(self, job: Job):
+        with self._lock:
+            self.requeued += 1
+
+        self.submit(job, first=True)
+
+    def cancel(self, job: Job):
+        """ Removes the job, wherever it is. The worker gets HTTP 410 on the next heartbeat """
+
+        with self._lock:
+            if job in self._pending:
+                self._pending.remove(job)
+
+            self._leased.pop(job.lease_id, None)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'leased': len(self._leased),
+                'leases': self.leases,
+                'requeued': self.requeued,
+                'completed': self.completed,
+                'workers': {worker: round(time.time() - seen, 1) for worker, seen in self._workers.items()}
+            }
+
+
+class RemoteWorkerSupervisor(Supervisor):
+    _queue: LeaseQueue
+    _timeout: int
+    _lease_timeout: float
+    _heartbeat_interval: float
+    _max_attempts: int
+
+    def __init__(self, master_url: str, worker_token: str, timeout: int = 3600, lease_timeout: float = 30,
+                 heartbeat_interval: float = 5, max_attempts: int = 3):
+        super().__init__(master_url)
+        self._queue = LeaseQueue(worker_token)
+        self._timeout = timeout
+        self._lease_timeout = lease_timeout
+        self._heartbeat_interval = heartbeat_interval
+        self._max_attempts = max_attempts
+
+    def execute(self, execution: Execution, script: str, payload: str, communication_token: str,
+                query: dict, headers: dict, configuration_payloads: list, params: dict, requirements: str = '',
+                output: OutputStream = None) -> ExecutionResult:
+
+        env = self.prepare_environment(
+            payload=payload, communication_token=communication_token,
+            query=query, headers=headers, configuration_payloads=configuration_payloads,
+            execution=execution,
+            params=params
+        )
+
+        if output is None:
+            output = OutputStream()
+
+        job = Job(execution.to_ident_string(), {
+            'pipeline_id': execution.pipeline_id,
+            'execution': execution.to_ident_string(),
+            'execution_number': execution.execution_number,
+            'script': script,
+            'requirements': requirements,
+            'environment': env,
+            'timeout': self._timeout,
+            'heartbeat_interval': self._heartbeat_interval
+        }, output)
+
+        self._queue.submit(job)
+        exit_code = self._wait_for_job(job)
+        output.close()
+
+        return ExecutionResult(output.getvalue(), exit_code)
+
+    def get_lease_queue(self) -> LeaseQueue:
+        return self._queue
+
+    def get_stats(self) -> dict:
+        return self._queue.get_stats()
+
+    def _wait_for_job(self, job: Job) -> int:
+        deadline = time.time() + self._timeout
+
+        while not job.finished.wait(timeout=1):
+            if time.time() > deadline:
+                Logger.warning('Execution "%s" exceeded timeout of %is on a remote worker' % (job.ident, self._timeout))
+                self._queue.cancel(job)
+                job.output.write(b'\n[boautomate] Timeout of %i seconds exceeded, cancelling\n' % self._timeout)
+
+                return 1
+
+            if not self._queue.expire(job, self._lease_timeout):
+                continue
+
+            Logger.warning('Worker "%s" lost the lease of execution "%s"' % (job.worker, job.ident))
+
+            if job.attempts >= self._max_attempts:
+                job.output.write(b'\n[boautomate] Worker %s stopped responding, giving up after %i attempts\n'
+                                 % (job.worker.encode('utf-8'), job.attempts))
+                return 1
+
+            job.output.write(b'\n[boautomate] Worker %s stopped responding, queueing the execution again\n'
+                             % job.worker.encode('utf-8'))
+            self._queue.requeue(job)
+
+        return job.exit_code
@@ -0,0 +1,174 @@
+"""
+    Runtime Archive
+    ===============
+
+    The boautomate library is copied into each container, so the pipeline scripts can use the NodeExecutor.
+    The library is the same for every execution, so it is archived (TAR.GZ) once and kept in memory.
+
+    The archive is identified by a fingerprint of the files (paths, sizes, modification times), it is rebuilt only
+    when the library changes (eg. after an upgrade), the fingerprint is verified at most every CHECK_INTERVAL seconds.
+"""
+
+import hashlib
+import io
+import os
+import tarfile
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from ..logger import Logger
+
+
+class LibraryArchive:
+    digest: str
+    content: bytes
+    files: int
+    size: int
+    build_time: float
+    built_at: float
+
+    def __init__(self, digest: str, content: bytes, files: int, size: int, build_time: float):
+        self.digest = digest
+        self.content = content
+        self.files = files
+        self.size = size
+        self.build_time = build_time
+        self.built_at = time.time()
+
+
+class RuntimeArchive:
+    CHECK_INTERVAL = 60
+    IGNORED = ['.git', '__pycache__', '.idea', '.tox', '.pytest_cache']
+
+    _path: str
+    _target: str
+    _archive: Optional[LibraryArchive]
+    _fingerprint: Optional[str]
+    _checked_at: float
+    _lock: threading.Lock
+
+    builds: int
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, path: str) -> 'RuntimeArchive':
+        """ One archive per library path, shared by all supervisors """
+
+        with cls._shared_lock:
+            if path not in cls._shared:
+                cls._shared[path] = cls(path)
+
+            return cls._shared[path]
+
+    def __init__(self, path: str, target: str = '/opt/boautomate'):
+        self._path = os.path.abspath(path)
+        self._target = target
+        self._archive = None
+        self._fingerprint = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+        self.builds = 0
+
+    def prepare_in_background(self):
+        threading.Thread(target=self.get_library_archive, name='runtime-archive', daemon=True).start()
+
+    def get_library_archive(self) -> LibraryArchive:
+        with self._lock:
+            if self._archive and time.time() - self._checked_at < self.CHECK_INTERVAL:
+                return self._archive
+
+            files = self._list_files()
+            fingerprint = self._create_fingerprint(files)
+            self._checked_at = time.time()
+
+            if not self._archive or fingerprint != self._fingerprint:
+                self._archive = self._build(files)
+                self._fingerprint = fingerprint
+
+            return self._archive
+
+    @staticmethod
+    def create_entrypoint_archive(script: str) -> bytes:
+        """ Archive of the script only (as entrypoint.py). Not compressed, it is small """
+
+        content = script.encode('utf-8')
+        info = tarfile.TarInfo(name='entrypoint.py')
+        info.size = len(content)
+        info.mtime = int(time.time())
+
+        tar_in_bytes = io.BytesIO()
+
+        with tarfile.open(fileobj=tar_in_bytes, mode='w') as tar:
+            tar.addfile(tarinfo=info, fileobj=io.BytesIO(content))
+
+        return tar_in_bytes.getvalue()
+
+    def get_stats(self) -> dict:
+        archive = self._archive
+
+        return {
+            'builds': self.builds,
+            'digest': archive.digest if archive else None,
+            'files': archive.files if archive else None,
+            'size': archive.size if archive else None,
+            'compressed_size': len(archive.content) if archive else None,
+            'build_time_ms': round(archive.build_time * 1000, 2) if archive else None,
+            'built_at': archive.built_at if archive else None
+        }
+
+    def _build(self, files: List[Tuple[str, os.stat_result]]) -> LibraryArchive:
+        started_at = time.time()
+        tar_in_bytes = io.BytesIO()
+        size = 0
+
+        with tarfile.open(fileobj=tar_in_bytes, mode='w:gz') as tar:
+            for relative_path, stat in files:
+                tar.add(os.path.join(self._path, relative_path), self._target + '/' + relative_path, recursive=False)
+                size += stat.st_size
+
+        content = tar_in_bytes.getvalue()
+        archive = LibraryArchive(
+            digest=hashlib.sha256(content).hexdigest(),
+            content=content,
+            files=len(files),
+            size=size,
+            build_time=time.time() - started_at
+        )
+
+        self.builds += 1
+        Logger.info('Built runtime archive %s: %i files, %i bytes (%i compressed) in %.3fs' % (
+            archive.digest[0:12], archive.files, archive.size, len(archive.content), archive.build_time))
+
+        return archive
+
+    def _list_files(self) -> List[Tuple[str, os.stat_result]]:
+        files = []
+
+        for directory, subdirectories, names in os.walk(self._path):
+            subdirectories[:] = sorted(name for name in subdirectories if name not in self.IGNORED)
+
+            for name in sorted(names):
+                if name.endswith('.pyc'):
+                    continue
+
+                path = os.path.join(directory, name)
+
+                try:
+                    files.append((os.path.relpath(path, self._path), os.lstat(path)))
+                except OSError:
+                    continue
+
+        return files
+
+    @staticmethod
+    def _create_fingerprint(files: List[Tuple[str, os.stat_result]]) -> str:
+        fingerprint = hashlib.sha256()
+
+        for relative_path, stat in files:
+            fingerprint.update(('%s:%i:%i\n' % (relative_path, stat.st_size, stat.st_mtime_ns)).encode('utf-8'))
+
+        return fingerprint.hexdigest()
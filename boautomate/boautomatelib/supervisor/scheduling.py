@@ -0,0 +1,221 @@
+"""
+    Selection Strategies
+    ====================
+
+    Decide which of the matching supervisor nodes runs an execution. MultipleSupervisor creates one strategy object
+    for its "selection_strategy" setting. It tells the strategy when an execution starts and finishes on a node.
+
+    Strategies keep their own state behind a lock, so they can be called from any executor thread.
+    A custom strategy can be configured by its class name, eg. "mypackage.scheduling.MyStrategy".
+"""
+
+import abc
+import threading
+import time
+from random import randrange
+from typing import Dict, List
+
+from ..plugin import PluginUtils
+from ..logger import Logger
+from .base import SupervisorDefinition
+
+
+class SelectionStrategy(abc.ABC):
+    _lock: threading.Lock
+    _selections: Dict[str, int]
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._selections = {}
+
+    @abc.abstractmethod
+    def select(self, supervisors: List[SupervisorDefinition], in_flight: Dict[str, int]) -> SupervisorDefinition:
+        """ Picks one of the supervisors, all of them have a free slot. "in_flight" counts running executions """
+
+        pass
+
+    def started(self, supervisor: SupervisorDefinition):
+        with self._lock:
+            self._selections[supervisor.name] = self._selections.get(supervisor.name, 0) + 1
+
+    def finished(self, supervisor: SupervisorDefinition, duration: float):
+        pass
+
+    def get_stats(self) -> Dict[str, dict]:
+        """ Per node statistics """
+
+        with self._lock:
+            return {name: {'executions': count} for name, count in self._selections.items()}
+
+
+class RandomStrategy(SelectionStrategy):
+    def select(self, supervisors: List[SupervisorDefinition], in_flight: Dict[str, int]) -> SupervisorDefinition:
+        return supervisors[randrange(0, len(supervisors))]
+
+
+class RoundRobinStrategy(SelectionStrategy):
+    """ Node that was selected the least number of times, in order of the configuration on a tie """
+
+    def select(self, supervisors: List[SupervisorDefinition], in_flight: Dict[str, int]) -> SupervisorDefinition:
+        with self._lock:
+            selected = min(supervisors, key=lambda supervisor: self._selections.get(supervisor.name, 0))
+            self._selections[selected.name] = self._selections.get(selected.name, 0) + 1
+
+        Logger.debug('Supervisor: Selected "%s" using round-robin strategy' % selected.name)
+
+        return selected
+
+    def started(self, supervisor: SupervisorDefinition):
+        # counted already in select(), the counter decides about the next selection
+        pass
+
+
+class WeightedRoundRobinStrategy(SelectionStrategy):
+    """
+    Smooth weighted round-robin: a node with "weight: 3" gets three times more executions than a node with "weight: 1",
+    and the executions are interleaved (a, b, a, a) instead of sent in bursts (a, a, a, b)
+    """
+
+    _current: Dict[str, int]
+
+    def __init__(self):
+        super().__init__()
+        self._current = {}
+
+    def select(self, supervisors: List[SupervisorDefinition], in_flight: Dict[str, int]) -> SupervisorDefinition:
+        with self._lock:
+            total = 0
+            selected = None
+
+            for supervisor in supervisors:
+                current = self._current.get(supervisor.name, 0) + supervisor.weight
+                self._current[supervisor.name] = current
+                total += supervisor.weight
+
+                if selected is None or current > self._current[selected.name]:
+                    selected = supervisor
+
+            self._current[selected.name] -= total
+
+        Logger.debug('Supervisor: Selected "%s" using weighted-round-robin strategy' % selected.name)
+
+        return selected
+
+
+class SlidingWindowLoad:
+    """
+    Average number of executions running at once on a node during the last "window" seconds.
+
+    Busy time of finished executions is summed in a fixed number of buckets, so the memory does not grow with
+    the number of executions. Old buckets are reused when the window moves.
+    """
+
+    _bucket_size: float
+    _busy: List[float]
+    _started: List[int]
+
+    def __init__(self, window: float = 60, buckets: int = 12):
+        self._bucket_size = window / buckets
+        self._busy = [0.0] * buckets
+        self._started = [-1] * buckets
+
+    def record(self, duration: float, now: float = None):
+        """ Executions are recorded when they finish, the duration is counted into the current bucket """
+
+        index = self._get_bucket(now if now is not None else time.time())
+        self._busy[index] += min(duration, self._bucket_size * len(self._busy))
+
+    def get_load(self, now: float = None) -> float:
+        current = int((now if now is not None else time.time()) / self._bucket_size)
+        oldest = current - len(self._busy) + 1
+
+        busy = sum(self._busy[index] for index, started in enumerate(self._started) if started >= oldest)
+
+        return busy / (self._bucket_size * len(self._busy))
+
+    def _get_bucket(self, now: float) -> int:
+        number = int(now / self._bucket_size)
+        index = number % len(self._busy)
+
+        if self._started[index] != number:
+            self._started[index] = number
+            self._busy[index] = 0.0
+
+        return index
+
+
+class LeastLoadedStrategy(SelectionStrategy):
+    """
+    Node with the lowest ratio of running executions to its "max_concurrent" limit.
+    Equally loaded nodes are compared by the load from the last minute, so a slow node gets fewer executions
+    """
+
+    WINDOW = 60
+    BUCKETS = 12
+
+    _load: Dict[str, SlidingWindowLoad]
+
+    def __init__(self):
+        super().__init__()
+        self._load = {}
+
+    def select(self, supervisors: List[SupervisorDefinition], in_flight: Dict[str, int]) -> SupervisorDefinition:
+        now = time.time()
+
+        with self._lock:
+            def score(supervisor: SupervisorDefinition):
+                capacity = supervisor.max_concurrent or 1
+
+                return (
+                    in_flight.get(supervisor.name, 0) / capacity,
+                    self._get_window(supervisor.name).get_load(now) / capacity,
+                    self._selections.get(supervisor.name, 0)
+                )
+
+            selected = min(supervisors, key=score)
+
+        Logger.debug('Supervisor: Selected "%s" using least-loaded strategy' % selected.name)
+
+        return selected
+
+    def finished(self, supervisor: SupervisorDefinition, duration: float):
+        with self._lock:
+            self._get_window(supervisor.name).record(duration)
+
+    def get_stats(self) -> Dict[str, dict]:
+        stats = super().get_stats()
+        now = time.time()
+
+        with self._lock:
+            for name, window in self._load.items():
+                stats.setdefault(name, {})['recent_load'] = round(window.get_load(now), 3)
+
+        return stats
+
+    def _get_window(self, name: str) -> SlidingWindowLoad:
+        """ Must be called with the lock held """
+
+        if name not in self._load:
+            self._load[name] = SlidingWindowLoad(self.WINDOW, self.BUCKETS)
+
+        return self._load[name]
+
+
+STRATEGIES = {
+    'random': RandomStrategy,
+    'round-robin': RoundRobinStrategy,
+    'weighted-round-robin': WeightedRoundRobinStrategy,
+    'least-loaded': LeastLoadedStrategy
+}
+
+
+def create_strategy(name: str) -> SelectionStrategy:
+    if name in STRATEGIES:
+        return STRATEGIES[name]()
+
+    imported = PluginUtils.import_class_if_is_a_class(name)
+
+    if imported:
+        return imported()
+
+    raise Exception('"%s" is not a recognized selection_strategy' % name)
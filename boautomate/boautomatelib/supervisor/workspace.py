@@ -0,0 +1,466 @@
+"""
+    Workspaces
+    ==========
+
+    Directories, where the pipelines are running (used by the native supervisor and remote workers).
+
+    Layout of the "workspaces_path":
+        cache/<pipeline_id>                 - files left by the last successful execution of a pipeline
+        runs/<pipeline_id>/<number>-<id>    - a separate directory for each execution
+        venvs/<hash of requirements>        - virtualenvs, shared by all pipelines with the same requirements
+
+    A workspace of an execution starts as a copy of the pipeline cache, so executions running at once, and failed
+    executions, cannot change each other's files. On filesystems supporting it (btrfs, xfs, overlayfs on them)
+    the files are cloned copy-on-write (reflinks), which is cheap even for big directories (eg. cloned repositories),
+    in other case they are copied. After a successful execution the workspace becomes the new cache,
+    workspaces of other executions are deleted.
+
+    Optionally ("hardlinks") the copy can be made of hardlinks, which is cheap everywhere, but the files are shared
+    with the cache - a file modified in place (eg. appended) changes the cache, even when the execution fails.
+
+    Each entry has a ".lock" file - held (shared) while the entry is in use, its modification time tells
+    when it was used last time. When the entries take more than "budget" bytes, the least recently used ones
+    are deleted. Locks are file locks, so multiple worker processes can share one "workspaces_path".
+"""
+
+import errno
+import fcntl
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+from .base import OutputStream
+from ..exceptions import ExecutorException
+from ..logger import Logger
+
+# ioctl(2) of Linux, clones a file sharing the data blocks until modified
+FICLONE = 0x40049409
+
+
+@contextmanager
+def locked(path: str, exclusive: bool = False, blocking: bool = True):
+    """ Holds a file lock on "path" (created when missing), yields False when a non-blocking lock is taken """
+
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+        try:
+            fcntl.flock(fd, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            os.close(fd)
+            yield False
+            return
+
+        # the lock file could be deleted (by the garbage collector) while waiting for the lock
+        try:
+            if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                break
+        except FileNotFoundError:
+            pass
+
+        os.close(fd)
+
+    try:
+        os.utime(fd)
+        yield True
+
+    finally:
+        os.close(fd)
+
+
+def clone_file(source: str, target: str):
+    """ Copy-on-write clone of a file, falls back to copying when the filesystem does not support it """
+
+    with open(source, 'rb') as source_file, open(target, 'wb') as target_file:
+        try:
+            fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+            cloned = True
+
+        except OSError as e:
+            if e.errno not in [errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS]:
+                raise
+
+            cloned = False
+
+        if not cloned:
+            shutil.copyfileobj(source_file, target_file, 1024 * 1024)
+
+    shutil.copystat(source, target)
+
+
+def clone_tree(source: str, target: str, skip: List[str] = None, hardlinks: bool = False):
+    """ Copy of a directory, see clone_file(). With "hardlinks" the files are shared, when it is possible """
+
+    skip = skip or []
+
+    for directory, subdirectories, names in os.walk(source):
+        relative = os.path.relpath(directory, source)
+        target_directory = os.path.normpath(os.path.join(target, relative))
+        os.makedirs(target_directory, exist_ok=True)
+
+        for name in names:
+            if relative == '.' and name in skip:
+                continue
+
+            source_path = os.path.join(directory, name)
+            target_path = os.path.join(target_directory, name)
+
+            if os.path.islink(source_path):
+                os.symlink(os.readlink(source_path), target_path)
+                continue
+
+            if hardlinks:
+                try:
+                    os.link(source_path, target_path)
+                    continue
+                except OSError:
+                    pass
+
+            clone_file(source_path, target_path)
+
+        for name in subdirectories:
+            if os.path.islink(os.path.join(directory, name)):
+                os.symlink(os.readlink(os.path.join(directory, name)), os.path.join(target_directory, name))
+
+
+class Workspace:
+    pipeline_id: str
+    path: str
+    lock_path: str
+
+    def __init__(self, pipeline_id: str, path: str):
+        self.pipeline_id = pipeline_id
+        self.path = path
+        self.lock_path = path + '.lock'
+
+
+class VirtualenvCache:
+    """ Virtualenvs identified by a hash of the requirements and the Python version, created once """
+
+    _path: str
+    _python: str
+    _lock: threading.Lock
+
+    hits: int
+    builds: int
+
+    def __init__(self, path: str, python: str = ''):
+        self._path = path
+        self._python = python or sys.executable
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.builds = 0
+
+        os.makedirs(self._path, exist_ok=True)
+
+    @contextmanager
+    def use(self, requirements: str, output: OutputStream):
+        """ Yields path to a virtualenv with installed requirements, it is not garbage collected while in use """
+
+        path = os.path.join(self._path, self.get_digest(requirements))
+
+        # taken before checking, so the garbage collector cannot delete the virtualenv meanwhile
+        with locked(path + '.lock'):
+            with locked(path + '.build', exclusive=True):
+                if os.path.isfile(os.path.join(path, '.ready')):
+                    with self._lock:
+                        self.hits += 1
+                else:
+                    self._build(path, requirements, output)
+
+            yield path
+
+    def get_digest(self, requirements: str) -> str:
+        lines = [line.strip() for line in requirements.splitlines()]
+        normalized = '\n'.join(line for line in lines if line and not line.startswith('#'))
+
+        return hashlib.sha256((self._python + '\n' + normalized).encode('utf-8')).hexdigest()[0:16]
+
+    def _build(self, path: str, requirements: str, output: OutputStream):
+        """ Built in place (a virtualenv cannot be moved), ".ready" marks that the build was completed """
+
+        started_at = time.time()
+        output.write(b'[boautomate] Creating virtualenv for the pipeline requirements\n')
+        shutil.rmtree(path, ignore_errors=True)
+
+        try:
+            # packages of the interpreter are visible, so the boautomate library can be imported by the pipeline
+            self._run([self._python, '-m', 'venv', '--system-site-packages', path], output)
+            self._link_parent_packages(path, output)
+
+            with open(path + '/requirements.txt', 'wb') as f:
+                f.write(requirements.encode('utf-8'))
+
+            self._run([path + '/bin/python', '-m', 'pip', 'install', '--disable-pip-version-check',
+                       '-r', path + '/requirements.txt'], output)
+
+            open(path + '/.ready', 'wb').close()
+
+        except Exception:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+
+        with self._lock:
+            self.builds += 1
+
+        Logger.info('Created virtualenv %s in %.1fs' % (os.path.basename(path), time.time() - started_at))
+
+    def _link_parent_packages(self, path: str, output: OutputStream):
+        """
+        When the interpreter is itself in a virtualenv (eg. Boautomate installed with pip into one), the new virtualenv
+        sees only packages of the base interpreter. A .pth file adds the interpreter's own site-packages, after the
+        virtualenv's, so the pipeline requirements take precedence.
+        """
+
+        parent_paths = self._run([self._python, '-c', 'import site; print("\\n".join(site.getsitepackages()))'],
+                                 output, quiet=True)
+        own_path = self._run([path + '/bin/python', '-c', 'import sysconfig; print(sysconfig.get_paths()["purelib"])'],
+                             output, quiet=True)
+
+        with open(os.path.join(own_path.decode('utf-8').strip(), 'boautomate-parent.pth'), 'wb') as f:
+            f.write(parent_paths)
+
+    @staticmethod
+    def _run(command: list, output: OutputStream, quiet: bool = False) -> bytes:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE if quiet else subprocess.STDOUT)
+
+        if not quiet or result.returncode != 0:
+            output.write(result.stdout + (result.stderr or b''))
+
+        if result.returncode != 0:
+            raise ExecutorException('Cannot install the pipeline requirements, "%s" exited with code %i' % (
+                ' '.join(command[0:3]), result.returncode))
+
+        return result.stdout
+
+
+class WorkspaceManager:
+    GC_INTERVAL = 30
+
+    _path: str
+    _budget: int
+    _hardlinks: bool
+    _gc_lock: threading.Lock
+    _gc_at: float
+
+    last_gc: Optional[dict]
+
+    def __init__(self, path: str, budget: int, hardlinks: bool = False):
+        """
+        :param path: "workspaces_path"
+        :param budget: Maximum size (in bytes) of workspaces, pipeline caches and virtualenvs, 0 means no limit
+        :param hardlinks: Share files of the pipeline cache with the workspaces, instead of copying them
+        """
+
+        self._path = path
+        self._budget = budget
+        self._hardlinks = hardlinks
+        self._gc_lock = threading.Lock()
+        self._gc_at = 0
+
+        self.last_gc = None
+
+        for directory in ['cache', 'runs']:
+            os.makedirs(os.path.join(self._path, directory), exist_ok=True)
+
+    def get_virtualenvs_path(self) -> str:
+        return os.path.join(self._path, 'venvs')
+
+    @contextmanager
+    def use(self, pipeline_id: str, execution_number: int):
+        """ Yields a new Workspace for an execution, filled with the pipeline cache """
+
+        self._migrate_legacy_workspace(pipeline_id)
+
+        workspace = Workspace(pipeline_id, os.path.join(
+            self._path, 'runs', pipeline_id, '%i-%s' % (execution_number, uuid.uuid4().hex[0:8])))
+        os.makedirs(os.path.dirname(workspace.path), exist_ok=True)
+
+        with locked(workspace.lock_path):
+            cache_path = self._get_cache_path(pipeline_id)
+
+            try:
+                with locked(cache_path + '.lock'):
+                    if os.path.isdir(cache_path):
+                        clone_tree(cache_path, workspace.path, hardlinks=self._hardlinks)
+                    else:
+                        os.makedirs(workspace.path)
+
+                yield workspace
+
+            finally:
+                # failed, or crashed execution - only a successful one is moved to the pipeline cache
+                shutil.rmtree(workspace.path, ignore_errors=True)
+
+        try:
+            os.unlink(workspace.lock_path)
+        except FileNotFoundError:
+            pass
+
+    def save_as_cache(self, workspace: Workspace, skip: List[str]):
+        """ Replaces the pipeline cache with the workspace. The workspace is moved, it cannot be used anymore """
+
+        cache_path = self._get_cache_path(workspace.pipeline_id)
+
+        for name in skip:
+            if os.path.lexists(os.path.join(workspace.path, name)):
+                os.unlink(os.path.join(workspace.path, name))
+
+        with locked(cache_path + '.lock', exclusive=True):
+            old_path = None
+
+            if os.path.isdir(cache_path):
+                old_path = '%s.old-%s' % (cache_path, uuid.uuid4().hex[0:8])
+                os.rename(cache_path, old_path)
+
+            os.rename(workspace.path, cache_path)
+
+        if old_path:
+            shutil.rmtree(old_path, ignore_errors=True)
+
+    def collect_garbage_in_background(self):
+        if not self._budget or time.time() - self._gc_at < self.GC_INTERVAL:
+            return
+
+        self._gc_at = time.time()
+        threading.Thread(target=self.collect_garbage, name='workspaces-gc', daemon=True).start()
+
+    def collect_garbage(self) -> Optional[dict]:
+        """ Deletes the least recently used entries, until all of them fit in the budget """
+
+        if not self._gc_lock.acquire(blocking=False):
+            return None
+
+        try:
+            started_at = time.time()
+            self._remove_orphaned_locks()
+            entries = self._list_entries()
+            seen_inodes = set()
+            sizes = []
+
+            # newest first - files shared by hardlinks are counted for the newest entry,
+            # deleting an older entry does not free them
+            for last_used, path in reversed(entries):
+                sizes.append((last_used, path, self._get_size(path, seen_inodes)))
+
+            total = sum(size for _, _, size in sizes)
+            removed = 0
+            freed = 0
+
+            for last_used, path, size in reversed(sizes):
+                if total - freed <= self._budget:
+                    break
+
+                with locked(path + '.lock', exclusive=True, blocking=False) as is_free:
+                    if not is_free:
+                        continue
+
+                    shutil.rmtree(path, ignore_errors=True)
+                    os.unlink(path + '.lock')
+
+                removed += 1
+                freed += size
+
+            self.last_gc = {
+                'size': total - freed,
+                'budget': self._budget,
+                'entries': len(entries) - removed,
+                'removed': removed,
+                'freed': freed,
+                'duration_ms': round((time.time() - started_at) * 1000, 2),
+                'at': time.time()
+            }
+
+            if removed:
+                Logger.info('Removed %i least recently used workspaces, %i bytes freed' % (removed, freed))
+
+            return self.last_gc
+
+        finally:
+            self._gc_lock.release()
+
+    def _list_directories(self) -> List[str]:
+        directories = [os.path.join(self._path, 'cache'), self.get_virtualenvs_path()]
+        runs_path = os.path.join(self._path, 'runs')
+
+        for name in os.listdir(runs_path):
+            directories.append(os.path.join(runs_path, name))
+
+        return [directory for directory in directories if os.path.isdir(directory)]
+
+    def _remove_orphaned_locks(self):
+        """ Lock files of entries that were removed, or never created (eg. a virtualenv that failed to build) """
+
+        for directory in self._list_directories():
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                entry_path = path.rsplit('.', 1)[0]
+
+                if not (name.endswith('.lock') or name.endswith('.build')) or os.path.isdir(entry_path):
+                    continue
+
+                with locked(path, exclusive=True, blocking=False) as is_free:
+                    if is_free:
+                        os.unlink(path)
+
+    def _list_entries(self) -> List[Tuple[float, str]]:
+        """ Workspaces of executions, pipeline caches and virtualenvs, sorted from the least recently used """
+
+        entries = []
+
+        for directory in self._list_directories():
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+
+                if not name.endswith('.lock') or not os.path.isdir(path[0:-5]):
+                    continue
+
+                try:
+                    entries.append((os.stat(path).st_mtime, path[0:-5]))
+                except OSError:
+                    continue
+
+        return sorted(entries)
+
+    @staticmethod
+    def _get_size(path: str, seen_inodes: set) -> int:
+        size = 0
+
+        for directory, subdirectories, names in os.walk(path):
+            for name in names:
+                try:
+                    stat = os.lstat(os.path.join(directory, name))
+                except OSError:
+                    continue
+
+                if (stat.st_dev, stat.st_ino) in seen_inodes:
+                    continue
+
+                seen_inodes.add((stat.st_dev, stat.st_ino))
+                size += stat.st_size
+
+        return size
+
+    def _get_cache_path(self, pipeline_id: str) -> str:
+        return os.path.join(self._path, 'cache', pipeline_id)
+
+    def _migrate_legacy_workspace(self, pipeline_id: str):
+        """ Previously each pipeline had one reused directory "<workspaces_path>/<pipeline_id>" """
+
+        legacy_path = os.path.join(self._path, pipeline_id)
+
+        if pipeline_id in ['cache', 'runs', 'venvs'] or not os.path.isdir(legacy_path):
+            return
+
+        with locked(self._get_cache_path(pipeline_id) + '.lock', exclusive=True):
+            if os.path.isdir(legacy_path) and not os.path.isdir(self._get_cache_path(pipeline_id)):
+                Logger.info('Moving workspace of "%s" pipeline to the pipeline cache' % pipeline_id)
+                os.rename(legacy_path, self._get_cache_path(pipeline_id))
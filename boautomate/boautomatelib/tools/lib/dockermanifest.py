@@ -1,7 +1,5 @@
 # Extracted from python-dxf (https://git.io/vM0EB) used under license (MIT).
 import base64
-import ecdsa
-import jws
 import json
 
 
@@ -23,8 +21,15 @@ def _urlsafe_b64encode(s):
     return _urlsafe_b64encode_bytes(force_bytes(s))
 
 
-jws.utils.to_bytes_2and3 = force_bytes
-jws.algos.to_bytes_2and3 = force_bytes
+def _import_jws():
+    """ Signing is rarely used, the libraries are imported on first use """
+
+    import jws
+
+    jws.utils.to_bytes_2and3 = force_bytes
+    jws.algos.to_bytes_2and3 = force_bytes
+
+    return jws
 
 
 def _num_to_base64(n):
@@ -39,6 +44,9 @@ def _num_to_base64(n):
 
 
 def sign_manifest(manifest, key=None):
+    import ecdsa
+    jws = _import_jws()
+
     m = assign({}, manifest)
 
     try:
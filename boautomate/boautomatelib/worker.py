@@ -0,0 +1,216 @@
+"""
+    Worker
+    ======
+
+    Runs executions of a "remote-worker" node on another machine (see supervisor/remote.py).
+    Leases an execution from the master (long polling), runs it natively, sends output with heartbeats,
+    and reports the exit code. Multiple workers can run on one machine, each one runs a single execution at once.
+"""
+
+import base64
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+from typing import Optional
+
+from .nodeexecutor.api import Api
+from .routes import route_worker_lease, route_worker_heartbeat, route_worker_finish
+from .supervisor.base import OutputStream
+from .supervisor.native import NativeRunSupervisor
+from .logger import Logger
+
+
+class LeaseLostException(Exception):
+    pass
+
+
+class LeasedOutput(OutputStream):
+    """ Output of a leased execution, the output that was not sent yet is taken by the heartbeat """
+
+    _new: bytearray
+    lost: bool
+
+    def __init__(self):
+        super().__init__()
+        self._new = bytearray()
+        self.lost = False
+
+    def write(self, data: bytes):
+        super().write(data)
+
+        with self._lock:
+            self._new += data
+
+    def take_new(self) -> bytes:
+        with self._lock:
+            chunk = bytes(self._new)
+            self._new = bytearray()
+
+        return chunk
+
+    def put_back(self, chunk: bytes):
+        """ When the chunk could not be sent, it is sent with the next heartbeat """
+
+        with self._lock:
+            self._new[0:0] = chunk
+
+
+class Worker:
+    POLL_TIME = 20
+    RETRY_DELAY = 5
+    MAX_RETRY_DELAY = 60
+
+    _api: Api
+    _node_name: str
+    _worker_id: str
+    _runner: NativeRunSupervisor
+
+    def __init__(self, master_url: str, node_name: str, token: str, workspaces_path: str, worker_id: str = '',
+                 workspaces_budget: int = 2 * 1024 * 1024 * 1024, workspaces_hardlinks: bool = False):
+        self._api = Api(master_url, token)
+        self._node_name = node_name
+        self._worker_id = worker_id or '%s-%i' % (socket.gethostname(), os.getpid())
+        self._runner = NativeRunSupervisor(master_url=master_url, workspaces_path=workspaces_path,
+                                           workspaces_budget=workspaces_budget,
+                                           workspaces_hardlinks=workspaces_hardlinks)
+
+    def run_forever(self):
+        Logger.info('Worker "%s" is waiting for executions of node "%s"' % (self._worker_id, self._node_name))
+
+        while True:
+            try:
+                job = self._lease()
+
+            except Exception as e:
+                Logger.error('Cannot lease an execution: %s, retrying in %is' % (str(e), self.RETRY_DELAY))
+                time.sleep(self.RETRY_DELAY)
+                continue
+
+            if not job:
+                continue
+
+            # a worker is long-lived, an unexpected error must not stop it
+            try:
+                self.run_job(job)
+
+            except Exception:
+                Logger.error('Execution "%s" failed in the worker: %s' % (job.get('execution'), traceback.format_exc()))
+
+    def run_job(self, job: dict) -> Optional[int]:
+        Logger.info('Running execution "%s" (attempt %i)' % (job['execution'], job['attempt']))
+
+        lease_id = job['lease_id']
+        finished = threading.Event()
+        cancelled = threading.Event()
+        output = LeasedOutput()
+        heartbeat = threading.Thread(target=self._heartbeat_main, daemon=True,
+                                     args=(lease_id, output, finished, cancelled, job['heartbeat_interval']))
+        heartbeat.start()
+
+        try:
+            exit_code = self._runner.run_script(job['pipeline_id'], job['execution_number'], job['script'],
+                                                job['environment'], output, requirements=job['requirements'],
+                                                cancelled=cancelled, timeout=job['timeout'])
+
+        except Exception:
+            output.write(('\n[boautomate] Worker cannot run the execution: %s' % traceback.format_exc())
+                         .encode('utf-8'))
+            exit_code = 1
+
+        # the heartbeat thread sends the rest of the output, what it could not send goes together with the result
+        finished.set()
+        heartbeat.join()
+        output.close()
+
+        if output.lost:
+            Logger.warning('Lease of execution "%s" was lost, the result is not reported' % job['execution'])
+            return None
+
+        try:
+            self._finish(lease_id, exit_code, output.take_new())
+
+        except LeaseLostException:
+            Logger.warning('Lease of execution "%s" was lost before the result was reported' % job['execution'])
+            return None
+
+        Logger.info('Execution "%s" finished with exit code %i' % (job['execution'], exit_code))
+
+        return exit_code
+
+    def _lease(self) -> Optional[dict]:
+        response = self._api.post(route_worker_lease(self._node_name),
+                                  params={'worker': self._worker_id, 'wait': self.POLL_TIME},
+                                  timeout=self.POLL_TIME + 10)
+
+        if response.status_code == 204:
+            return None
+
+        if response.status_code != 200:
+            raise Exception('HTTP %i: %s' % (response.status_code, response.text))
+
+        return response.json()
+
+    def _finish(self, lease_id: str, exit_code: int, chunk: bytes):
+        """ Retries until the master accepts the result, or tells that the lease was lost (eg. it was restarting) """
+
+        body = json.dumps({'exit_code': exit_code, 'output': base64.b64encode(chunk).decode('ascii')})
+        delay = 1
+
+        while True:
+            try:
+                response = self._api.post(route_worker_finish(self._node_name, lease_id), data=body, timeout=30)
+
+                if response.status_code == 200:
+                    return
+
+                if response.status_code == 410:
+                    raise LeaseLostException()
+
+                error = 'HTTP %i: %s' % (response.status_code, response.text)
+
+            except LeaseLostException:
+                raise
+
+            except Exception as e:
+                error = str(e)
+
+            Logger.warning('Cannot report the result: %s, retrying in %is' % (error, delay))
+            time.sleep(delay)
+            delay = min(delay * 2, self.MAX_RETRY_DELAY)
+
+    def _heartbeat_main(self, lease_id: str, output: LeasedOutput, finished: threading.Event,
+                        cancelled: threading.Event, interval: float):
+
+        """ Sends new output every "interval" seconds (also when there is none), until the execution is finished """
+
+        while True:
+            is_finished = finished.wait(interval)
+            chunk = output.take_new()
+
+            try:
+                self._send_heartbeat(lease_id, chunk)
+
+            except LeaseLostException:
+                output.lost = True
+                cancelled.set()
+                return
+
+            except Exception as e:
+                # the master could be restarting, the lease is lost only when it says so
+                Logger.warning('Cannot send a heartbeat: %s' % str(e))
+                output.put_back(chunk)
+
+            if is_finished:
+                return
+
+    def _send_heartbeat(self, lease_id: str, chunk: bytes):
+        response = self._api.post(route_worker_heartbeat(self._node_name, lease_id), data=chunk, timeout=30)
+
+        if response.status_code == 410:
+            raise LeaseLostException()
+
+        if response.status_code != 200:
+            raise Exception('HTTP %i: %s' % (response.status_code, response.text))
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Worker process of a "remote-worker" supervisor node. Leases executions from the master over HTTP,
+    so the worker machine does not need to be reachable from the master.
+"""
+
+import argparse
+import os
+import sys
+import traceback
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--master-url',
+                        help='URL of the Boautomate master (--node-master-url of the master)',
+                        required=True)
+    parser.add_argument('--node',
+                        help='Name of the remote-worker node in supervisor.yaml of the master',
+                        required=True)
+    parser.add_argument('--token',
+                        help='Worker token ("worker_token" attribute of the node), ' +
+                             'can be passed also as BOAUTOMATE_WORKER_TOKEN environment variable',
+                        default=os.getenv('BOAUTOMATE_WORKER_TOKEN', ''))
+    parser.add_argument('--workspaces-path',
+                        help='Path, where the pipelines store the temporary directories',
+                        default='/var/lib/boautomate-worker/workspaces')
+    parser.add_argument('--workspaces-budget',
+                        help='Maximum size (in bytes) of the workspaces path, least recently used workspaces ' +
+                             'and virtualenvs are removed above it, 0 means no limit',
+                        type=int,
+                        default=2 * 1024 * 1024 * 1024)
+    parser.add_argument('--workspaces-hardlinks',
+                        help='Share files of the pipeline cache with workspaces as hardlinks, instead of copying them. ' +
+                             'Faster on filesystems without reflinks, but a file modified in place changes the cache',
+                        action='store_true')
+    parser.add_argument('--worker-id',
+                        help='Identifier of the worker, visible in statistics of the master (default: hostname-pid)',
+                        default='')
+    parser.add_argument('--log-path',
+                        help='Path to log file',
+                        default='./boautomate-worker.log')
+    parser.add_argument('--log-level',
+                        help='Logging level (debug, info, warning, error)',
+                        default='info')
+
+    parser.description = 'RiotKit\'s BoAutomate - worker executing pipelines of a remote-worker node'
+    parsed = parser.parse_args()
+
+    try:
+        from .boautomatelib import Worker, setup_logger
+    except ImportError:
+        from boautomatelib import Worker, setup_logger
+
+    try:
+        setup_logger(parsed.log_path, parsed.log_level)
+        os.makedirs(parsed.workspaces_path, exist_ok=True)
+
+        Worker(
+            master_url=parsed.master_url,
+            node_name=parsed.node,
+            token=parsed.token,
+            workspaces_path=parsed.workspaces_path,
+            workspaces_budget=parsed.workspaces_budget,
+            workspaces_hardlinks=parsed.workspaces_hardlinks,
+            worker_id=parsed.worker_id
+        ).run_forever()
+
+    except Exception:
+        traceback.print_exc(file=sys.stdout)
+
+    except KeyboardInterrupt:
+        print('[CTRL]+[C]')
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+"""
+    Measures selection throughput of the supervisor selection strategies, and the distribution of selections
+    when the strategy is called from multiple threads at once.
+
+    Usage: ./test/benchmark-scheduling.py [--nodes 8] [--selections 100000] [--threads 8]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../boautomate')
+
+from boautomatelib.logger import setup_logger
+from boautomatelib.supervisor.base import SupervisorDefinition
+from boautomatelib.supervisor.scheduling import STRATEGIES, create_strategy
+
+
+def create_nodes(count: int) -> list:
+    return [
+        SupervisorDefinition(default=True, labels=[], supervisor=None, name='node-%i' % num,
+                             max_concurrent=0, weight=num % 3 + 1)
+        for num in range(0, count)
+    ]
+
+
+def run(strategy_name: str, nodes: list, selections: int, threads: int):
+    strategy = create_strategy(strategy_name)
+    in_flight = {node.name: 0 for node in nodes}
+    per_thread = selections // threads
+
+    def worker():
+        for _ in range(0, per_thread):
+            selected = strategy.select(nodes, in_flight)
+            strategy.started(selected)
+            strategy.finished(selected, 0.001)
+
+    workers = [threading.Thread(target=worker) for _ in range(0, threads)]
+    started_at = time.perf_counter()
+
+    for thread in workers:
+        thread.start()
+
+    for thread in workers:
+        thread.join()
+
+    elapsed = time.perf_counter() - started_at
+    counts = [stats.get('executions', 0) for stats in strategy.get_stats().values()]
+
+    print('%-22s %10.0f selections/s  %8.2f us/selection  executions: %i, min/max per node: %i/%i' % (
+        strategy_name, per_thread * threads / elapsed, elapsed / (per_thread * threads) * 1000000,
+        sum(counts), min(counts), max(counts)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nodes', type=int, default=8)
+    parser.add_argument('--selections', type=int, default=100000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    setup_logger(tempfile.gettempdir() + '/boautomate-benchmark.log', 'error')
+    nodes = create_nodes(args.nodes)
+
+    for strategy_name in STRATEGIES.keys():
+        run(strategy_name, nodes, args.selections, args.threads)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+# standard bootstrap code
+import sys
+import os
+
+sys.path = [os.environ.get('BOAUTOMATE_PATH', '/opt/boautomate')] + sys.path
+# end of standard bootstrap code
+
+"""
+    Requirements example
+    ====================
+
+    Packages from "requirements" of the pipeline are available in the script.
+    Files left in the working directory are there also in the next execution (after a successful one).
+"""
+
+import yaml
+from boautomate.boautomatelib.nodeexecutor import NodeExecutor
+from boautomate.boautomatelib.nodeexecutor.pipeline import info
+
+
+class RequirementsExample(NodeExecutor):
+    def main(self):
+        counter = 0
+
+        if os.path.isfile('counter.yaml'):
+            with open('counter.yaml', 'r') as f:
+                counter = yaml.safe_load(f)['executions']
+
+        info('This pipeline was executed successfully %i times before' % counter)
+
+        # a new file is written, instead of modifying the existing one - it is shared with the pipeline cache
+        with open('counter.yaml.tmp', 'w') as f:
+            yaml.safe_dump({'executions': counter + 1}, f)
+
+        os.replace('counter.yaml.tmp', 'counter.yaml')
+
+
+RequirementsExample().main()